@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare compressed backups with raw ones.
+
+A synthetic registry is written to a snapshot in a temporary directory and
+loaded again with every compression and a range of levels, in both the
+Pickle and the binary snapshot format. Run it from the repository root:
+
+    $ PYTHONPATH=src python3 benchmarks/compression.py -n 10000
+"""
+
+import argparse
+import pathlib
+import random
+import tempfile
+
+from btlesniffer.backup import COMPRESSIONS, BinaryBackup, SnapshotBackup
+from btlesniffer.registry import DeviceRegistry
+
+from formats import measure
+from memory import make_device
+
+
+def levels(compression, requested):
+    if compression == "none":
+        return [None]
+    return [l for l in requested if compression != "bz2" or l >= 1]
+
+
+def load(cls, path):
+    backup = cls(path)
+    try:
+        return len(backup.load())
+    finally:
+        backup.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", "--devices", type=int, default=10000,
+                        help="registry size (default 10000)")
+    parser.add_argument("-u", "--updates", type=int, default=20,
+                        help="PropertiesChanged updates per device (default 20)")
+    parser.add_argument("-l", "--levels", type=int, nargs="+",
+                        default=[1, 6, 9],
+                        help="compression levels (default 1 6 9)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="repetitions, the best one counts (default 3)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    devices = [make_device(i, args.updates, rng) for i in range(args.devices)]
+    registry = DeviceRegistry(devices)
+
+    print("{:>8} {:>6} {:>5} {:>10} {:>10} {:>12} {:>7}".format(
+        "format", "codec", "level", "write (s)", "load (s)", "size (B)", "ratio"
+    ))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "registry.pkl"
+        for name, cls in (("pickle", SnapshotBackup), ("binary", BinaryBackup)):
+            raw_size = None
+            for compression in COMPRESSIONS:
+                for level in levels(compression, args.levels):
+                    backup = cls(path, compression, level)
+                    # Capture on the main loop is the same for every
+                    # compression, only the snapshot write is timed.
+                    records = backup.capture(registry, full=True)
+                    write_time, _ = measure(
+                        lambda: backup._write_snapshot(records, False),
+                        args.repeat
+                    )
+                    backup.close()
+                    load_time, _ = measure(
+                        lambda: load(cls, path), args.repeat
+                    )
+                    size = path.stat().st_size
+                    if raw_size is None:
+                        raw_size = size
+                    print("{:>8} {:>6} {:>5} {:>10.3f} {:>10.3f} {:>12} {:>7.2f}".format(
+                        name, compression, "-" if level is None else level,
+                        write_time, load_time, size, raw_size / size
+                    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare the binary backup format with Pickle.
+
+Synthetic registries are dumped to and loaded from memory with
+pickle.HIGHEST_PROTOCOL and with the codec module. Run it from the
+repository root:
+
+    $ PYTHONPATH=src python3 benchmarks/formats.py -n 1000 10000 100000
+"""
+
+import argparse
+import io
+import pickle
+import random
+import time
+
+from btlesniffer import codec
+
+from memory import make_device
+
+
+def measure(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def pickle_dump(devices):
+    return pickle.dumps(devices, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def codec_dump(devices):
+    f = io.BytesIO()
+    codec.dump_devices(devices, f)
+    return f.getvalue()
+
+
+def codec_load(data):
+    return list(codec.iter_devices(io.BytesIO(data)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", "--devices", type=int, nargs="+",
+                        default=[1000, 10000, 100000],
+                        help="registry sizes (default 1000 10000 100000)")
+    parser.add_argument("-u", "--updates", type=int, default=20,
+                        help="PropertiesChanged updates per device (default 20)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="repetitions, the best one counts (default 3)")
+    args = parser.parse_args()
+
+    print("{:>8} {:>7} {:>10} {:>10} {:>12}".format(
+        "devices", "format", "dump (s)", "load (s)", "size (B)"
+    ))
+    for n in args.devices:
+        rng = random.Random(0)
+        devices = [make_device(i, args.updates, rng) for i in range(n)]
+        for name, dump, load in (("pickle", pickle_dump, pickle.loads),
+                                 ("binary", codec_dump, codec_load)):
+            dump_time, data = measure(lambda: dump(devices), args.repeat)
+            load_time, _ = measure(lambda: load(data), args.repeat)
+            print("{:>8} {:>7} {:>10.3f} {:>10.3f} {:>12}".format(
+                n, name, dump_time, load_time, len(data)
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measure the memory footprint of the device registry per device.
+
+Synthetic devices are created and updated through the same D-Bus dictionary
+interface the sniffer uses, with a small GATT tree on every tenth device.
+The baseline variant keeps them as the sniffer did before the devices and
+their histories were slotted: instance dictionaries, every RSSI sample in a
+list and every payload in a list per key. Run it from the repository root:
+
+    $ PYTHONPATH=src python3 benchmarks/memory.py -n 10000
+"""
+
+import argparse
+import datetime
+import gc
+import random
+import tracemalloc
+
+from btlesniffer.device import Device, GATTService, GATTCharacteristic, \
+    GATTDescriptor
+
+BATTERY_SERVICE = "0000180f-0000-1000-8000-00805f9b34fb"
+BATTERY_LEVEL = "00002a19-0000-1000-8000-00805f9b34fb"
+CCC_DESCRIPTOR = "00002902-0000-1000-8000-00805f9b34fb"
+
+
+class BaselineDescriptor(object):
+    def __init__(self, uuid, value, flags):
+        self.uuid = uuid
+        self.value = value
+        self.flags = flags
+
+
+class BaselineCharacteristic(object):
+    def __init__(self, uuid, value, flags):
+        self.uuid = uuid
+        self.value = value
+        self.flags = flags
+        self.descriptors = dict()
+
+    def __getitem__(self, path):
+        return self.descriptors[path]
+
+    def __setitem__(self, path, descriptor):
+        self.descriptors[path] = descriptor
+
+
+class BaselineService(object):
+    def __init__(self, uuid, primary):
+        self.uuid = uuid
+        self.primary = primary
+        self.characteristics = dict()
+
+    def __getitem__(self, path):
+        return self.characteristics[path]
+
+    def __setitem__(self, path, characteristic):
+        self.characteristics[path] = characteristic
+
+
+class BaselineDevice(object):
+    """
+    The device as the sniffer originally kept it, reduced to what the
+    benchmark exercises.
+    """
+    @classmethod
+    def create_from_dbus_dict(cls, path, data):
+        return cls(path, data["Address"], data["Paired"], data["Connected"],
+                   data["ServicesResolved"], data.get("Name", None),
+                   data.get("UUIDs", list()), data.get("RSSI", None),
+                   data.get("ManufacturerData", dict()))
+
+    def update_from_dbus_dict(self, path, data):
+        self.last_seen = datetime.datetime.now()
+        self.active = True
+        self.path = path
+        if "RSSI" in data:
+            self.rssis.append(data["RSSI"])
+        if "ManufacturerData" in data:
+            for k, v in data["ManufacturerData"].items():
+                if k in self.manufacturer_data:
+                    self.manufacturer_data[k].append(v)
+                else:
+                    self.manufacturer_data[k] = [v]
+
+    def __init__(self, path, address, paired, connected, services_resolved,
+                 name, uuids, rssi, manufacturer_data):
+        self.active = True
+        self.path = path
+        self.address = address
+        self.paired = paired
+        self.connected = connected
+        self.services_resolved = services_resolved
+        self.name = name
+        self.device_class = None
+        self.appearance = None
+        self.uuids = set(uuids)
+        self.rssis = [rssi] if rssi is not None else list()
+        self.tx_power = None
+        self.first_seen = datetime.datetime.now()
+        self.last_seen = datetime.datetime.now()
+        self.services = dict()
+        self.manufacturer_data = {k: [v] for k, v in manufacturer_data.items()}
+        self.service_data = dict()
+
+    def __getitem__(self, path):
+        return self.services[path]
+
+    def __setitem__(self, path, service):
+        self.uuids.add(service.uuid)
+        self.services[path] = service
+
+
+VARIANTS = {
+    "slotted": (Device, GATTService, GATTCharacteristic, GATTDescriptor),
+    "baseline": (BaselineDevice, BaselineService, BaselineCharacteristic,
+                 BaselineDescriptor),
+}
+
+
+def make_device(index, updates, rng, variant="slotted"):
+    device_type, service_type, characteristic_type, descriptor_type = \
+        VARIANTS[variant]
+    address = ":".join("{:02X}".format(b) for b in index.to_bytes(6, "big"))
+    path = "/org/bluez/hci0/dev_{}".format(address.replace(":", "_"))
+    device = device_type.create_from_dbus_dict(path, {
+        "Address": address,
+        "Paired": False,
+        "Connected": False,
+        "ServicesResolved": False,
+        "Name": "Device {}".format(index),
+        "RSSI": rng.randint(-100, -30),
+        "ManufacturerData": {0x004c: [0x02, 0x15] + [index % 256] * 21},
+    })
+    for _ in range(updates):
+        device.update_from_dbus_dict(path, {
+            "RSSI": rng.randint(-100, -30),
+            "ManufacturerData": {0x004c: [0x02, 0x15] + [index % 256] * 21},
+        })
+    if index % 10 == 0:
+        s_path = path + "/service0001"
+        c_path = s_path + "/char0002"
+        device[s_path] = service_type(BATTERY_SERVICE, True)
+        device[s_path][c_path] = characteristic_type(BATTERY_LEVEL, [100], ["read", "notify"])
+        device[s_path][c_path][c_path + "/desc0003"] = descriptor_type(CCC_DESCRIPTOR, [0, 0], None)
+    return device
+
+
+def measure(count, updates, variant):
+    """
+    Return the memory that the devices take up, in bytes per device.
+    """
+    rng = random.Random(0)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    devices = [make_device(i, updates, rng, variant) for i in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(devices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", "--devices", type=int, default=10000,
+                        help="number of synthetic devices (default 10000)")
+    parser.add_argument("-u", "--updates", type=int, default=20,
+                        help="PropertiesChanged updates per device (default 20)")
+    parser.add_argument("-v", "--variant", choices=sorted(VARIANTS) + ["both"],
+                        default="both",
+                        help="representation of the devices (default both)")
+    args = parser.parse_args()
+
+    variants = ["baseline", "slotted"] if args.variant == "both" else [args.variant]
+    sizes = dict()
+    for variant in variants:
+        sizes[variant] = measure(args.devices, args.updates, variant)
+        print("{}: {} devices, {} updates each: {:.0f} bytes per device".format(
+            variant, args.devices, args.updates, sizes[variant]
+        ))
+    if len(sizes) == 2:
+        print("saving: {:.0%}".format(1 - sizes["slotted"] / sizes["baseline"]))
+
+
+if __name__ == "__main__":
+    main()
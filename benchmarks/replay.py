@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measure the throughput of the whole signal pipeline by replaying a
+recording of BlueZ signals as fast as possible, with either ingestion and
+with the property changes applied immediately, coalesced on the main loop
+or applied by the worker thread.
+
+The recording is one captured with `btlesniffer --record`, or otherwise
+synthesized from the signals of `signals.py`. Run it from the repository
+root:
+
+    $ PYTHONPATH=src:benchmarks python3 benchmarks/replay.py -r capture.rec
+"""
+
+import argparse
+import pathlib
+import random
+import tempfile
+
+from btlesniffer.recording import SignalRecorder
+from btlesniffer.replay import ReplaySniffer
+
+from signals import device_path, interfaces_added, properties_changed
+
+PIPELINES = (
+    ("immediate", dict(coalescing_interval=0)),
+    ("coalesced", dict(coalescing_interval=50)),
+    ("worker", dict(worker_queue_size=1000000)),
+)
+
+
+def synthesize(path, devices, signals, unknown):
+    """
+    Write a recording of the announcements of the devices followed by
+    their PropertiesChanged signals, a share of which belongs to unknown
+    devices.
+    """
+    rng = random.Random(0)
+    recorder = SignalRecorder(path, "/org/bluez/hci0")
+    for i in range(devices):
+        recorder.record("/", "InterfacesAdded", interfaces_added(i), i / 1000)
+    for i in range(signals):
+        if rng.random() < unknown:
+            index = devices + rng.randrange(devices)
+        else:
+            index = rng.randrange(devices)
+        recorder.record(device_path(index), "PropertiesChanged",
+                        properties_changed(rng, index), (devices + i) / 1000)
+    recorder.close()
+
+
+def replay(path, ingestion, options):
+    sniffer = ReplaySniffer(recording_path=path, speed=0, ingestion=ingestion,
+                            sinks=(), **options)
+    with sniffer:
+        sniffer.run()
+    return sniffer.elapsed, sniffer.replayed_signals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-r", "--recording", type=str,
+                        help="the recording to replay (default a synthetic one)")
+    parser.add_argument("-n", "--devices", type=int, default=1000,
+                        help="number of synthetic devices (default 1000)")
+    parser.add_argument("-s", "--signals", type=int, default=100000,
+                        help="number of synthetic PropertiesChanged signals "
+                             "(default 100000)")
+    parser.add_argument("-u", "--unknown", type=float, default=0.5,
+                        help="share of synthetic signals of unknown devices "
+                             "(default 0.5)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="repetitions, the best one counts (default 3)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.recording is not None:
+            path = pathlib.Path(args.recording)
+        else:
+            path = pathlib.Path(tmp) / "synthetic.rec"
+            synthesize(path, args.devices, args.signals, args.unknown)
+        print("Replaying {} ({} bytes).".format(path, path.stat().st_size))
+
+        print("{:>8} {:>10} {:>12} {:>12}".format(
+            "path", "pipeline", "time (s)", "signals/s"
+        ))
+        for ingestion in ("pydbus", "gio"):
+            for name, options in PIPELINES:
+                best, count = None, 0
+                for _ in range(args.repeat):
+                    elapsed, count = replay(path, ingestion, options)
+                    best = elapsed if best is None else min(best, elapsed)
+                print("{:>8} {:>10} {:>12.3f} {:>12.0f}".format(
+                    ingestion, name, best, count / best
+                ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compare the ingestion of PropertiesChanged signals through pydbus with the
+decoding of the raw GLib variants of a Gio subscription.
+
+Synthetic signals are built as GLib variants, as they arrive on the bus,
+and fed to the signal callbacks of a sniffer without a main loop; each
+update is applied immediately. A share of the signals belongs to devices
+that were never announced by InterfacesAdded. Run it from the repository
+root:
+
+    $ PYTHONPATH=src:benchmarks python3 benchmarks/signals.py -n 1000 -s 100000
+"""
+
+import argparse
+import random
+
+from gi.repository import GLib
+
+from btlesniffer.sniffer import Sniffer
+from btlesniffer.util import DEVICE_INTERFACE, OBJECT_MANAGER_INTERFACE, \
+    PROPERTIES_INTERFACE, SERVICE_NAME
+
+from formats import measure
+
+
+def device_path(index):
+    return "/org/bluez/hci0/dev_{:012X}".format(index)
+
+
+def payloads(key_type, payloads):
+    return GLib.Variant("a{{{}v}}".format(key_type), {
+        k: GLib.Variant("ay", v) for k, v in payloads.items()
+    })
+
+
+def interfaces_added(index):
+    address = ":".join("{:02X}".format(b) for b in index.to_bytes(6, "big"))
+    return GLib.Variant("(oa{sa{sv}})", (device_path(index), {
+        DEVICE_INTERFACE: {
+            "Address": GLib.Variant("s", address),
+            "AddressType": GLib.Variant("s", "random"),
+            "Alias": GLib.Variant("s", address.replace(":", "-")),
+            "Paired": GLib.Variant("b", False),
+            "Trusted": GLib.Variant("b", False),
+            "Blocked": GLib.Variant("b", False),
+            "LegacyPairing": GLib.Variant("b", False),
+            "Connected": GLib.Variant("b", False),
+            "ServicesResolved": GLib.Variant("b", False),
+            "Adapter": GLib.Variant("o", "/org/bluez/hci0"),
+            "RSSI": GLib.Variant("n", -60),
+            "UUIDs": GLib.Variant("as", []),
+        },
+        "org.freedesktop.DBus.Properties": {},
+    }))
+
+
+def properties_changed(rng, index):
+    """
+    Build a PropertiesChanged signal, which mostly carries an RSSI sample
+    and sometimes advertisement data, as beacons do.
+    """
+    changed = {"RSSI": GLib.Variant("n", rng.randint(-100, -30))}
+    if rng.random() < 0.3:
+        changed["ManufacturerData"] = payloads("q", {
+            0x004c: bytes([0x02, 0x15, rng.randrange(4)] + [index % 256] * 20)
+        })
+    if rng.random() < 0.1:
+        changed["ServiceData"] = payloads("s", {
+            "0000feaa-0000-1000-8000-00805f9b34fb": bytes([0x10, 0x00] + [0x61] * 16)
+        })
+    if rng.random() < 0.05:
+        changed["TxPower"] = GLib.Variant("n", rng.randint(-20, 4))
+    return GLib.Variant("(sa{sv}as)", (DEVICE_INTERFACE, changed, []))
+
+
+def feed_pydbus(sniffer, announcements, signals):
+    # The callback pydbus registers unpacks every signal entirely.
+    for params in announcements:
+        sniffer._cb_interfaces_added(SERVICE_NAME, "/", OBJECT_MANAGER_INTERFACE,
+                                     "InterfacesAdded", params.unpack())
+    for path, params in signals:
+        sniffer._cb_properties_changed(SERVICE_NAME, path, PROPERTIES_INTERFACE,
+                                       "PropertiesChanged", params.unpack())
+    return len(sniffer.registry)
+
+
+def feed_gio(sniffer, announcements, signals):
+    for params in announcements:
+        sniffer._cb_gio_interfaces_added(None, SERVICE_NAME, "/",
+                                         OBJECT_MANAGER_INTERFACE,
+                                         "InterfacesAdded", params)
+    for path, params in signals:
+        sniffer._cb_gio_properties_changed(None, SERVICE_NAME, path,
+                                           PROPERTIES_INTERFACE,
+                                           "PropertiesChanged", params)
+    return len(sniffer.registry)
+
+
+def run(feed, announcements, signals):
+    # Without sinks, the new devices are not printed.
+    return feed(Sniffer(coalescing_interval=0, sinks=()), announcements, signals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", "--devices", type=int, default=1000,
+                        help="number of announced devices (default 1000)")
+    parser.add_argument("-s", "--signals", type=int, default=100000,
+                        help="number of PropertiesChanged signals (default 100000)")
+    parser.add_argument("-u", "--unknown", type=float, nargs="+",
+                        default=[0.0, 0.5, 0.9],
+                        help="shares of signals of unknown devices "
+                             "(default 0.0 0.5 0.9)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="repetitions, the best one counts (default 3)")
+    args = parser.parse_args()
+
+    announcements = [interfaces_added(i) for i in range(args.devices)]
+    print("{:>8} {:>8} {:>12} {:>12} {:>8}".format(
+        "unknown", "path", "time (s)", "signals/s", "speedup"
+    ))
+    for unknown in args.unknown:
+        rng = random.Random(0)
+        signals = list()
+        for _ in range(args.signals):
+            if rng.random() < unknown:
+                index = args.devices + rng.randrange(args.devices)
+            else:
+                index = rng.randrange(args.devices)
+            signals.append((device_path(index), properties_changed(rng, index)))
+
+        baseline = None
+        for name, feed in (("pydbus", feed_pydbus), ("gio", feed_gio)):
+            elapsed, _ = measure(
+                lambda: run(feed, announcements, signals),
+                args.repeat
+            )
+            if baseline is None:
+                baseline = elapsed
+            print("{:>8.2f} {:>8} {:>12.3f} {:>12.0f} {:>8.2f}".format(
+                unknown, name, elapsed, args.signals / elapsed, baseline / elapsed
+            ))
+
+
+if __name__ == "__main__":
+    main()
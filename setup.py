@@ -35,6 +35,9 @@ if __name__ == "__main__":
         install_requires=(
             "pydbus",
         ),
+        extras_require={
+            "asyncio": ("dbus-next",),
+        },
         entry_points={
             "console_scripts": ("btlesniffer = btlesniffer.main:main",)
         },
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provide an asyncio engine for the sniffer, which talks to BlueZ through
+dbus-next instead of running the GLib main loop.
+"""
+
+import asyncio
+import time
+
+from dbus_next import BusType, Message, MessageType, Variant
+from dbus_next.aio import MessageBus
+from dbus_next.errors import DBusError
+
+from .util import SERVICE_NAME, ADAPTER_INTERFACE, DEVICE_INTERFACE, \
+    OBJECT_MANAGER_INTERFACE, PROPERTIES_INTERFACE
+from .sinks import Connecting
+from .sniffer import Sniffer
+
+DBUS_NAME = "org.freedesktop.DBus"
+DBUS_PATH = "/org/freedesktop/DBus"
+
+
+def unpack(value):
+    """
+    Convert the variants and byte arrays within a D-Bus value into the plain
+    values that pydbus delivers.
+    """
+    if isinstance(value, Variant):
+        return unpack(value.value)
+    elif isinstance(value, dict):
+        return {k: unpack(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [unpack(v) for v in value]
+    elif isinstance(value, bytes):
+        return list(value)
+    return value
+
+
+class AsyncSniffer(Sniffer):
+    """
+    Capture reachable Bluetooth devices on an asyncio event loop. The
+    signal subscriptions, the backup timer and the connection scheduler are
+    coroutines; the registry is handled exactly as by the GLib engine. The
+    bus address may point to a private bus, such as one that hosts a mock
+    BlueZ object tree for testing.
+    """
+    async def main(self):
+        """
+        Set up the adapter, run the sniffer and tear it down again.
+        """
+        async with self:
+            await self.run()
+
+    async def run(self):
+        """
+        Run the sniffer until the bus connection is lost or the task is
+        cancelled.
+        """
+        if self.adapter is None:
+            raise ValueError("AsyncSniffer.run can only be called in a context "
+                             "(e.g. `async with AsyncSniffer(...) as s: "
+                             "await s.run()`)")
+
+        self._log.debug("Clearing the BlueZ device registry.")
+        for path, ifaces in (await self._managed_objects()).items():
+            if DEVICE_INTERFACE in ifaces:
+                await self._call(self.adapter, ADAPTER_INTERFACE, "RemoveDevice",
+                                 "o", (path,))
+
+        self._log.debug("Registering the signals InterfacesAdded and PropertiesChanged.")
+        self.bus.add_message_handler(self._on_message)
+        for rule in self._filter.match_rules():
+            await self._call_bus("AddMatch", "s", (rule,))
+
+        self._log.debug("Running the event loop.")
+        self._start_overload_monitor()
+        if self.output_path is not None and self.backup_interval > 0:
+            self._tasks.append(self._loop.create_task(self._backup_timer()))
+        if self.attempt_connection:
+            self._tasks.append(self._loop.create_task(self._connect_scheduler()))
+        await self.bus.wait_for_disconnect()
+
+    def _on_message(self, message):
+        """
+        Dispatch the signals of BlueZ to the handlers of the sniffer.
+        """
+        if message.message_type != MessageType.SIGNAL:
+            return None
+        if message.interface == OBJECT_MANAGER_INTERFACE:
+            if not self._filter.accepts_path(message.body[0]):
+                self.filtered_signals += 1
+            elif message.member == "InterfacesAdded":
+                path, interfaces = message.body
+                self._on_interfaces_added((path, unpack(interfaces)),
+                                          time.time())
+            elif message.member == "InterfacesRemoved":
+                self._on_interfaces_removed(tuple(message.body))
+        elif message.interface == PROPERTIES_INTERFACE and \
+                message.member == "PropertiesChanged" and \
+                message.body[0] == DEVICE_INTERFACE:
+            data = unpack(message.body[1])
+            if self._overload is not None and self._shed_sample(data):
+                return None
+            if self._filter.accepts_path(message.path):
+                data = self._filter.filter_properties(data)
+            else:
+                data = None
+            if data is not None:
+                self._on_properties_changed(message.path, data, time.time())
+            else:
+                self.filtered_signals += 1
+        return None
+
+    async def _backup_timer(self):
+        while True:
+            await asyncio.sleep(self.backup_interval)
+            self._cb_backup_registry()
+
+    async def _connect_scheduler(self):
+        while True:
+            await asyncio.sleep(self.queueing_interval)
+            self._cb_connect_check()
+
+    def _connect(self, device):
+        if self.queued_connections == 0:
+            self._emit_device(Connecting, device)
+            self._tasks.append(self._loop.create_task(self._connect_device(device.path)))
+            device.connected = True
+            self.registry.mark_dirty(device)
+            self.queued_connections += 1
+
+    async def _connect_device(self, path):
+        try:
+            await self._call(path, DEVICE_INTERFACE, "Connect")
+        except DBusError:
+            self._log.debug("Connect() failed:", exc_info=True)
+        else:
+            self._log.info("Connection successful.")
+        finally:
+            self.queued_connections -= 1
+
+    def _call_later(self, delay, callback):
+        return self._loop.call_later(delay / 1000, callback)
+
+    def _cancel_call(self, handle):
+        handle.cancel()
+
+    async def _managed_objects(self):
+        objects = await self._call("/", OBJECT_MANAGER_INTERFACE, "GetManagedObjects")
+        return unpack(objects)
+
+    async def _call(self, path, interface, member, signature="", body=()):
+        """
+        Call a method of BlueZ and return its first result, if any.
+        """
+        return await self._call_message(Message(
+            destination=SERVICE_NAME, path=path, interface=interface,
+            member=member, signature=signature, body=list(body)
+        ))
+
+    async def _call_bus(self, member, signature="", body=()):
+        return await self._call_message(Message(
+            destination=DBUS_NAME, path=DBUS_PATH, interface=DBUS_NAME,
+            member=member, signature=signature, body=list(body)
+        ))
+
+    async def _call_message(self, message):
+        reply = await self.bus.call(message)
+        if reply.message_type == MessageType.ERROR:
+            text = reply.body[0] if len(reply.body) > 0 else None
+            raise DBusError(reply.error_name, text, reply)
+        return reply.body[0] if len(reply.body) > 0 else None
+
+    async def __aenter__(self):
+        self._log.debug("Choosing the first available Bluetooth adapter and "
+                        "starting device discovery.")
+        self._log.debug("The discovery filter is set to Bluetooth LE only.")
+        self._loop = asyncio.get_event_loop()
+        self.bus = await MessageBus(bus_address=self.bus_address,
+                                    bus_type=BusType.SYSTEM).connect()
+        try:
+            pattern = self.adapter_pattern
+            for path, ifaces in sorted((await self._managed_objects()).items()):
+                properties = ifaces.get(ADAPTER_INTERFACE)
+                if properties is not None and (
+                        pattern is None or path.endswith(pattern) or
+                        pattern == properties.get("Address")):
+                    adapter = path
+                    break
+            else:
+                raise ValueError("Bluetooth adapter not found.")
+            self._filter = self._create_filter(adapter)
+            await self._call(adapter, ADAPTER_INTERFACE, "SetDiscoveryFilter",
+                             "a{sv}", (self._discovery_filter(Variant),))
+            await self._call(adapter, ADAPTER_INTERFACE, "StartDiscovery")
+        except DBusError:
+            self._log.exception("Is the bluetooth controller powered on? "
+                                "Use `bluetoothctl`, `power on` otherwise.")
+            self.bus.disconnect()
+            raise
+        self.adapter = adapter
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        for task in self._tasks:
+            task.cancel()
+        if self.adapter is not None and self.bus.connected:
+            self._log.debug("Stopping device discovery.")
+            try:
+                await self._call(self.adapter, ADAPTER_INTERFACE, "StopDiscovery")
+            except DBusError:
+                self._log.debug("StopDiscovery() failed:", exc_info=True)
+        self.bus.disconnect()
+        self.adapter = None
+
+        self._log.debug("Applying the pending updates.")
+        self._flush_pending()
+
+        if self._overload is not None:
+            self._log.info("Overload: {}.".format(self._overload))
+
+        self._log.debug("Waiting for the sinks to handle the queued events.")
+        self._sinks.close()
+
+        if self.backup is not None:
+            self._log.debug("Waiting for outstanding backups to be written.")
+            self.backup.close()
+
+        return False
+
+    def __enter__(self):
+        raise TypeError("Use `async with` to enter an AsyncSniffer.")
+
+    def __init__(self, *args, bus_address=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self._events is not None:
+            raise ValueError("The asyncio engine does not support the worker "
+                             "thread mode.")
+        if self.record_path is not None:
+            raise ValueError("The asyncio engine does not support recording "
+                             "signals.")
+        self.bus_address = bus_address
+        self.bus = None
+        self._loop = None
+        self._tasks = list()
+
+
+def run_sniffer(sniffer: AsyncSniffer) -> None:
+    """
+    Run the sniffer on a new event loop until it ends or is interrupted.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    task = loop.create_task(sniffer.main())
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+    finally:
+        loop.close()
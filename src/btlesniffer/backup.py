@@ -0,0 +1,763 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the ways in which the device registry is backed up to disk and
+restored from there.
+"""
+
+import bz2
+import contextlib
+import gzip
+import logging
+import lzma
+import mmap
+import os
+import pathlib
+import pickle
+import struct
+import threading
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, \
+    Tuple
+
+from . import codec
+from .device import Device
+from .registry import DeviceRegistry
+
+BACKUP_MODES = ("snapshot", "journal", "indexed", "binary", "sqlite")
+COMPRESSIONS = ("none", "zlib", "bz2", "lzma")
+
+# Modes whose files are read and written as streams and may be compressed.
+STREAM_MODES = ("snapshot", "journal", "binary")
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+_MAGICS = ((b"\x1f\x8b", "zlib"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "lzma"))
+
+
+@contextlib.contextmanager
+def compressing(f: BinaryIO, compression: str = "none",
+                level: int = None) -> Iterator[BinaryIO]:
+    """
+    Wrap the stream such that data written to it is compressed on the fly
+    (see COMPRESSIONS). Once the block completes, the compressed stream is
+    ended but the underlying one remains open. Without a level, the
+    default of the compressor is used.
+    """
+    if compression == "none":
+        yield f
+        return
+    elif compression == "zlib":
+        # The gzip framing carries a checksum and may be concatenated.
+        g = gzip.GzipFile(fileobj=f, mode="wb",
+                          compresslevel=6 if level is None else level)
+    elif compression == "bz2":
+        g = bz2.BZ2File(f, "wb", compresslevel=9 if level is None else level)
+    elif compression == "lzma":
+        g = lzma.LZMAFile(f, "wb", preset=level)
+    else:
+        raise ValueError("Unknown compression '{}'.".format(compression))
+    with g:
+        yield g
+
+
+def detect_compression(f: BinaryIO) -> str:
+    """
+    Return the compression of the seekable stream from its magic bytes,
+    without moving its position.
+    """
+    position = f.tell()
+    magic = f.read(6)
+    f.seek(position)
+    for prefix, compression in _MAGICS:
+        if magic.startswith(prefix):
+            return compression
+    return "none"
+
+
+@contextlib.contextmanager
+def open_decompressed(path: pathlib.Path) -> Iterator[BinaryIO]:
+    """
+    Open the file for reading and decompress it on the fly, whichever
+    compression it was written with.
+    """
+    with path.open("rb") as f:
+        compression = detect_compression(f)
+        if compression == "none":
+            yield f
+        elif compression == "zlib":
+            with gzip.GzipFile(fileobj=f, mode="rb") as g:
+                yield g
+        elif compression == "bz2":
+            with bz2.BZ2File(f, "rb") as g:
+                yield g
+        else:
+            with lzma.LZMAFile(f, "rb") as g:
+                yield g
+
+
+@contextlib.contextmanager
+def open_atomically(path: pathlib.Path, compression: str = "none",
+                    level: int = None) -> Iterator[BinaryIO]:
+    """
+    Open a temporary file next to the path for writing and move it into
+    place once the block completes, such that the path always holds either
+    the old or the new data. The data may be compressed on the fly.
+    """
+    tmp_path = path.with_name(".{}.tmp".format(path.name))
+    with tmp_path.open("wb") as f:
+        with compressing(f, compression, level) as g:
+            yield g
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(str(tmp_path), str(path))
+
+
+def write_atomically(path: pathlib.Path, data: bytes) -> None:
+    """
+    Write the data such that the path always holds either the old or the
+    new data.
+    """
+    with open_atomically(path) as f:
+        f.write(data)
+
+
+class BackgroundWriter(object):
+    """
+    Perform backup I/O on a background thread. Requests that arrive while
+    the writer is busy are coalesced: a newer snapshot supersedes an older
+    one along with any records submitted before it, and records are
+    gathered into one batch.
+    """
+    def submit_snapshot(self, state: Any) -> None:
+        """
+        Schedule the snapshot state to be written with `write_snapshot`.
+        """
+        with self._cond:
+            if self._has_snapshot or len(self._records) > 0:
+                self.coalesced += 1
+            self._snapshot = state
+            self._has_snapshot = True
+            self._records = list()
+            self._cond.notify_all()
+
+    def submit_records(self, records: Any) -> None:
+        """
+        Schedule the records to be written with `append_records`.
+        """
+        with self._cond:
+            if len(self._records) > 0:
+                self.coalesced += 1
+            self._records.append(records)
+            self._cond.notify_all()
+
+    def flush(self) -> None:
+        """
+        Block until all submitted requests have been written.
+        """
+        with self._cond:
+            while self._busy or self._has_snapshot or len(self._records) > 0:
+                self._cond.wait()
+
+    def close(self) -> None:
+        """
+        Write all outstanding requests and stop the thread.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._has_snapshot and len(self._records) == 0 \
+                        and not self._closed:
+                    self._cond.wait()
+                if not self._has_snapshot and len(self._records) == 0:
+                    return
+                has_snapshot, state = self._has_snapshot, self._snapshot
+                records = self._records
+                self._has_snapshot, self._snapshot = False, None
+                self._records = list()
+                self._busy = True
+
+            try:
+                if has_snapshot:
+                    self.write_snapshot(state)
+                if len(records) > 0:
+                    self.append_records(records)
+            except Exception:
+                self._log.exception("Failed to write the device registry "
+                                    "backup.")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def __init__(self, write_snapshot: Callable[[Any], None],
+                 append_records: Callable[[List[Any]], None] = None) -> None:
+        self.write_snapshot = write_snapshot
+        self.append_records = append_records
+        self.coalesced = 0
+        self._log = logging.getLogger("btlesniffer.BackgroundWriter")
+        self._cond = threading.Condition()
+        self._snapshot: Any = None
+        self._has_snapshot = False
+        self._records: List[Any] = list()
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="btlesniffer-backup", daemon=True
+        )
+        self._thread.start()
+
+
+def iter_pickled(f: BinaryIO) -> Iterator[Any]:
+    """
+    Yield the devices of a Pickle snapshot or journal stream as pairs of
+    their address and record, and the generation numbers in between. The
+    devices of older streams, which hold a whole registry, a plain list of
+    devices or bare devices, are pickled anew.
+    """
+    while True:
+        try:
+            obj = pickle.load(f)
+        except EOFError:
+            return
+        if isinstance(obj, (tuple, int)):
+            yield obj
+        elif isinstance(obj, Device):
+            yield obj.address, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            for device in DeviceRegistry.from_backup(obj):
+                yield device.address, pickle.dumps(
+                    device, protocol=pickle.HIGHEST_PROTOCOL
+                )
+
+
+class SnapshotBackup(object):
+    """
+    Dump the entire device registry to a Pickle file with one record per
+    device. The main loop only pickles the devices that changed since the
+    previous backup; the background writer copies the records of the other
+    devices from the previous snapshot, and compresses and writes the new
+    one.
+    """
+    # The modes (see BACKUP_MODES) of the backups that are read as they
+    # are. Backups of other modes are converted upon the next backup.
+    READ_MODES: Tuple[str, ...] = ("snapshot",)
+
+    def load(self) -> DeviceRegistry:
+        mode = detect_mode(self.path)
+        if mode not in self.READ_MODES:
+            return load_converted(self.path, mode)
+        with open_decompressed(self.path) as f:
+            registry = DeviceRegistry(
+                pickle.loads(obj[1]) for obj in iter_pickled(f)
+                if isinstance(obj, tuple)
+            )
+        self._merge = True
+        return registry
+
+    def write(self, registry: DeviceRegistry) -> None:
+        if not registry.dirty:
+            return
+        # Until the snapshot was written once, it holds none of the devices.
+        full = not self._merge
+        self._merge = True
+        self.writer.submit_records((full, self.capture(registry, full)))
+
+    def capture(self, registry: DeviceRegistry,
+                full: bool = False) -> Dict[str, Any]:
+        """
+        Encode the devices that changed since the last capture, or all
+        devices if full, and return their records by address.
+        """
+        dirty = registry.pop_dirty()
+        devices = list(registry) if full else dirty
+        return {d.address: self._capture_device(d) for d in devices}
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def close(self) -> None:
+        self.writer.close()
+
+    def _capture_device(self, device: Device) -> Any:
+        return pickle.dumps(device, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _write_records(self, batches: List[Tuple[bool, Dict[str, Any]]]) -> None:
+        # A full capture supersedes the previous snapshot and the batches
+        # before it.
+        merge = True
+        records: Dict[str, Any] = dict()
+        for full, batch in batches:
+            if full:
+                merge = False
+                records = dict()
+            records.update(batch)
+        try:
+            self._write_snapshot(records, merge)
+        except Exception:
+            # The records are lost, so the next snapshot captures anew.
+            self._merge = False
+            raise
+
+    def _write_snapshot(self, records: Dict[str, Any], merge: bool) -> None:
+        """
+        Write the records to a new snapshot, after those of the other
+        devices in the previous snapshot if merging.
+        """
+        with open_atomically(self.path, self.compression,
+                             self.compression_level) as f:
+            self._write_header(f)
+            if merge:
+                for address, record in self._iter_records():
+                    if address not in records:
+                        self._write_record(f, address, record)
+            for address, record in records.items():
+                self._write_record(f, address, record)
+
+    def _iter_records(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield the address and record of every device in the snapshot.
+        """
+        with open_decompressed(self.path) as f:
+            for obj in iter_pickled(f):
+                if isinstance(obj, tuple):
+                    yield obj
+
+    def _write_header(self, f: BinaryIO) -> None:
+        pass
+
+    def _write_record(self, f: BinaryIO, address: str, record: Any) -> None:
+        pickle.dump((address, record), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __init__(self, path: pathlib.Path, compression: str = "none",
+                 compression_level: int = None) -> None:
+        self.path = path
+        self.compression = compression
+        self.compression_level = compression_level
+        # Whether the file holds the devices that were not captured.
+        self._merge = False
+        self.writer = BackgroundWriter(None, self._write_records)
+
+
+class JournalBackup(SnapshotBackup):
+    """
+    Append only the devices that changed since the last write to a journal
+    next to the snapshot. Once the journal holds more than the compaction
+    threshold of records, it is folded into a fresh snapshot.
+
+    Every compaction raises a generation number, which follows the devices
+    in the snapshot and starts the new journal. A journal of another
+    generation than the snapshot is left over from an interrupted
+    compaction and ignored, since its records are older than the snapshot.
+    Backups without generation numbers count as generation zero.
+    """
+    READ_MODES = ("snapshot", "journal")
+
+    def load(self) -> DeviceRegistry:
+        mode = detect_mode(self.path)
+        if mode not in self.READ_MODES:
+            # The first write compacts, replacing the converted file.
+            return load_converted(self.path, mode)
+        generation = 0
+        devices = list()
+        if self.path.exists():
+            with open_decompressed(self.path) as f:
+                for obj in iter_pickled(f):
+                    if isinstance(obj, int):
+                        generation = obj
+                    else:
+                        devices.append(pickle.loads(obj[1]))
+        registry = DeviceRegistry(devices)
+        self._generation = generation
+
+        records = 0
+        truncated = False
+        if self.journal_path.exists() and \
+                self._journal_generation() != generation:
+            self._log.warning("Ignoring a backup journal that is older than "
+                              "the snapshot.")
+            truncated = True
+        elif self.journal_path.exists():
+            with self.journal_path.open("rb") as f:
+                # A compressed stream cannot tell a truncated record from
+                # its end, and appending with another compression would
+                # mix the two in one file.
+                truncated = detect_compression(f) != "none" or \
+                    self.compression != "none"
+            with open_decompressed(self.journal_path) as f:
+                stream = iter_pickled(f)
+                while True:
+                    try:
+                        obj = next(stream)
+                    except StopIteration:
+                        break
+                    except (pickle.UnpicklingError, ValueError, AttributeError,
+                            OSError, lzma.LZMAError, zlib.error):
+                        self._log.warning("Ignoring a truncated record at the "
+                                          "end of the backup journal.")
+                        truncated = True
+                        break
+                    if isinstance(obj, int):
+                        continue
+                    registry.put(pickle.loads(obj[1]))
+                    records += 1
+
+        self._records = records
+        # Appending behind a truncated record would render the rest of the
+        # journal unreadable.
+        self._compact = truncated
+        return registry
+
+    def write(self, registry: DeviceRegistry) -> None:
+        if self._compact or self._records >= self.compaction_threshold:
+            self.compact(registry, full=self._compact)
+            return
+
+        records = self.capture(registry)
+        if len(records) == 0:
+            return
+        self.writer.submit_records((None, False, records))
+        self._records += len(records)
+
+    def compact(self, registry: DeviceRegistry, full: bool = True) -> None:
+        """
+        Write the entire registry to the snapshot and truncate the journal.
+        Unless full, only the devices that changed are captured, and the
+        others are copied from the previous snapshot and the journal.
+        """
+        self._log.info("Compacting the device registry journal.")
+        self._generation += 1
+        self.writer.submit_records(
+            (self._generation, full, self.capture(registry, full))
+        )
+        self._records = 0
+        self._compact = False
+
+    def exists(self) -> bool:
+        return self.path.exists() or self.journal_path.exists()
+
+    def _journal_generation(self) -> int:
+        """
+        Return the generation the journal starts with.
+        """
+        try:
+            with open_decompressed(self.journal_path) as f:
+                first = pickle.load(f)
+        except EOFError:
+            return 0
+        except (pickle.UnpicklingError, ValueError, AttributeError, OSError,
+                lzma.LZMAError, zlib.error):
+            return -1
+        return first if isinstance(first, int) else 0
+
+    def _write_records(self, batches: List[Tuple[Optional[int], bool,
+                                                 Dict[str, Any]]]) -> None:
+        # The batches are written in order, such that a compaction folds
+        # the records appended before it.
+        appended = list()
+        try:
+            for generation, full, records in batches:
+                if generation is None:
+                    appended.append(records)
+                    continue
+                if len(appended) > 0:
+                    self._append_records(appended)
+                    appended = list()
+                self._write_generation(generation, records, not full)
+            if len(appended) > 0:
+                self._append_records(appended)
+        except Exception:
+            # The records are lost, so the next write compacts anew.
+            self._compact = True
+            raise
+
+    def _write_generation(self, generation: int, records: Dict[str, Any],
+                          merge: bool) -> None:
+        if merge and self.journal_path.exists():
+            with open_decompressed(self.journal_path) as f:
+                journal = {o[0]: o[1] for o in iter_pickled(f)
+                           if isinstance(o, tuple)}
+            journal.update(records)
+            records = journal
+        with open_atomically(self.path, self.compression,
+                             self.compression_level) as f:
+            if merge and self.path.exists():
+                for address, record in self._iter_records():
+                    if address not in records:
+                        self._write_record(f, address, record)
+            for address, record in records.items():
+                self._write_record(f, address, record)
+            pickle.dump(generation, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Until the new journal is in place, the old one is ignored.
+        with open_atomically(self.journal_path, self.compression,
+                             self.compression_level) as f:
+            pickle.dump(generation, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _append_records(self, batches: List[Dict[str, Any]]) -> None:
+        # Every batch is compressed separately; the compressed streams can
+        # be concatenated and are read back as one.
+        with self.journal_path.open("ab") as f:
+            with compressing(f, self.compression, self.compression_level) as g:
+                for records in batches:
+                    for address, record in records.items():
+                        self._write_record(g, address, record)
+            f.flush()
+
+    def __init__(self, path: pathlib.Path,
+                 compaction_threshold: int = 10000, compression: str = "none",
+                 compression_level: int = None) -> None:
+        super().__init__(path, compression, compression_level)
+        self.journal_path = path.with_name(path.name + ".journal")
+        self.compaction_threshold = compaction_threshold
+        self._log = logging.getLogger("btlesniffer.JournalBackup")
+        self._records = 0
+        self._generation = 0
+        # Without a previous load, a stale journal must not be appended to.
+        self._compact = True
+
+
+class BinaryBackup(SnapshotBackup):
+    """
+    Write the registry to a snapshot in the binary format of the codec
+    module instead of Pickle. Each changed device is encoded on the main
+    loop, and the background writer streams the records into the snapshot.
+    """
+    READ_MODES = ("binary",)
+
+    def load(self) -> DeviceRegistry:
+        mode = detect_mode(self.path)
+        if mode not in self.READ_MODES:
+            return load_converted(self.path, mode)
+        with open_decompressed(self.path) as f:
+            registry = DeviceRegistry(codec.iter_devices(f))
+        self._merge = True
+        return registry
+
+    def _capture_device(self, device: Device) -> Any:
+        return codec.encode_device(device)
+
+    def _iter_records(self) -> Iterator[Tuple[str, Any]]:
+        with open_decompressed(self.path) as f:
+            codec.read_header(f)
+            for record in codec.iter_records(f):
+                yield codec.peek_address(record), record
+
+    def _write_header(self, f: BinaryIO) -> None:
+        codec.write_header(f)
+
+    def _write_record(self, f: BinaryIO, address: str, record: Any) -> None:
+        codec.write_record(f, record)
+
+
+class IndexedBackup(SnapshotBackup):
+    """
+    Write the registry to a snapshot that consists of one Pickle record per
+    device, followed by an index of the address, path and location of every
+    record. On resume, only the index is read and the snapshot is mapped
+    into memory; a device is unpickled upon its first lookup in the
+    registry. The records of unchanged devices, whether looked up or not,
+    are copied verbatim into the next snapshot.
+    """
+    MAGIC = b"BTLEIDX\x01"
+    HEADER = struct.Struct("<8sQ")
+    READ_MODES = ("indexed",)
+
+    def load(self) -> DeviceRegistry:
+        mode = detect_mode(self.path)
+        if mode not in self.READ_MODES:
+            return load_converted(self.path, mode)
+        with self.path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        for address, path, offset, length in self._read_index(self._map):
+            self._unloaded[address] = (path, offset, length)
+            self._unloaded_paths[path] = address
+        self._merge = True
+        self._log.info("Found {} devices in the snapshot index.".format(len(self._unloaded)))
+        return DeviceRegistry(loader=self)
+
+    def load_by_address(self, address: str) -> Optional[Device]:
+        entry = self._unloaded.pop(address, None)
+        if entry is None:
+            return None
+        path, offset, length = entry
+        if self._unloaded_paths.get(path) == address:
+            del self._unloaded_paths[path]
+        device = pickle.loads(self._map[offset:offset + length])
+        if self.rssi_capacity is not None and \
+                device.rssis.capacity != self.rssi_capacity:
+            # The resized device replaces its record in the next snapshot.
+            device.rssis.resize(self.rssi_capacity)
+            self._resized[address] = self._capture_device(device)
+        return device
+
+    def load_by_path(self, path: str) -> Optional[Device]:
+        address = self._unloaded_paths.get(path)
+        if address is None:
+            return None
+        return self.load_by_address(address)
+
+    def iter_devices(self) -> Iterator[Device]:
+        """
+        Yield the devices that were not loaded yet, one at a time and
+        without loading them into the registry.
+        """
+        for path, offset, length in list(self._unloaded.values()):
+            yield pickle.loads(self._map[offset:offset + length])
+
+    def capture(self, registry: DeviceRegistry,
+                full: bool = False) -> Dict[str, Any]:
+        records, self._resized = self._resized, dict()
+        records.update(super().capture(registry, full))
+        return records
+
+    def close(self) -> None:
+        super().close()
+        if self._map is not None:
+            self._map.close()
+
+    def _capture_device(self, device: Device) -> Any:
+        return device.path, super()._capture_device(device)
+
+    def _read_index(self, data: mmap.mmap) -> List[Tuple[str, str, int, int]]:
+        _, index_offset = self.HEADER.unpack(data[:self.HEADER.size])
+        return pickle.loads(data[index_offset:])
+
+    def _write_snapshot(self, records: Dict[str, Any], merge: bool) -> None:
+        # The previous snapshot stays mapped for the lazy loading of its
+        # devices, but it is read anew in case it was replaced since.
+        previous = None
+        if merge:
+            with self.path.open("rb") as f:
+                previous = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index = list()
+        try:
+            with open_atomically(self.path) as f:
+                f.write(self.HEADER.pack(self.MAGIC, 0))
+                offset = self.HEADER.size
+                if previous is not None:
+                    for address, path, old_offset, length in \
+                            self._read_index(previous):
+                        if address not in records:
+                            f.write(previous[old_offset:old_offset + length])
+                            index.append((address, path, offset, length))
+                            offset += length
+                for address, (path, data) in records.items():
+                    f.write(data)
+                    index.append((address, path, offset, len(data)))
+                    offset += len(data)
+                f.write(pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+                f.seek(0)
+                f.write(self.HEADER.pack(self.MAGIC, offset))
+        finally:
+            if previous is not None:
+                previous.close()
+
+    def __len__(self) -> int:
+        return len(self._unloaded)
+
+    def __init__(self, path: pathlib.Path, rssi_capacity: int = None) -> None:
+        super().__init__(path)
+        self.rssi_capacity = rssi_capacity
+        self._log = logging.getLogger("btlesniffer.IndexedBackup")
+        self._map: Optional[mmap.mmap] = None
+        self._resized: Dict[str, Any] = dict()
+        self._unloaded: Dict[str, Tuple[str, int, int]] = dict()
+        self._unloaded_paths: Dict[str, str] = dict()
+
+
+def detect_mode(path: pathlib.Path) -> str:
+    """
+    Return the mode (see BACKUP_MODES) that a backup was written in.
+    """
+    if not path.exists():
+        return "journal"
+    with path.open("rb") as f:
+        magic = f.read(16)
+    if magic.startswith(SQLITE_MAGIC):
+        return "sqlite"
+    elif magic.startswith(IndexedBackup.MAGIC):
+        return "indexed"
+    with open_decompressed(path) as f:
+        if codec.is_binary(f):
+            return "binary"
+    # A journal may be left over from a backup converted to another mode.
+    if path.with_name(path.name + ".journal").exists():
+        return "journal"
+    return "snapshot"
+
+
+def load_converted(path: pathlib.Path, mode: str) -> DeviceRegistry:
+    """
+    Load a backup of the given mode, which another mode cannot read as it
+    is, entirely into a registry whose devices are all dirty, such that
+    the next backup rewrites the file in the other mode.
+    """
+    logging.getLogger("btlesniffer.backup").info(
+        "Converting the backup from the {} mode.".format(mode))
+    registry = DeviceRegistry(iter_backup(path))
+    for device in registry:
+        registry.mark_dirty(device)
+    return registry
+
+
+def iter_backup(path: pathlib.Path) -> Iterator[Device]:
+    """
+    Yield the devices of a backup of any mode, one at a time. Binary,
+    indexed and SQLite backups are streamed, whereas Pickle snapshots and
+    journals are loaded into memory at once.
+    """
+    mode = detect_mode(path)
+    if mode in ("snapshot", "binary"):
+        with open_decompressed(path) as f:
+            if mode == "binary":
+                yield from codec.iter_devices(f)
+            else:
+                for obj in iter_pickled(f):
+                    if isinstance(obj, tuple):
+                        yield pickle.loads(obj[1])
+        return
+
+    backup = create_backup(path, mode)
+    try:
+        registry = backup.load()
+        yield from registry
+        if registry.loader is not None:
+            yield from backup.iter_devices()
+    finally:
+        backup.close()
+
+
+def create_backup(path: pathlib.Path, mode: str = "snapshot",
+                  compaction_threshold: int = 10000,
+                  rssi_capacity: int = None, compression: str = "none",
+                  compression_level: int = None) -> Any:
+    """
+    Create the backup for the given mode (see BACKUP_MODES). Only the
+    STREAM_MODES support compression (see COMPRESSIONS).
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression '{}'.".format(compression))
+    if compression != "none" and mode not in STREAM_MODES:
+        raise ValueError("The backup mode '{}' does not support "
+                         "compression.".format(mode))
+
+    if mode == "snapshot":
+        return SnapshotBackup(path, compression, compression_level)
+    elif mode == "journal":
+        return JournalBackup(path, compaction_threshold, compression,
+                             compression_level)
+    elif mode == "indexed":
+        return IndexedBackup(path, rssi_capacity)
+    elif mode == "binary":
+        return BinaryBackup(path, compression, compression_level)
+    elif mode == "sqlite":
+        from .database import SQLiteBackup
+        return SQLiteBackup(path, rssi_capacity)
+    else:
+        raise ValueError("Unknown backup mode '{}'.".format(mode))
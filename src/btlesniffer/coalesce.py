@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the coalescing of PropertiesChanged signals of a device that
+arrive within a short tick.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+# Properties that are recorded as samples with every signal rather than
+# overwritten by the latest one.
+SAMPLE_PROPERTIES = frozenset(("RSSI", "ManufacturerData", "ServiceData"))
+
+
+class PropertiesBatch(object):
+    """
+    Merge the changed properties of one device object path. Later values
+    overwrite earlier ones, except that the Connected flags are or-ed and
+    the UUIDs united as `Device.update_from_dbus_dict` would, and that RSSI
+    and advertisement data are kept as a batch of timestamped samples.
+    """
+    __slots__ = ("data", "samples", "timestamp")
+
+    def add(self, data: Dict[str, Any], timestamp: float) -> None:
+        """
+        Merge the changed properties of a signal received at the given
+        POSIX time.
+        """
+        self.samples.append((timestamp, data))
+        self.timestamp = timestamp
+        # Most signals carry nothing but samples.
+        if data.keys() <= SAMPLE_PROPERTIES:
+            return
+        for key, value in data.items():
+            if key in SAMPLE_PROPERTIES:
+                continue
+            elif key == "Connected":
+                self.data[key] = self.data.get(key, False) or value
+            elif key == "UUIDs":
+                self.data[key] = self.data.get(key, set()).union(value)
+            else:
+                self.data[key] = value
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = dict()
+        self.samples: List[Tuple[float, Dict[str, Any]]] = list()
+        self.timestamp = 0.0
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides a versioned, length-prefixed binary format for devices that does
+not depend on the class layout and can be decoded without executing code.
+
+A stream starts with the magic bytes and the format version, followed by
+one record per device. Each record is prefixed with its length as an
+unsigned 32 bit integer. All numbers are little-endian.
+"""
+
+import datetime
+import struct
+import sys
+from array import array
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Sequence
+
+from .device import Device, GATTService, GATTCharacteristic, GATTDescriptor
+from .payload import PayloadHistory, PayloadRecord
+from .rssi import RSSIHistory
+
+MAGIC = b"BTLEBIN"
+VERSION = 1
+
+_VERSION = struct.Struct("<B")
+_LENGTH = struct.Struct("<I")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_DEVICE = struct.Struct("<BddBiii")
+_RSSI = struct.Struct("<IQqbbdBI")
+_RECORD = struct.Struct("<Qdd")
+
+_NONE = 0xffff
+
+_ACTIVE = 0x01
+_PAIRED = 0x02
+_CONNECTED = 0x04
+_SERVICES_RESOLVED = 0x08
+
+_HAS_MINIMUM = 0x01
+_HAS_MAXIMUM = 0x02
+_HAS_EMA = 0x04
+
+_HAS_CLASS = 0x01
+_HAS_APPEARANCE = 0x02
+_HAS_TX_POWER = 0x04
+
+
+class FormatError(ValueError):
+    pass
+
+
+def _little_endian(a: array) -> array:
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a
+
+
+class _Writer(object):
+    def str(self, value: Optional[str]) -> None:
+        if value is None:
+            self.parts.append(_U16.pack(_NONE))
+        else:
+            data = value.encode("utf-8")
+            self.parts.append(_U16.pack(len(data)))
+            self.parts.append(data)
+
+    def bytes(self, value: Optional[Sequence[int]]) -> None:
+        if value is None:
+            self.parts.append(b"\x00")
+        else:
+            data = value if isinstance(value, bytes) else bytes(value)
+            self.parts.append(b"\x01")
+            self.parts.append(_U32.pack(len(data)))
+            self.parts.append(data)
+
+    def strs(self, values: Optional[Iterable[str]]) -> None:
+        if values is None:
+            self.parts.append(_U16.pack(_NONE))
+        else:
+            values = list(values)
+            self.parts.append(_U16.pack(len(values)))
+            for v in values:
+                self.str(v)
+
+    def pack(self, s: struct.Struct, *values: Any) -> None:
+        self.parts.append(s.pack(*values))
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = list()
+
+
+class _Reader(object):
+    def str(self) -> Optional[str]:
+        n = self.unpack(_U16)[0]
+        if n == _NONE:
+            return None
+        value = str(self.data[self.offset:self.offset + n], "utf-8")
+        self.offset += n
+        return value
+
+    def bytes(self) -> Optional[bytes]:
+        if self.unpack(_U8)[0] == 0:
+            return None
+        n = self.unpack(_U32)[0]
+        value = bytes(self.data[self.offset:self.offset + n])
+        self.offset += n
+        return value
+
+    def strs(self) -> Optional[List[str]]:
+        n = self.unpack(_U16)[0]
+        if n == _NONE:
+            return None
+        return [self.str() for _ in range(n)]
+
+    def array(self, typecode: str, n: int) -> array:
+        a = array(typecode)
+        size = n * a.itemsize
+        a.frombytes(self.data[self.offset:self.offset + size])
+        self.offset += size
+        return _little_endian(a)
+
+    def unpack(self, s: struct.Struct) -> tuple:
+        values = s.unpack_from(self.data, self.offset)
+        self.offset += s.size
+        return values
+
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.offset = 0
+
+
+def encode_device(device: Device) -> bytes:
+    """
+    Encode a device as a record (without the length prefix).
+    """
+    w = _Writer()
+    flags = (_ACTIVE if device.active else 0) | \
+        (_PAIRED if device.paired else 0) | \
+        (_CONNECTED if device.connected else 0) | \
+        (_SERVICES_RESOLVED if device.services_resolved else 0)
+    present = (_HAS_CLASS if device.device_class is not None else 0) | \
+        (_HAS_APPEARANCE if device.appearance is not None else 0) | \
+        (_HAS_TX_POWER if device.tx_power is not None else 0)
+    w.str(device.address)
+    w.str(device.path)
+    w.pack(_DEVICE, flags, device.first_seen.timestamp(),
+           device.last_seen.timestamp(), present, device.device_class or 0,
+           device.appearance or 0, device.tx_power or 0)
+    w.str(device.name)
+    w.strs(sorted(device.uuids))
+
+    history = device.rssis
+    samples = list(history.items())
+    present = (_HAS_MINIMUM if history.minimum is not None else 0) | \
+        (_HAS_MAXIMUM if history.maximum is not None else 0) | \
+        (_HAS_EMA if history.ema is not None else 0)
+    w.pack(_RSSI, history.capacity, history.count, history.total,
+           history.minimum or 0, history.maximum or 0, history.ema or 0.0,
+           present, len(samples))
+    w.parts.append(_little_endian(array("b", (v for _, v in samples))).tobytes())
+    w.parts.append(_little_endian(array("d", (t for t, _ in samples))).tobytes())
+
+    for data in (device.manufacturer_data, device.service_data):
+        w.pack(_U16, len(data))
+        for key, payloads in data.items():
+            if data is device.manufacturer_data:
+                w.pack(_U16, key)
+            else:
+                w.str(key)
+            w.pack(_U32, len(payloads.records))
+            for payload, record in payloads.records.items():
+                w.bytes(payload)
+                w.pack(_RECORD, record.count, record.first_seen, record.last_seen)
+
+    w.pack(_U16, len(device.services))
+    for s_path, service in device.services.items():
+        w.str(s_path)
+        w.str(service.uuid)
+        w.pack(_U8, 1 if service.primary else 0)
+        w.pack(_U16, len(service.characteristics))
+        for c_path, characteristic in service.characteristics.items():
+            w.str(c_path)
+            w.str(characteristic.uuid)
+            w.bytes(characteristic.value)
+            w.strs(characteristic.flags)
+            w.pack(_U16, len(characteristic.descriptors))
+            for d_path, descriptor in characteristic.descriptors.items():
+                w.str(d_path)
+                w.str(descriptor.uuid)
+                w.bytes(descriptor.value)
+                w.strs(descriptor.flags)
+
+    return b"".join(w.parts)
+
+
+def decode_device(data: bytes) -> Device:
+    """
+    Decode a record (without the length prefix) into a device.
+    """
+    try:
+        return _decode_device(_Reader(data))
+    except (struct.error, UnicodeDecodeError) as ex:
+        raise FormatError("Malformed device record.") from ex
+
+
+def _decode_device(r: _Reader) -> Device:
+    state = dict()
+    state["address"] = r.str()
+    state["path"] = r.str()
+    (flags, first_seen, last_seen, present, device_class, appearance,
+     tx_power) = r.unpack(_DEVICE)
+    state["active"] = bool(flags & _ACTIVE)
+    state["paired"] = bool(flags & _PAIRED)
+    state["connected"] = bool(flags & _CONNECTED)
+    state["services_resolved"] = bool(flags & _SERVICES_RESOLVED)
+    state["first_seen"] = datetime.datetime.fromtimestamp(first_seen)
+    state["last_seen"] = datetime.datetime.fromtimestamp(last_seen)
+    state["device_class"] = device_class if present & _HAS_CLASS else None
+    state["appearance"] = appearance if present & _HAS_APPEARANCE else None
+    state["tx_power"] = tx_power if present & _HAS_TX_POWER else None
+    state["name"] = r.str()
+    state["uuids"] = set(r.strs() or ())
+
+    capacity, count, total, minimum, maximum, ema, present, n = r.unpack(_RSSI)
+    values = r.array("b", n)
+    timestamps = r.array("d", n)
+    state["rssis"] = RSSIHistory.restore(
+        timestamps, values, count, total,
+        minimum if present & _HAS_MINIMUM else None,
+        maximum if present & _HAS_MAXIMUM else None,
+        ema if present & _HAS_EMA else None,
+        max(capacity, 1)
+    )
+
+    for attr in ("manufacturer_data", "service_data"):
+        data = dict()
+        for _ in range(r.unpack(_U16)[0]):
+            key = r.unpack(_U16)[0] if attr == "manufacturer_data" else r.str()
+            records = dict()
+            for _ in range(r.unpack(_U32)[0]):
+                payload = r.bytes()
+                count, p_first_seen, p_last_seen = r.unpack(_RECORD)
+                records[payload] = PayloadRecord(p_first_seen, p_last_seen, count)
+            data[key] = PayloadHistory.restore(records)
+        state[attr] = data
+
+    services = dict()
+    for _ in range(r.unpack(_U16)[0]):
+        s_path, uuid = r.str(), r.str()
+        service = GATTService(uuid, bool(r.unpack(_U8)[0]))
+        for _ in range(r.unpack(_U16)[0]):
+            c_path, uuid, value, flags = r.str(), r.str(), r.bytes(), r.strs()
+            characteristic = GATTCharacteristic(
+                uuid, list(value) if value is not None else None, flags
+            )
+            for _ in range(r.unpack(_U16)[0]):
+                d_path, uuid, value, flags = r.str(), r.str(), r.bytes(), r.strs()
+                characteristic[d_path] = GATTDescriptor(
+                    uuid, list(value) if value is not None else None, flags
+                )
+            service[c_path] = characteristic
+        services[s_path] = service
+    state["services"] = services
+
+    device = Device.__new__(Device)
+    device.__setstate__(state)
+    return device
+
+
+def peek_address(data: bytes) -> Optional[str]:
+    """
+    Return the address of a record without decoding the rest of it.
+    """
+    try:
+        return _Reader(data).str()
+    except (struct.error, UnicodeDecodeError) as ex:
+        raise FormatError("Malformed device record.") from ex
+
+
+def write_header(f: BinaryIO) -> None:
+    f.write(MAGIC)
+    f.write(_VERSION.pack(VERSION))
+
+
+def read_header(f: BinaryIO) -> None:
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise FormatError("Not a binary device registry backup.")
+    version = _VERSION.unpack(f.read(_VERSION.size))[0]
+    if version != VERSION:
+        raise FormatError("Unsupported binary format version {}.".format(version))
+
+
+def is_binary(f: BinaryIO) -> bool:
+    """
+    Return whether the seekable stream holds a binary backup, without
+    moving its position.
+    """
+    position = f.tell()
+    magic = f.read(len(MAGIC))
+    f.seek(position)
+    return magic == MAGIC
+
+
+def write_record(f: BinaryIO, record: bytes) -> None:
+    f.write(_LENGTH.pack(len(record)))
+    f.write(record)
+
+
+def iter_records(f: BinaryIO) -> Iterator[bytes]:
+    """
+    Yield the records of a binary backup stream after its header.
+    """
+    while True:
+        prefix = f.read(_LENGTH.size)
+        if len(prefix) == 0:
+            return
+        if len(prefix) < _LENGTH.size:
+            raise FormatError("Truncated record length.")
+        n = _LENGTH.unpack(prefix)[0]
+        record = f.read(n)
+        if len(record) < n:
+            raise FormatError("Truncated device record.")
+        yield record
+
+
+def dump_devices(devices: Iterable[Device], f: BinaryIO) -> None:
+    """
+    Encode the devices into a binary backup stream.
+    """
+    write_header(f)
+    for device in devices:
+        write_record(f, encode_device(device))
+
+
+def iter_devices(f: BinaryIO) -> Iterator[Device]:
+    """
+    Decode the devices of a binary backup stream one at a time.
+    """
+    read_header(f)
+    for record in iter_records(f):
+        yield decode_device(record)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides a base class for compact objects that keep their attributes in
+__slots__ instead of a per-instance __dict__.
+"""
+
+from typing import Any, Dict, Tuple
+
+_SLOT_NAMES: Dict[type, Tuple[str, ...]] = dict()
+
+
+def slot_names(cls: type) -> Tuple[str, ...]:
+    """
+    Return the names of all slots defined by a class and its bases.
+    """
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = list()
+        for c in reversed(cls.__mro__):
+            slots = c.__dict__.get("__slots__", ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            names.extend(s for s in slots if s not in ("__dict__", "__weakref__"))
+        names = _SLOT_NAMES[cls] = tuple(names)
+    return names
+
+
+class Slotted(object):
+    """
+    Store attributes in __slots__. Pickles carry the attributes as a plain
+    dictionary, which is exactly what pickles of the former __dict__-based
+    classes contain, so backups remain loadable in both directions.
+    """
+    __slots__ = ()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict()
+        for name in slot_names(type(self)):
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides a backup of the device registry to an SQLite database, which keeps
+every RSSI sample, payload and GATT object in indexed tables and loads
+devices lazily on resume.
+"""
+
+import datetime
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .backup import BackgroundWriter, detect_mode, load_converted
+from .device import Device, GATTService, GATTCharacteristic, GATTDescriptor
+from .payload import PayloadHistory, PayloadRecord
+from .registry import DeviceRegistry
+from .rssi import RSSIHistory
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    address TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    paired INTEGER NOT NULL,
+    connected INTEGER NOT NULL,
+    services_resolved INTEGER NOT NULL,
+    name TEXT,
+    device_class INTEGER,
+    appearance INTEGER,
+    tx_power INTEGER,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    rssi_count INTEGER NOT NULL,
+    rssi_total INTEGER NOT NULL,
+    rssi_minimum INTEGER,
+    rssi_maximum INTEGER,
+    rssi_ema REAL
+);
+CREATE INDEX IF NOT EXISTS devices_path ON devices (path);
+CREATE TABLE IF NOT EXISTS uuids (
+    address TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    PRIMARY KEY (address, uuid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rssi_samples (
+    address TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    rssi INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rssi_samples_address
+    ON rssi_samples (address, timestamp);
+CREATE TABLE IF NOT EXISTS payloads (
+    address TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    count INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (address, kind, key, payload)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS gatt (
+    path TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    primary_service INTEGER,
+    value TEXT,
+    flags TEXT
+);
+CREATE INDEX IF NOT EXISTS gatt_address ON gatt (address);
+"""
+
+TABLES = ("devices", "uuids", "rssi_samples", "payloads", "gatt")
+
+MANUFACTURER_DATA = "m"
+SERVICE_DATA = "s"
+
+
+def connect(path: pathlib.Path, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Open the database in write-ahead logging mode and create the schema.
+    """
+    connection = sqlite3.connect(str(path), check_same_thread=check_same_thread)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        connection.close()
+        raise ValueError("Unsupported database schema version {}.".format(version))
+    if version == 0:
+        with connection:
+            connection.executescript(SCHEMA)
+            connection.execute("PRAGMA user_version={}".format(SCHEMA_VERSION))
+    return connection
+
+
+class SQLiteBackup(object):
+    """
+    Write the devices that changed since the last backup to an SQLite
+    database. Rows are captured on the main loop and written in a single
+    transaction per batch by the background writer. On resume, only the
+    addresses and paths of known devices are read; a device is loaded in
+    full upon its first lookup in the registry.
+    """
+    def load(self) -> DeviceRegistry:
+        mode = detect_mode(self.path)
+        if mode != "sqlite":
+            # The database replaces the file once the first batch is in.
+            self._replace = True
+            return load_converted(self.path, mode)
+        self._reader = connect(self.path, check_same_thread=False)
+        for address, path in self._reader.execute(
+                "SELECT address, path FROM devices"):
+            self._unloaded[address] = path
+            self._unloaded_paths[path] = address
+        self._reset = False
+        self._log.info("Found {} devices in the database.".format(len(self._unloaded)))
+        return DeviceRegistry(loader=self)
+
+    def load_by_address(self, address: str) -> Optional[Device]:
+        path = self._unloaded.pop(address, None)
+        if path is None:
+            return None
+        if self._unloaded_paths.get(path) == address:
+            del self._unloaded_paths[path]
+        return self._load_device(address)
+
+    def load_by_path(self, path: str) -> Optional[Device]:
+        address = self._unloaded_paths.get(path)
+        if address is None:
+            return None
+        return self.load_by_address(address)
+
+    def iter_devices(self) -> Iterator[Device]:
+        """
+        Yield the devices that were not loaded yet, one at a time and
+        without loading them into the registry.
+        """
+        for address in list(self._unloaded):
+            device = self._load_device(address)
+            if device is not None:
+                yield device
+
+    def write(self, registry: DeviceRegistry) -> None:
+        if not registry.dirty:
+            return
+        batch = (self._reset, list(), list(), list(), list(), list())
+        self._reset = False
+        for device in registry.pop_dirty():
+            self._capture(device, batch)
+        self.writer.submit_records(batch)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def close(self) -> None:
+        self.writer.close()
+        if self._writer_connection is not None:
+            self._writer_connection.close()
+        if self._reader is not None:
+            self._reader.close()
+
+    def _capture(self, device: Device, batch: Tuple[Any, ...]) -> None:
+        _, devices, uuids, rssis, payloads, gatt = batch
+        address = device.address
+        history = device.rssis
+        devices.append((
+            address, device.path, device.active, device.paired,
+            device.connected, device.services_resolved, device.name,
+            device.device_class, device.appearance, device.tx_power,
+            device.first_seen.timestamp(), device.last_seen.timestamp(),
+            history.count, history.total, history.minimum, history.maximum,
+            history.ema
+        ))
+        uuids.extend((address, u) for u in device.uuids)
+
+        new = min(history.pushed - self._rssi_written.get(address, 0), len(history))
+        if new > 0:
+            samples = list(history.items())[-new:]
+            rssis.extend((address, t, v) for t, v in samples)
+        self._rssi_written[address] = history.pushed
+
+        for kind, data in ((MANUFACTURER_DATA, device.manufacturer_data),
+                           (SERVICE_DATA, device.service_data)):
+            for key, payload_history in data.items():
+                for payload, record in payload_history.records.items():
+                    payloads.append((
+                        address, kind, str(key), payload, record.count,
+                        record.first_seen, record.last_seen
+                    ))
+
+        for s_path, service in device.services.items():
+            gatt.append((s_path, address, device.path, "service",
+                         service.uuid, service.primary, None, None))
+            for c_path, characteristic in service.characteristics.items():
+                gatt.append((c_path, address, s_path, "characteristic",
+                             characteristic.uuid, None,
+                             json.dumps(characteristic.value),
+                             json.dumps(characteristic.flags)))
+                for d_path, descriptor in characteristic.descriptors.items():
+                    gatt.append((d_path, address, c_path, "descriptor",
+                                 descriptor.uuid, None,
+                                 json.dumps(descriptor.value),
+                                 json.dumps(descriptor.flags)))
+
+    def _append_records(self, batches: List[Tuple[Any, ...]]) -> None:
+        replace = self._replace
+        path = self.path.with_name(self.path.name + ".tmp") if replace else self.path
+        if self._writer_connection is None:
+            if replace and path.exists():
+                path.unlink()
+            self._writer_connection = connect(path, check_same_thread=False)
+        connection = self._writer_connection
+        with connection:
+            for reset, devices, uuids, rssis, payloads, gatt in batches:
+                if reset:
+                    for table in TABLES:
+                        connection.execute("DELETE FROM {}".format(table))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO devices VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    devices
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO uuids VALUES (?, ?)", uuids
+                )
+                connection.executemany(
+                    "INSERT INTO rssi_samples VALUES (?, ?, ?)", rssis
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO payloads VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?)",
+                    payloads
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO gatt VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?, ?)",
+                    gatt
+                )
+        if replace:
+            # Closing the last connection folds the write-ahead log into
+            # the database, which is then complete on its own.
+            connection.close()
+            self._writer_connection = None
+            os.replace(str(path), str(self.path))
+            self._replace = False
+
+    def _load_device(self, address: str) -> Optional[Device]:
+        row = self._reader.execute(
+            "SELECT * FROM devices WHERE address = ?", (address,)
+        ).fetchone()
+        if row is None:
+            return None
+        (_, path, active, paired, connected, services_resolved, name,
+         device_class, appearance, tx_power, first_seen, last_seen,
+         rssi_count, rssi_total, rssi_minimum, rssi_maximum, rssi_ema) = row
+
+        uuids = [u for u, in self._reader.execute(
+            "SELECT uuid FROM uuids WHERE address = ?", (address,)
+        )]
+        device = Device(path, address, bool(paired), bool(connected),
+                        bool(services_resolved), name, device_class,
+                        appearance, uuids, None, tx_power)
+        device.active = bool(active)
+        device.first_seen = datetime.datetime.fromtimestamp(first_seen)
+        device.last_seen = datetime.datetime.fromtimestamp(last_seen)
+
+        capacity = self.rssi_capacity if self.rssi_capacity is not None else \
+            device.rssis.capacity
+        samples = self._reader.execute(
+            "SELECT timestamp, rssi FROM rssi_samples WHERE address = ? "
+            "ORDER BY timestamp DESC, rowid DESC LIMIT ?", (address, capacity)
+        ).fetchall()
+        samples.reverse()
+        device.rssis = RSSIHistory.restore(
+            (t for t, _ in samples), (v for _, v in samples), rssi_count,
+            rssi_total, rssi_minimum, rssi_maximum, rssi_ema, capacity
+        )
+        self._rssi_written[address] = device.rssis.pushed
+
+        records: Dict[Tuple[str, str], Dict[bytes, PayloadRecord]] = dict()
+        for kind, key, payload, count, p_first_seen, p_last_seen in self._reader.execute(
+                "SELECT kind, key, payload, count, first_seen, last_seen "
+                "FROM payloads WHERE address = ?", (address,)):
+            records.setdefault((kind, key), dict())[bytes(payload)] = \
+                PayloadRecord(p_first_seen, p_last_seen, count)
+        for (kind, key), payload_records in records.items():
+            if kind == MANUFACTURER_DATA:
+                device.manufacturer_data[int(key)] = PayloadHistory.restore(payload_records)
+            else:
+                device.service_data[key] = PayloadHistory.restore(payload_records)
+
+        parents: Dict[str, Any] = {path: device}
+        for g_path, parent, kind, uuid, primary, value, flags in self._reader.execute(
+                "SELECT path, parent, kind, uuid, primary_service, value, flags "
+                "FROM gatt WHERE address = ? ORDER BY CASE kind "
+                "WHEN 'service' THEN 0 WHEN 'characteristic' THEN 1 ELSE 2 END",
+                (address,)):
+            if kind == "service":
+                obj = GATTService(uuid, bool(primary))
+            elif kind == "characteristic":
+                obj = GATTCharacteristic(uuid, json.loads(value), json.loads(flags))
+            else:
+                obj = GATTDescriptor(uuid, json.loads(value), json.loads(flags))
+            if parent in parents:
+                parents[parent][g_path] = obj
+                parents[g_path] = obj
+
+        device.dirty = False
+        return device
+
+    def __init__(self, path: pathlib.Path, rssi_capacity: int = None) -> None:
+        self.path = path
+        self.rssi_capacity = rssi_capacity
+        self._log = logging.getLogger("btlesniffer.SQLiteBackup")
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer_connection: Optional[sqlite3.Connection] = None
+        self._unloaded: Dict[str, str] = dict()
+        self._unloaded_paths: Dict[str, str] = dict()
+        self._rssi_written: Dict[str, int] = dict()
+        # Without a previous load, the database is started afresh.
+        self._reset = True
+        # Whether the file holds a backup of another mode, which is
+        # converted by writing a new database and replacing the file.
+        self._replace = False
+        self.writer = BackgroundWriter(None, self._append_records)
+
+    def __len__(self) -> int:
+        return len(self._unloaded)
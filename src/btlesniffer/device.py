@@ -5,18 +5,35 @@ Provides the Device abstraction of a Bluetooth device akin to org.bluez.Device1.
 """
 
 import datetime
-from typing import Dict, Any, Optional, Sequence, MutableMapping
+import time
+from typing import Dict, Any, Iterable, Optional, Sequence, MutableMapping, \
+    Tuple
 
+from .compact import Slotted
 from .hci_constants import CompanyId, uuid_to_string
+from .payload import PayloadHistory
+from .rssi import RSSIHistory
 
 
-class GATTDescriptor(object):
+class GATTDescriptor(Slotted):
+    __slots__ = ("uuid", "value", "flags")
+
     def __init__(self, uuid: str, value: Optional[Sequence[int]],
                  flags: Optional[Sequence[str]]):
         self.uuid = uuid
         self.value = value
         self.flags = flags
 
+    def update(self, other: "GATTDescriptor") -> None:
+        """
+        Merge a more recent record of the descriptor into this one.
+        """
+        self.uuid = other.uuid
+        if other.value is not None:
+            self.value = other.value
+        if other.flags is not None:
+            self.flags = other.flags
+
     def __str__(self):
         name = uuid_to_string(self.uuid)
         if name is None:
@@ -27,7 +44,9 @@ class GATTDescriptor(object):
         return "<{!s}>".format(self)
 
 
-class GATTCharacteristic(object):
+class GATTCharacteristic(Slotted):
+    __slots__ = ("uuid", "value", "flags", "descriptors")
+
     def __init__(self, uuid: str, value: Optional[Sequence[int]],
                  flags: Sequence[str]):
         self.uuid = uuid
@@ -35,6 +54,22 @@ class GATTCharacteristic(object):
         self.flags = flags
         self.descriptors: MutableMapping[str, GATTDescriptor] = dict()
 
+    def update(self, other: "GATTCharacteristic") -> None:
+        """
+        Merge a more recent record of the characteristic, including its
+        descriptors, into this one.
+        """
+        self.uuid = other.uuid
+        if other.value is not None:
+            self.value = other.value
+        if other.flags is not None:
+            self.flags = other.flags
+        for path, descriptor in other.descriptors.items():
+            if path in self.descriptors:
+                self.descriptors[path].update(descriptor)
+            else:
+                self.descriptors[path] = descriptor
+
     def __str__(self):
         name = uuid_to_string(self.uuid)
         if name is None:
@@ -51,12 +86,27 @@ class GATTCharacteristic(object):
         self.descriptors[path] = descriptor
 
 
-class GATTService(object):
+class GATTService(Slotted):
+    __slots__ = ("uuid", "primary", "characteristics")
+
     def __init__(self, uuid: str, primary: bool):
         self.uuid = uuid
         self.primary = primary
         self.characteristics: MutableMapping[str, GATTCharacteristic] = dict()
 
+    def update(self, other: "GATTService") -> None:
+        """
+        Merge a more recent record of the service, including its
+        characteristics, into this one.
+        """
+        self.uuid = other.uuid
+        self.primary = other.primary
+        for path, characteristic in other.characteristics.items():
+            if path in self.characteristics:
+                self.characteristics[path].update(characteristic)
+            else:
+                self.characteristics[path] = characteristic
+
     def __str__(self):
         name = uuid_to_string(self.uuid)
         if name is None:
@@ -73,9 +123,20 @@ class GATTService(object):
         self.characteristics[path] = characteristic
 
 
-class Device(object):
+class Device(Slotted):
+    __slots__ = ("active", "path", "address", "paired", "connected",
+                 "services_resolved", "name", "device_class", "appearance",
+                 "uuids", "rssis", "tx_power", "first_seen", "last_seen",
+                 "services", "manufacturer_data", "service_data", "dirty")
+
     @classmethod
-    def create_from_dbus_dict(cls, path: str, data: Dict[str, Any]) -> "Device":
+    def create_from_dbus_dict(cls, path: str, data: Dict[str, Any],
+                              rssi_capacity: int = None,
+                              timestamp: float = None) -> "Device":
+        """
+        Create the device from a D-Bus property dictionary received at the
+        given POSIX time (by default now).
+        """
         return cls(
             path,
             data["Address"],
@@ -89,11 +150,25 @@ class Device(object):
             data.get("RSSI", None),
             data.get("TxPower", None),
             data.get("ManufacturerData", dict()),
-            data.get("ServiceData", dict())
+            data.get("ServiceData", dict()),
+            rssi_capacity,
+            timestamp
         )
 
-    def update_from_dbus_dict(self, path: str, data: Dict[str, Any]) -> None:
-        self.last_seen = datetime.datetime.now()
+    def update_from_dbus_dict(self, path: str, data: Dict[str, Any],
+                              timestamp: float = None,
+                              samples: Iterable[Tuple[float, Dict[str, Any]]] = ()) -> None:
+        """
+        Update the device from a D-Bus property dictionary received at the
+        given POSIX time (by default now). The samples are a batch of
+        further dictionaries of RSSI and advertisement data with the times
+        they were received at, which are all recorded after the data; their
+        RSSI samples are appended in bulk.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.dirty = True
+        self.last_seen = datetime.datetime.fromtimestamp(timestamp)
         self.active = True
         self.path = path
         if "Address" in data:
@@ -112,25 +187,37 @@ class Device(object):
             self.appearance = data["Appearance"]
         if "UUIDs" in data:
             self.uuids = self.uuids.union(data["UUIDs"])
-        if "RSSI" in data:
-            self.rssis.append(data["RSSI"])
         if "TxPower" in data:
             self.tx_power = data["TxPower"]
+        if "RSSI" in data:
+            self.rssis.append(data["RSSI"], timestamp)
+        self._add_payloads(data, timestamp)
+
+        rssi_timestamps = list()
+        rssi_values = list()
+        for sample_timestamp, sample in samples:
+            if "RSSI" in sample:
+                rssi_timestamps.append(sample_timestamp)
+                rssi_values.append(sample["RSSI"])
+            self._add_payloads(sample, sample_timestamp)
+        if len(rssi_values) > 0:
+            self.rssis.extend_samples(rssi_timestamps, rssi_values)
+
+    def _add_payloads(self, data: Dict[str, Any], timestamp: float) -> None:
         if "ManufacturerData" in data:
             for k, v in data["ManufacturerData"].items():
-                if k in self.manufacturer_data:
-                    self.manufacturer_data[k].append(v)
-                else:
-                    self.manufacturer_data[k] = [v]
+                if k not in self.manufacturer_data:
+                    self.manufacturer_data[k] = PayloadHistory()
+                self.manufacturer_data[k].add(v, timestamp)
         if "ServiceData" in data:
             self.uuids = self.uuids.union(data["ServiceData"].keys())
             for k, v in data["ServiceData"].items():
-                if k in self.service_data:
-                    self.service_data[k].append(v)
-                else:
-                    self.service_data[k] = [v]
+                if k not in self.service_data:
+                    self.service_data[k] = PayloadHistory()
+                self.service_data[k].add(v, timestamp)
 
     def update_from_device(self, device: "Device") -> None:
+        self.dirty = True
         self.active = device.active
         self.path = device.path
         self.address = device.address
@@ -151,16 +238,22 @@ class Device(object):
         self.last_seen = device.last_seen
         for k, v in device.manufacturer_data.items():
             if k in self.manufacturer_data:
-                self.manufacturer_data[k].extend(v)
+                self.manufacturer_data[k].update(v)
             else:
                 self.manufacturer_data[k] = v
 
         for k, v in device.service_data.items():
             if k in self.service_data:
-                self.service_data[k].extend(v)
+                self.service_data[k].update(v)
             else:
                 self.service_data[k] = v
 
+        for k, v in device.services.items():
+            if k in self.services:
+                self.services[k].update(v)
+            else:
+                self.services[k] = v
+
     def __init__(self,
                  path: str, address: str,
                  paired: bool, connected: bool, services_resolved: bool,
@@ -168,7 +261,10 @@ class Device(object):
                  appearance: Optional[int] = None, uuids: Sequence[str] = None,
                  rssi: int = None, tx_power: int = None,
                  manufacturer_data: Dict[int, Sequence[int]] = None,
-                 service_data: Dict[str, Sequence[int]] = None) -> None:
+                 service_data: Dict[str, Sequence[int]] = None,
+                 rssi_capacity: int = None, timestamp: float = None) -> None:
+        if timestamp is None:
+            timestamp = time.time()
         self.active = True
         self.path = path
         self.address = address
@@ -179,22 +275,45 @@ class Device(object):
         self.device_class = device_class
         self.appearance = appearance
         self.uuids = set(uuids) if uuids is not None else set()
-        self.rssis = [rssi] if rssi is not None else list()
+        self.rssis = RSSIHistory(rssi_capacity)
+        if rssi is not None:
+            self.rssis.append(rssi, timestamp)
         self.tx_power = tx_power
-        self.first_seen = datetime.datetime.now()
-        self.last_seen = datetime.datetime.now()
+        self.first_seen = datetime.datetime.fromtimestamp(timestamp)
+        self.last_seen = self.first_seen
         self.services: MutableMapping[str, GATTService] = dict()
+        self.dirty = True
 
-        self.manufacturer_data = dict()
+        self.manufacturer_data: MutableMapping[int, PayloadHistory] = dict()
         if manufacturer_data is not None:
             for k, v in manufacturer_data.items():
-                self.manufacturer_data[k] = [v]
+                self.manufacturer_data[k] = PayloadHistory()
+                self.manufacturer_data[k].add(v, timestamp)
 
-        self.service_data = dict()
+        self.service_data: MutableMapping[str, PayloadHistory] = dict()
         if service_data is not None:
             self.uuids = self.uuids.union(service_data.keys())
             for k, v in service_data.items():
-                self.service_data[k] = [v]
+                self.service_data[k] = PayloadHistory()
+                self.service_data[k].add(v, timestamp)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        del state["dirty"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        state["dirty"] = False
+        if isinstance(state.get("rssis"), list):
+            state["rssis"] = RSSIHistory.from_samples(state["rssis"])
+        for attr in ("manufacturer_data", "service_data"):
+            for k, v in state.get(attr, dict()).items():
+                if isinstance(v, list):
+                    state[attr][k] = PayloadHistory.from_samples(
+                        v, state["first_seen"].timestamp(),
+                        state["last_seen"].timestamp()
+                    )
+        super().__setstate__(state)
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, Device):
@@ -204,7 +323,7 @@ class Device(object):
 
     def __str__(self) -> str:
         name = self.name if self.name is not None else "Unknown"
-        rssi = self.rssis[-1] if len(self.rssis) > 0 else -120
+        rssi = self.rssis.last if self.rssis.last is not None else -120
         vendors = list()
         for k in self.manufacturer_data.keys():
             try:
@@ -237,6 +356,7 @@ class Device(object):
         return self.services[path]
 
     def __setitem__(self, path: str, service: GATTService):
+        self.dirty = True
         self.uuids.add(service.uuid)
         self.services[path] = service
 
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the early filtering of BlueZ signals by device address, RSSI and
+adapter, preferably by D-Bus match rules such that the bus daemon drops the
+filtered signals before they reach the sniffer.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from .util import SERVICE_NAME, DEVICE_INTERFACE, OBJECT_MANAGER_INTERFACE, \
+    PROPERTIES_INTERFACE
+
+# The most allowed devices that get a match rule of their own; beyond that,
+# the allow list is applied by the callbacks. The system bus limits the
+# match rules of a connection (512 by default).
+MAX_DEVICE_RULES = 256
+
+
+def device_path(adapter_path: str, address: str) -> str:
+    """
+    Return the object path of a device of the adapter, as BlueZ assigns it.
+    """
+    return "{}/dev_{}".format(adapter_path, address.upper().replace(":", "_"))
+
+
+def device_of(path: str) -> str:
+    """
+    Return the device object path that a device or GATT object path
+    belongs to (e.g. `/org/bluez/hci0/dev_XX_XX_XX_XX_XX_XX`).
+    """
+    return "/".join(path.split("/", 5)[:5])
+
+
+class SignalFilter(object):
+    """
+    Select the signals of the devices of one adapter, optionally limited to
+    an allow list of addresses, except for a deny list, and drop RSSI
+    samples below a minimum. The object manager signals are matched by the
+    adapter's path namespace, the PropertiesChanged signals by the allowed
+    device paths or the namespace. The deny list and the minimum RSSI
+    cannot be expressed as match rules and are checked by the callbacks.
+    """
+    def match_rules(self) -> List[str]:
+        """
+        Return the D-Bus match rules for the signals the sniffer receives.
+        """
+        rules = list()
+        for member in ("InterfacesAdded", "InterfacesRemoved"):
+            rule = "type='signal',sender='{}',interface='{}',member='{}'".format(
+                SERVICE_NAME, OBJECT_MANAGER_INTERFACE, member
+            )
+            if self.namespace:
+                rule += ",arg0path='{}/'".format(self.adapter_path)
+            rules.append(rule)
+
+        rule = "type='signal',sender='{}',interface='{}'," \
+               "member='PropertiesChanged',arg0='{}'".format(
+                   SERVICE_NAME, PROPERTIES_INTERFACE, DEVICE_INTERFACE
+               )
+        if self.allowed is not None and len(self.allowed) <= MAX_DEVICE_RULES:
+            rules.extend("{},path='{}'".format(rule, p) for p in sorted(self.allowed))
+        elif self.namespace or self.allowed is not None:
+            rules.append("{},path_namespace='{}'".format(rule, self.adapter_path))
+        else:
+            rules.append(rule)
+        return rules
+
+    def accepts_path(self, path: str) -> bool:
+        """
+        Return whether the signals of the device or GATT object are
+        recorded.
+        """
+        if not self.restricted:
+            return True
+        device = device_of(path)
+        if self.namespace and not device.startswith(self.adapter_path + "/"):
+            return False
+        if self.allowed is not None and device not in self.allowed:
+            return False
+        return device not in self.denied
+
+    def filter_properties(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return the changed properties without an RSSI sample below the
+        minimum, or None if nothing else is left to record. Advertising
+        data that arrives with a weak sample is kept.
+        """
+        if self.min_rssi is None:
+            return data
+        rssi = data.get("RSSI")
+        if rssi is None or rssi >= self.min_rssi:
+            return data
+        data = dict(data)
+        del data["RSSI"]
+        return data or None
+
+    def __init__(self, adapter_path: str, allow: Optional[Iterable[str]] = None,
+                 deny: Iterable[str] = (), min_rssi: int = None,
+                 namespace: bool = False) -> None:
+        self.adapter_path = adapter_path
+        self.namespace = namespace
+        if allow is not None:
+            self.allowed = frozenset(device_path(adapter_path, a) for a in allow)
+        else:
+            self.allowed = None
+        self.denied = frozenset(device_path(adapter_path, a) for a in deny)
+        self.min_rssi = min_rssi
+        self.restricted = namespace or self.allowed is not None or \
+            len(self.denied) > 0
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the suppression of RSSI jitter, which folds small changes of the
+signal strength into the statistics of a device instead of recording them.
+"""
+
+import datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .device import Device
+
+
+class RSSIHysteresis(object):
+    """
+    Decide which RSSI samples of a device are jitter. A sample is jitter if
+    it differs by less than `delta` dB from the last recorded one, arrives
+    within `interval` seconds of it, does not cross any of the thresholds
+    and carries no payload that the device has not sent before. Jitter only
+    updates the RSSI statistics, the payload counters and the time of last
+    sighting, without marking the device as changed; everything else is
+    recorded as usual.
+    """
+    def filter(self, device: Device,
+               samples: Sequence[Tuple[float, Dict[str, Any]]]) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Fold the jitter among the samples (oldest first) into the device
+        and return the samples that are to be recorded.
+        """
+        rssis = device.rssis
+        last, last_timestamp = rssis.last, rssis.last_timestamp
+        kept = list()
+        for timestamp, sample in samples:
+            rssi = sample.get("RSSI")
+            if rssi is not None and last is not None \
+                    and abs(rssi - last) < self.delta \
+                    and timestamp - last_timestamp < self.interval \
+                    and all((rssi >= t) == (last >= t) for t in self.thresholds) \
+                    and not self._has_new_payload(device, sample):
+                rssis.fold(rssi)
+                self._fold_payloads(device, sample, timestamp)
+                device.last_seen = datetime.datetime.fromtimestamp(timestamp)
+                self.suppressed += 1
+                continue
+            kept.append((timestamp, sample))
+            if rssi is not None:
+                last, last_timestamp = rssi, timestamp
+        return kept
+
+    @staticmethod
+    def _has_new_payload(device: Device, sample: Dict[str, Any]) -> bool:
+        # Payloads of the kept samples are not yet known to the device, so
+        # repeating them within a batch records them again.
+        for key, histories in (("ManufacturerData", device.manufacturer_data),
+                               ("ServiceData", device.service_data)):
+            for k, v in sample.get(key, dict()).items():
+                history = histories.get(k)
+                if history is None or v not in history:
+                    return True
+        return False
+
+    @staticmethod
+    def _fold_payloads(device: Device, sample: Dict[str, Any],
+                       timestamp: float) -> None:
+        for k, v in sample.get("ManufacturerData", dict()).items():
+            device.manufacturer_data[k].add(v, timestamp)
+        for k, v in sample.get("ServiceData", dict()).items():
+            device.service_data[k].add(v, timestamp)
+
+    def __init__(self, delta: int, interval: float,
+                 thresholds: Sequence[int] = ()) -> None:
+        self.delta = delta
+        self.interval = interval
+        self.thresholds = tuple(thresholds)
+        self.suppressed = 0
@@ -8,22 +8,238 @@ Scan for Bluetooth Low Energy packets and attempt to identify them.
 import os
 import sys
 import argparse
+import datetime
 import logging
 import pathlib
+import re
+from typing import List
 
-from .sniffer import Sniffer
+from .backup import BACKUP_MODES, COMPRESSIONS, STREAM_MODES
+from .device import print_device
+from .hci_constants import CompanyId
+from .merge import DEFAULT_RUN_SIZE, merge_backups
+from .query import BackupIndex, load_devices
 from ._version import get_versions
 
 
 REQUIRE_PLATFORM = "linux"
 
 
+def merge(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="btlesniffer merge",
+        description="Merge device registry backups of any mode, such as "
+                    "those of several sniffers, into a single binary backup. "
+                    "Devices are merged by address; the backups are sorted "
+                    "on disk, so they may exceed the available memory."
+    )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="count",
+        default=0,
+        help="increase the verbosity of the program"
+    )
+    parser.add_argument(
+        "-o", "--out-path",
+        type=str,
+        required=True,
+        help="path to the merged backup, which may be resumed from with "
+             "`--backup-mode binary`"
+    )
+    parser.add_argument(
+        "--run-size",
+        type=int,
+        default=DEFAULT_RUN_SIZE,
+        help="how many devices to sort in memory at once (default "
+             "{}).".format(DEFAULT_RUN_SIZE)
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default="none",
+        help="compress the merged backup with the given algorithm (default "
+             "none)."
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        help="the compression level (see `btlesniffer -h`)."
+    )
+    parser.add_argument(
+        "--tmp-dir",
+        type=str,
+        help="where to keep the sorted runs (default the system temporary "
+             "directory)"
+    )
+    parser.add_argument(
+        "backups",
+        nargs="+",
+        help="paths to the device registry backups to merge"
+    )
+    args = parser.parse_args(argv)
+
+    if args.run_size < 1:
+        parser.error("the run size must be positive")
+    if args.compression_level is not None and not \
+            (1 if args.compression == "bz2" else 0) <= args.compression_level <= 9:
+        parser.error("the compression level is out of range")
+    for backup in args.backups:
+        path = pathlib.Path(backup)
+        if not path.exists() and \
+                not path.with_name(path.name + ".journal").exists():
+            parser.error("the backup {} does not exist".format(backup))
+
+    logging.basicConfig(level=logging.INFO if args.verbose > 0 else logging.WARNING)
+
+    merge_backups(
+        [pathlib.Path(b) for b in args.backups], pathlib.Path(args.out_path),
+        args.run_size, args.compression, args.compression_level,
+        pathlib.Path(args.tmp_dir) if args.tmp_dir is not None else None
+    )
+
+
+def parse_time(text: str) -> float:
+    """
+    Parse a local date and time, or a POSIX timestamp.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(
+        "'{}' is neither YYYY-MM-DD[THH:MM:SS] nor a timestamp".format(text)
+    )
+
+
+def parse_address(text: str) -> str:
+    """
+    Parse a Bluetooth device address.
+    """
+    if re.fullmatch(r"[0-9A-Fa-f]{2}(:[0-9A-Fa-f]{2}){5}", text) is None:
+        raise argparse.ArgumentTypeError(
+            "'{}' is not a device address (XX:XX:XX:XX:XX:XX)".format(text)
+        )
+    return text.upper()
+
+
+def parse_vendor(text: str) -> int:
+    """
+    Parse a company identifier by number or by name.
+    """
+    try:
+        return int(text, 0)
+    except ValueError:
+        pass
+    try:
+        return CompanyId[text].value
+    except KeyError:
+        raise argparse.ArgumentTypeError(
+            "'{}' is not a known company identifier".format(text)
+        )
+
+
+def query(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="btlesniffer query",
+        description="Print the devices of a device registry backup that "
+                    "match all given filters. The filters are answered from "
+                    "secondary indexes, which are built on the first query "
+                    "and cached next to the backup until it changes."
+    )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="count",
+        default=0,
+        help="increase the verbosity of the program"
+    )
+    parser.add_argument(
+        "--vendor",
+        type=parse_vendor,
+        help="the company identifier of advertised manufacturer data, by "
+             "number (such as 0x004c) or by name (such as AppleInc)"
+    )
+    parser.add_argument(
+        "--uuid",
+        type=str,
+        help="an advertised service UUID"
+    )
+    parser.add_argument(
+        "--min-rssi",
+        type=int,
+        help="the lower bound of the last received signal strength (in dBa)"
+    )
+    parser.add_argument(
+        "--max-rssi",
+        type=int,
+        help="the upper bound of the last received signal strength (in dBa)"
+    )
+    parser.add_argument(
+        "--since",
+        type=parse_time,
+        help="only devices last seen at or after this local time "
+             "(YYYY-MM-DD[THH:MM:SS] or a POSIX timestamp)"
+    )
+    parser.add_argument(
+        "--until",
+        type=parse_time,
+        help="only devices first seen at or before this local time"
+    )
+    parser.add_argument(
+        "--name",
+        type=str,
+        help="text that the device name contains, ignoring case"
+    )
+    parser.add_argument(
+        "--count",
+        action="store_true",
+        help="only print the number of matching devices"
+    )
+    parser.add_argument(
+        "backup",
+        help="path to the device registry backup"
+    )
+    args = parser.parse_args(argv)
+
+    path = pathlib.Path(args.backup)
+    if not path.exists() and \
+            not path.with_name(path.name + ".journal").exists():
+        parser.error("the backup {} does not exist".format(args.backup))
+
+    logging.basicConfig(level=logging.INFO if args.verbose > 0 else logging.WARNING)
+
+    index = BackupIndex.open(path)
+    addresses = index.query(args.vendor, args.uuid, args.min_rssi,
+                            args.max_rssi, args.since, args.until, args.name)
+    if args.count:
+        print(len(addresses))
+        return
+    for device in load_devices(path, addresses):
+        print_device(device)
+
+
 def main() -> None:
+    if sys.argv[1:2] == ["merge"]:
+        merge(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["query"]:
+        query(sys.argv[2:])
+        return
+
+    # Merging and querying backups works without PyGObject.
+    from .sniffer import INGESTIONS, Sniffer
+
     parser = argparse.ArgumentParser(
         prog="btlesniffer",
         description="Scan for Bluetooth Low Energy devices and gather "
                     "information about them. This program will only run on "
-                    "Linux systems."
+                    "Linux systems. Run `btlesniffer merge -h` and "
+                    "`btlesniffer query -h` to learn how to merge and query "
+                    "backups."
     )
     parser.add_argument(
         "-V", "--version",
@@ -53,7 +269,8 @@ def main() -> None:
         default=5,
         help="how frequently the device registry backup should be written "
              "(in seconds, default 5 s). If set to zero, the backup will "
-             "be written with every device update."
+             "be written through with device updates, see "
+             "`--write-through-delay` and `--write-through-events`."
     )
     parser.add_argument(
         "-r", "--resume",
@@ -80,8 +297,233 @@ def main() -> None:
         help="how frequently the sniffer shall go through the device registry "
              "and attempt to establish connections (in seconds, default 5 s)."
     )
+    parser.add_argument(
+        "--rssi-history",
+        type=int,
+        default=256,
+        help="how many received signal strength (RSSI) samples to retain per "
+             "device (default 256). Running statistics cover all samples."
+    )
+    parser.add_argument(
+        "--backup-mode",
+        choices=BACKUP_MODES,
+        default="snapshot",
+        help="how the device registry backup is written: `snapshot` dumps "
+             "the entire registry every time, `journal` appends only the "
+             "changed devices to a journal next to the snapshot, `indexed` "
+             "writes an indexed snapshot whose devices are loaded lazily "
+             "on resume, `binary` writes a snapshot in a compact, "
+             "versioned binary format instead of Pickle, `sqlite` "
+             "writes the changed devices to an SQLite database and loads "
+             "devices lazily on resume (default snapshot)."
+    )
+    parser.add_argument(
+        "--compaction-threshold",
+        type=int,
+        default=10000,
+        help="the number of journal records after which the journal is "
+             "compacted into a new snapshot (default 10000)."
+    )
+    parser.add_argument(
+        "--write-through-delay",
+        type=int,
+        default=1000,
+        help="with a backup interval of zero, the longest time a device "
+             "update may wait to be written to the backup (in milliseconds, "
+             "default 1000 ms)."
+    )
+    parser.add_argument(
+        "--write-through-events",
+        type=int,
+        default=1000,
+        help="with a backup interval of zero, the most device updates that "
+             "may wait to be written to the backup (default 1000)."
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default="none",
+        help="compress the device registry backup on the fly with the given "
+             "algorithm (default none). Only the `snapshot`, `journal` and "
+             "`binary` backup modes support compression. Compressed backups "
+             "are detected on resume regardless of this option."
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        help="the compression level, from 1 (fastest) to 9 (smallest), or "
+             "from 0 for `zlib` and `lzma` (default 6 for `zlib` and `lzma`, "
+             "9 for `bz2`)."
+    )
+    parser.add_argument(
+        "--coalescing-interval",
+        type=int,
+        default=50,
+        help="how long to gather the property changes of a device before "
+             "applying them in a single update (in milliseconds, default "
+             "50 ms). RSSI samples and advertisement data are all kept. If "
+             "set to zero, every change is applied immediately."
+    )
+    parser.add_argument(
+        "--worker-queue",
+        type=int,
+        default=0,
+        help="if set, the signal callbacks only queue the signals and a "
+             "worker thread applies them to the device registry; property "
+             "changes beyond this many queued signals are dropped, while "
+             "the discovery and loss of devices are always queued (default "
+             "0, which applies signals in the callbacks). Property changes are "
+             "then coalesced per batch of signals rather than per interval."
+    )
+    parser.add_argument(
+        "--worker-batch",
+        type=int,
+        default=256,
+        help="the most queued signals the worker applies at once "
+             "(default 256)."
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("glib", "asyncio"),
+        default="glib",
+        help="whether to run the sniffer on the GLib main loop with pydbus or "
+             "on an asyncio event loop with dbus-next (default glib)."
+    )
+    parser.add_argument(
+        "--bus-address",
+        type=str,
+        help="with the asyncio engine, the address of the D-Bus to find BlueZ "
+             "on, such as a private bus (default the system bus)."
+    )
+    parser.add_argument(
+        "--ingestion",
+        choices=INGESTIONS,
+        default="pydbus",
+        help="with the GLib engine, whether pydbus unpacks the signals or "
+             "only the recorded properties are decoded from the raw GLib "
+             "variants, discarding the signals of unknown devices early "
+             "(default pydbus)."
+    )
+    parser.add_argument(
+        "--adapter",
+        type=str,
+        help="the adapter to use, by name (e.g. `hci1`) or address; only "
+             "the signals of its devices are received (default the first "
+             "adapter, with the signals of all adapters)."
+    )
+    parser.add_argument(
+        "--allow",
+        type=parse_address,
+        action="append",
+        help="only record the device of the adapter in use with this "
+             "address; may be given several times."
+    )
+    parser.add_argument(
+        "--deny",
+        type=parse_address,
+        action="append",
+        default=[],
+        help="never record the device of the adapter in use with this "
+             "address; may be given several times."
+    )
+    parser.add_argument(
+        "--min-rssi",
+        type=int,
+        help="ignore devices and RSSI samples below this received signal "
+             "strength (in dBa). BlueZ applies it to discovery, the sniffer "
+             "drops weaker RSSI samples from the property changes."
+    )
+    parser.add_argument(
+        "--rssi-delta",
+        type=int,
+        default=0,
+        help="if set, RSSI samples that differ by less than this many dB "
+             "from the last recorded one are jitter: they only update the "
+             "RSSI statistics, unless they cross the connection threshold, "
+             "carry a new payload or the RSSI interval has passed "
+             "(default 0, which records every sample)."
+    )
+    parser.add_argument(
+        "--rssi-interval",
+        type=float,
+        default=10.0,
+        help="with an RSSI delta, the longest time between recorded RSSI "
+             "samples of a device (in seconds, default 10 s)."
+    )
+    parser.add_argument(
+        "--overload-lag",
+        type=int,
+        default=0,
+        help="if set, shed work while the main loop lags by more than this "
+             "many milliseconds or the worker queue is over half full: "
+             "first debug messages, then printing, then bare RSSI samples, "
+             "but never the discovery of devices (default 0, which never "
+             "sheds work)."
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        help="with the GLib engine, record the raw signals of BlueZ to this "
+             "file, such that they can be replayed with `--replay`."
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        help="instead of D-Bus, feed the signals of a recording to the "
+             "sniffer and print the throughput; all other options apply as "
+             "usual, except for `--connect`."
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="the pace of the replay as a multiple of the recorded one "
+             "(default 1, which is real time). If set to zero, the signals "
+             "are replayed as fast as possible."
+    )
     args = parser.parse_args()
 
+    if args.rssi_history < 1:
+        parser.error("the RSSI history must retain at least one sample")
+    if args.write_through_delay < 0 or args.write_through_events < 1:
+        parser.error("the write-through delay must not be negative and at "
+                     "least one event must be allowed to wait")
+    if args.compression != "none" and args.backup_mode not in STREAM_MODES:
+        parser.error("the {} backup mode does not support "
+                     "compression".format(args.backup_mode))
+    if args.compression_level is not None and not \
+            (1 if args.compression == "bz2" else 0) <= args.compression_level <= 9:
+        parser.error("the compression level is out of range")
+    if args.coalescing_interval < 0:
+        parser.error("the coalescing interval must not be negative")
+    if args.worker_queue < 0 or args.worker_batch < 1:
+        parser.error("the worker queue must not be negative and the worker "
+                     "batch must hold at least one signal")
+    if args.engine == "asyncio" and args.worker_queue > 0:
+        parser.error("the asyncio engine does not support the worker queue")
+    if args.engine != "asyncio" and args.bus_address is not None:
+        parser.error("the bus address requires the asyncio engine")
+    if args.min_rssi is not None and not -127 <= args.min_rssi <= 20:
+        parser.error("the minimum RSSI is out of range (-127 to 20 dBa)")
+    if args.overload_lag < 0:
+        parser.error("the overload lag must not be negative")
+    if args.rssi_delta < 0 or args.rssi_interval < 0:
+        parser.error("the RSSI delta and interval must not be negative")
+    if args.engine == "asyncio" and args.ingestion != "pydbus":
+        parser.error("the {} ingestion requires the GLib engine".format(
+            args.ingestion))
+    if args.engine == "asyncio" and \
+            (args.record is not None or args.replay is not None):
+        parser.error("recording and replaying signals require the GLib engine")
+    if args.replay is not None:
+        if args.connect or args.record is not None:
+            parser.error("a replay can neither connect to devices nor be "
+                         "recorded")
+        if not pathlib.Path(args.replay).exists():
+            parser.error("the recording {} does not exist".format(args.replay))
+    if args.replay_speed < 0:
+        parser.error("the replay speed must not be negative")
+
     if sys.platform != REQUIRE_PLATFORM:
         raise RuntimeError("You must run this programme on Linux.")
 
@@ -99,10 +541,46 @@ def main() -> None:
     else:
         backup_path = None
 
+    options = (backup_path, args.backup_interval, args.resume, args.connect,
+               args.threshold_rssi, args.connection_polling_interval,
+               args.rssi_history, args.backup_mode, args.compaction_threshold,
+               args.write_through_delay, args.write_through_events,
+               args.compression, args.compression_level,
+               args.coalescing_interval, args.worker_queue, args.worker_batch)
+    filters = dict(adapter=args.adapter, allow_addresses=args.allow,
+                   deny_addresses=args.deny, min_rssi=args.min_rssi,
+                   rssi_delta=args.rssi_delta, rssi_interval=args.rssi_interval,
+                   overload_lag=args.overload_lag)
+
+    if args.engine == "asyncio":
+        from .aio import AsyncSniffer, run_sniffer
+        run_sniffer(AsyncSniffer(*options, bus_address=args.bus_address,
+                                 **filters))
+        return
+
+    if args.replay is not None:
+        from .replay import ReplaySniffer
+        try:
+            with ReplaySniffer(*options, recording_path=pathlib.Path(args.replay),
+                               speed=args.replay_speed, ingestion=args.ingestion,
+                               **filters) as sniffer:
+                sniffer.run()
+        except KeyboardInterrupt:
+            return
+        print("Replayed {} signals in {:.3f} s ({:.0f} signals/s).".format(
+            sniffer.replayed_signals, sniffer.elapsed,
+            sniffer.replayed_signals / max(sniffer.elapsed, 1e-9)
+        ), file=sys.stderr)
+        return
+
+    if args.record is not None:
+        record_path = pathlib.Path(args.record)
+    else:
+        record_path = None
+
     try:
-        with Sniffer(backup_path, args.backup_interval, args.resume,
-                     args.connect, args.threshold_rssi,
-                     args.connection_polling_interval) as sniffer:
+        with Sniffer(*options, ingestion=args.ingestion,
+                     record_path=record_path, **filters) as sniffer:
             sniffer.run()
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the offline merge of device registry backups from several
+sniffers into one.
+"""
+
+import heapq
+import itertools
+import logging
+import pathlib
+import tempfile
+from typing import Iterable, Iterator, List, Sequence
+
+from . import codec
+from .backup import iter_backup, open_atomically
+from .device import Device
+
+DEFAULT_RUN_SIZE = 10000
+# The most runs that are merged at once, which bounds the open files.
+MAX_FAN_IN = 256
+
+_log = logging.getLogger("btlesniffer.merge")
+
+
+def _sort_key(device: Device):
+    return device.address, device.last_seen
+
+
+def write_runs(devices: Iterable[Device], directory: pathlib.Path,
+               run_size: int = DEFAULT_RUN_SIZE,
+               prefix: str = "run") -> List[pathlib.Path]:
+    """
+    Split the devices into runs of at most `run_size` devices, sort each
+    run by address and time of last sighting and write it to a binary
+    file in the directory, named after the prefix.
+    """
+    paths = list()
+    devices = iter(devices)
+    while True:
+        run = list(itertools.islice(devices, run_size))
+        if len(run) == 0:
+            return paths
+        run.sort(key=_sort_key)
+        path = directory / "{}-{:06d}.bin".format(prefix, len(paths))
+        with path.open("wb") as f:
+            codec.dump_devices(run, f)
+        paths.append(path)
+
+
+def merge_runs(paths: Sequence[pathlib.Path],
+               output: pathlib.Path) -> None:
+    """
+    Merge sorted runs into a single sorted run, without folding the records
+    of an address.
+    """
+    files = [p.open("rb") for p in paths]
+    try:
+        with output.open("wb") as f:
+            codec.dump_devices(
+                heapq.merge(*(codec.iter_devices(r) for r in files),
+                            key=_sort_key),
+                f
+            )
+    finally:
+        for r in files:
+            r.close()
+    for p in paths:
+        p.unlink()
+
+
+def merge_devices(runs: Sequence[Iterator[Device]]) -> Iterator[Device]:
+    """
+    Merge sorted runs of devices and yield one device per address. The
+    records of an address are folded with `Device.update_from_device`
+    from the least to the most recently seen one, as if the sniffer had
+    observed them in that order, except that the earliest first sighting
+    is kept.
+    """
+    merged = heapq.merge(*runs, key=_sort_key)
+    for _, records in itertools.groupby(merged, key=lambda d: d.address):
+        device = next(records)
+        for other in records:
+            first_seen = min(device.first_seen, other.first_seen)
+            device.update_from_device(other)
+            device.first_seen = first_seen
+        yield device
+
+
+def merge_backups(inputs: Sequence[pathlib.Path], output: pathlib.Path,
+                  run_size: int = DEFAULT_RUN_SIZE, compression: str = "none",
+                  compression_level: int = None,
+                  tmp_dir: pathlib.Path = None) -> int:
+    """
+    Merge the backups into a binary backup at the output path and return
+    the number of devices written. The backups are sorted externally in
+    runs of `run_size` devices and then merged in a single pass, such
+    that at most one run and one device per run are held in memory.
+    """
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        runs = list()
+        for i, path in enumerate(inputs):
+            paths = write_runs(iter_backup(path), pathlib.Path(directory),
+                               run_size, "input{:04d}".format(i))
+            _log.info("Sorted {} into {} runs.".format(path, len(paths)))
+            runs.extend(paths)
+        passes = 0
+        while len(runs) > MAX_FAN_IN:
+            passes += 1
+            merged = list()
+            for i in range(0, len(runs), MAX_FAN_IN):
+                path = pathlib.Path(directory) / "pass{:02d}-{:06d}.bin".format(
+                    passes, len(merged)
+                )
+                merge_runs(runs[i:i + MAX_FAN_IN], path)
+                merged.append(path)
+            runs = merged
+        files = [p.open("rb") for p in runs]
+        try:
+            count = 0
+            with open_atomically(output, compression, compression_level) as f:
+                codec.write_header(f)
+                for device in merge_devices([codec.iter_devices(r) for r in files]):
+                    codec.write_record(f, codec.encode_device(device))
+                    count += 1
+        finally:
+            for r in files:
+                r.close()
+    _log.info("Merged {} devices into {}.".format(count, output))
+    return count
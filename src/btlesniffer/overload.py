@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the detection of overload, which lets the sniffer shed work of
+low value while it cannot keep up with the signals of BlueZ.
+"""
+
+from typing import Optional
+
+# The shedding levels, each of which also sheds the work of the ones below:
+# the formatting of debug messages, the device events for the sinks that
+# allow shedding (such as printing), and the PropertiesChanged signals that
+# carry nothing but an RSSI sample. The discovery of devices and their
+# properties is never shed.
+SHED_DEBUG = 1
+SHED_PRINTING = 2
+SHED_SAMPLES = 3
+
+# How frequently the lag of the main loop is measured (in milliseconds).
+OVERLOAD_INTERVAL = 100
+
+
+class OverloadMonitor(object):
+    """
+    Track the lag of the main loop, i.e. how late a periodic timer fires,
+    and the backlog of queued events. With every measurement that exceeds
+    the maximum lag or backlog the shedding level rises by one; once both
+    have fallen below half their maximum, it drops by one again. The work
+    shed at each level is counted.
+    """
+    def update(self, lag: float, backlog: int = 0) -> Optional[int]:
+        """
+        Take a measurement of the lag (in seconds) and the backlog (in
+        events), and return the new shedding level if it changed.
+        """
+        self.max_observed_lag = max(self.max_observed_lag, lag)
+        load = lag / self.max_lag
+        if self.max_backlog is not None:
+            load = max(load, backlog / self.max_backlog)
+
+        level = self.level
+        if load >= 1.0:
+            level = min(level + 1, SHED_SAMPLES)
+        elif load < 0.5:
+            level = max(level - 1, 0)
+        if level == self.level:
+            return None
+        self.level = level
+        return level
+
+    def __init__(self, max_lag: float, max_backlog: int = None) -> None:
+        self.max_lag = max_lag
+        self.max_backlog = max_backlog
+        self.level = 0
+        self.max_observed_lag = 0.0
+        self.shed_debug = 0
+        self.shed_events = 0
+        self.shed_samples = 0
+
+    def __str__(self) -> str:
+        return "shedding level {}, lag at most {:.0f} ms; shed {} debug " \
+               "messages, {} device events and {} RSSI samples".format(
+                   self.level, self.max_observed_lag * 1000, self.shed_debug,
+                   self.shed_events, self.shed_samples
+               )
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides a deduplicated history of advertisement payloads, such as the
+manufacturer and service data of a device.
+"""
+
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .compact import Slotted
+
+
+class PayloadRecord(Slotted):
+    """
+    Count how often a distinct payload was seen, and when.
+    """
+    __slots__ = ("count", "first_seen", "last_seen")
+
+    def __init__(self, first_seen: float, last_seen: float = None,
+                 count: int = 1) -> None:
+        self.count = count
+        self.first_seen = first_seen
+        self.last_seen = last_seen if last_seen is not None else first_seen
+
+    def __repr__(self):
+        return "<PayloadRecord {} times, {} - {}>".format(
+            self.count, self.first_seen, self.last_seen
+        )
+
+
+class PayloadHistory(Slotted):
+    """
+    Store every distinct payload of one manufacturer or service key only
+    once, together with a hit count and the first and last time it was seen.
+    """
+    __slots__ = ("records", "_last")
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[Any], first_seen: float = 0.0,
+                     last_seen: float = None) -> "PayloadHistory":
+        """
+        Create a history from a raw list of payloads, such as those of older
+        registry backups. Since those carry no timestamps, all payloads are
+        attributed to the given time span.
+        """
+        history = cls()
+        for payload in samples:
+            history.add(payload, first_seen)
+        if last_seen is not None:
+            for record in history.records.values():
+                record.last_seen = last_seen
+        return history
+
+    @classmethod
+    def restore(cls, records: Dict[bytes, PayloadRecord]) -> "PayloadHistory":
+        """
+        Recreate a history from its records. The most recent payload is the
+        one seen last.
+        """
+        history = cls()
+        history.records = records
+        if len(records) > 0:
+            history._last = max(records, key=lambda p: records[p].last_seen)
+        return history
+
+    @staticmethod
+    def key(payload: Any) -> bytes:
+        """
+        Convert a payload into its storage form. pydbus hands byte arrays
+        over as lists of integers, which are much larger than bytes.
+        """
+        if isinstance(payload, bytes):
+            return payload
+        return bytes(payload)
+
+    @property
+    def last(self) -> Optional[bytes]:
+        """
+        Return the most recently added payload, or None if there are none.
+        """
+        return self._last
+
+    def add(self, payload: Any, timestamp: float = None) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+        payload = self.key(payload)
+        record = self.records.get(payload)
+        if record is not None:
+            record.count += 1
+            record.last_seen = max(record.last_seen, timestamp)
+        else:
+            self.records[payload] = PayloadRecord(timestamp)
+        self._last = payload
+
+    def update(self, other: "PayloadHistory") -> None:
+        """
+        Merge the payloads of another history into this one. The other
+        history is assumed to be the more recent one.
+        """
+        for payload, other_record in other.records.items():
+            record = self.records.get(payload)
+            if record is not None:
+                record.count += other_record.count
+                record.first_seen = min(record.first_seen, other_record.first_seen)
+                record.last_seen = max(record.last_seen, other_record.last_seen)
+            else:
+                self.records[payload] = PayloadRecord(
+                    other_record.first_seen, other_record.last_seen,
+                    other_record.count
+                )
+        if other.last is not None:
+            self._last = other.last
+
+    def __init__(self) -> None:
+        self.records: Dict[bytes, PayloadRecord] = dict()
+        self._last: Optional[bytes] = None
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # Older backups may carry payloads that are not yet stored as bytes.
+        records = dict()
+        for payload, record in state["records"].items():
+            records[self.key(payload)] = record
+        state["records"] = records
+        if state["_last"] is not None:
+            state["_last"] = self.key(state["_last"])
+        super().__setstate__(state)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.records)
+
+    def __contains__(self, payload: Any) -> bool:
+        return self.key(payload) in self.records
+
+    def __repr__(self):
+        return "<PayloadHistory {} distinct of {} payloads>".format(
+            len(self.records), sum(r.count for r in self.records.values())
+        )
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides queries over device registry backups, answered from secondary
+indexes that are built on the first query and cached next to the backup.
+"""
+
+import bisect
+import logging
+import pathlib
+import pickle
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, \
+    Tuple
+
+from . import codec
+from .backup import create_backup, detect_mode, iter_backup, \
+    open_decompressed, write_atomically
+from .device import Device
+
+_log = logging.getLogger("btlesniffer.query")
+
+
+def backup_stamp(path: pathlib.Path) -> Tuple[Any, ...]:
+    """
+    Return the sizes and modification times of the files of a backup, which
+    change whenever the backup is written.
+    """
+    stamp = list()
+    for p in (path, path.with_name(path.name + ".journal"),
+              path.with_name(path.name + "-wal")):
+        try:
+            st = p.stat()
+            stamp.append((st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+class _RangeIndex(object):
+    """
+    Keep the rows sorted by a numeric key, such that the rows within a
+    range of keys are found by bisection.
+    """
+    def select(self, low: float = None, high: float = None) -> Set[int]:
+        start = 0 if low is None else bisect.bisect_left(self.keys, low)
+        end = len(self.keys) if high is None else \
+            bisect.bisect_right(self.keys, high)
+        return set(self.rows[start:end])
+
+    def __init__(self, keys: Iterable[Optional[float]]) -> None:
+        pairs = sorted((k, i) for i, k in enumerate(keys) if k is not None)
+        self.keys = array("d", (k for k, _ in pairs))
+        self.rows = array("I", (i for _, i in pairs))
+
+
+class BackupIndex(object):
+    """
+    Summarise every device of a backup in one row and index the rows by
+    vendor (company identifier), advertised UUID, last RSSI and the times
+    of first and last sighting. The index is cached in a file next to the
+    backup and rebuilt once the backup has changed.
+    """
+    VERSION = 1
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "BackupIndex":
+        """
+        Return the cached index of the backup, or build and cache it.
+        """
+        index_path = path.with_name(path.name + ".index")
+        stamp = backup_stamp(path)
+        try:
+            with index_path.open("rb") as f:
+                version, cached_stamp, state = pickle.load(f)
+            if version == cls.VERSION and cached_stamp == stamp:
+                index = cls.__new__(cls)
+                index.__dict__.update(state)
+                return index
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            pass
+
+        _log.info("Building the secondary indexes of {}.".format(path))
+        index = cls(iter_backup(path))
+        try:
+            write_atomically(index_path, pickle.dumps(
+                (cls.VERSION, stamp, index.__dict__),
+                protocol=pickle.HIGHEST_PROTOCOL
+            ))
+        except OSError:
+            _log.warning("Could not cache the secondary indexes in "
+                         "{}.".format(index_path))
+        return index
+
+    def query(self, vendor: int = None, uuid: str = None,
+              min_rssi: int = None, max_rssi: int = None,
+              since: float = None, until: float = None,
+              name: str = None) -> List[str]:
+        """
+        Return the addresses of the devices that match all given filters:
+        the device advertised data of the vendor or the UUID, its last RSSI
+        lies within the range, it was seen between `since` and `until` (as
+        POSIX timestamps), and its name contains the given text, ignoring
+        case.
+        """
+        candidates: List[Set[int]] = list()
+        if vendor is not None:
+            candidates.append(set(self.by_vendor.get(vendor, ())))
+        if uuid is not None:
+            candidates.append(set(self.by_uuid.get(uuid.lower(), ())))
+        if min_rssi is not None or max_rssi is not None:
+            candidates.append(self.by_rssi.select(min_rssi, max_rssi))
+        if since is not None:
+            candidates.append(self.by_last_seen.select(low=since))
+        if until is not None:
+            candidates.append(self.by_first_seen.select(high=until))
+
+        if len(candidates) > 0:
+            candidates.sort(key=len)
+            rows = candidates[0].intersection(*candidates[1:])
+        else:
+            rows = range(len(self.addresses))
+
+        if name is not None:
+            name = name.lower()
+            rows = [i for i in rows if self.names[i] is not None and
+                    name in self.names[i].lower()]
+
+        return [self.addresses[i] for i in sorted(rows)]
+
+    def __init__(self, devices: Iterable[Device]) -> None:
+        self.addresses: List[str] = list()
+        self.names: List[Optional[str]] = list()
+        by_vendor: Dict[int, List[int]] = dict()
+        by_uuid: Dict[str, List[int]] = dict()
+        rssis: List[Optional[int]] = list()
+        first_seen: List[float] = list()
+        last_seen: List[float] = list()
+
+        for i, device in enumerate(devices):
+            self.addresses.append(device.address)
+            self.names.append(device.name)
+            for key in device.manufacturer_data:
+                by_vendor.setdefault(key, list()).append(i)
+            for u in device.uuids.union(device.service_data):
+                by_uuid.setdefault(u.lower(), list()).append(i)
+            rssis.append(device.rssis.last)
+            first_seen.append(device.first_seen.timestamp())
+            last_seen.append(device.last_seen.timestamp())
+
+        self.by_vendor = {k: array("I", v) for k, v in by_vendor.items()}
+        self.by_uuid = {k: array("I", v) for k, v in by_uuid.items()}
+        self.by_rssi = _RangeIndex(rssis)
+        self.by_first_seen = _RangeIndex(first_seen)
+        self.by_last_seen = _RangeIndex(last_seen)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+
+def load_devices(path: pathlib.Path, addresses: Iterable[str]) -> Iterator[Device]:
+    """
+    Yield the devices of a backup with the given addresses. Indexed and
+    SQLite backups load only these devices, binary backups decode only
+    their records, and Pickle snapshots and journals are loaded entirely.
+    """
+    wanted = set(addresses)
+    if len(wanted) == 0:
+        return
+    mode = detect_mode(path)
+    if mode in ("indexed", "sqlite"):
+        backup = create_backup(path, mode)
+        try:
+            registry = backup.load()
+            for address in sorted(wanted):
+                device = registry.get_by_address(address)
+                if device is not None:
+                    yield device
+        finally:
+            backup.close()
+    elif mode == "binary":
+        with open_decompressed(path) as f:
+            codec.read_header(f)
+            for record in codec.iter_records(f):
+                if codec.peek_address(record) in wanted:
+                    yield codec.decode_device(record)
+    else:
+        for device in iter_backup(path):
+            if device.address in wanted:
+                yield device
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides a compact file format for the raw BlueZ signals that the sniffer
+receives, such that captured load can be replayed without D-Bus.
+
+A recording starts with the magic bytes, the format version and the object
+path of the adapter the signals were received from, followed by one record
+per signal: its POSIX time, the index of the signal in SIGNALS, the lengths
+of the object path and the parameters, the object path and the parameters
+as a serialized, little-endian GLib variant. The stream is compressed with
+zlib at its fastest level.
+"""
+
+import gzip
+import logging
+import pathlib
+import struct
+import sys
+import time
+from contextlib import ExitStack
+from typing import BinaryIO, Iterator, Tuple
+
+from gi.repository import GLib
+
+from .backup import open_decompressed
+from .codec import FormatError
+from .util import OBJECT_MANAGER_INTERFACE, PROPERTIES_INTERFACE
+
+MAGIC = b"BTLEREC"
+VERSION = 1
+
+# The recorded signals with their interfaces and the types of their
+# parameters, in the order of their indexes.
+SIGNALS = (
+    ("InterfacesAdded", OBJECT_MANAGER_INTERFACE, "(oa{sa{sv}})"),
+    ("InterfacesRemoved", OBJECT_MANAGER_INTERFACE, "(oas)"),
+    ("PropertiesChanged", PROPERTIES_INTERFACE, "(sa{sv}as)"),
+)
+
+_VERSION = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_RECORD = struct.Struct("<dBHI")
+
+_INDEXES = {signal: i for i, (signal, _, _) in enumerate(SIGNALS)}
+_TYPES = tuple(GLib.VariantType.new(t) for _, _, t in SIGNALS)
+
+_log = logging.getLogger("btlesniffer.recording")
+
+
+def _read_exactly(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) < size:
+        raise EOFError()
+    return data
+
+
+class SignalRecorder(object):
+    """
+    Append the signals to a recording as they arrive. The compressed
+    stream is only complete once the recorder is closed; a recording that
+    was cut short can still be read up to the last complete signal.
+    """
+    def record(self, path: str, signal: str, params: GLib.Variant,
+               timestamp: float = None) -> None:
+        """
+        Record the parameters of the signal from the object path.
+        """
+        if not params.is_normal_form():
+            params = params.get_normal_form()
+        if sys.byteorder == "big":
+            params = params.byteswap()
+        data = params.get_data_as_bytes().get_data()
+        encoded_path = path.encode("utf-8")
+        self._stream.write(_RECORD.pack(
+            time.time() if timestamp is None else timestamp,
+            _INDEXES[signal], len(encoded_path), len(data)
+        ))
+        self._stream.write(encoded_path)
+        self._stream.write(data)
+        self.signals += 1
+
+    def close(self) -> None:
+        self._stream.close()
+        self._file.close()
+
+    def __init__(self, path: pathlib.Path, adapter_path: str) -> None:
+        self.path = path
+        self.signals = 0
+        self._file = path.open("wb")
+        self._stream = gzip.GzipFile(fileobj=self._file, mode="wb",
+                                     compresslevel=1)
+        encoded_path = adapter_path.encode("utf-8")
+        self._stream.write(MAGIC)
+        self._stream.write(_VERSION.pack(VERSION))
+        self._stream.write(_U16.pack(len(encoded_path)))
+        self._stream.write(encoded_path)
+
+
+class SignalReader(object):
+    """
+    Read the signals of a recording, oldest first, as tuples of their
+    POSIX time, object path, interface, name and parameters.
+    """
+    def __iter__(self) -> Iterator[Tuple[float, str, str, str, GLib.Variant]]:
+        f = self._stream
+        while True:
+            try:
+                header = f.read(_RECORD.size)
+                if len(header) == 0:
+                    return
+                if len(header) < _RECORD.size:
+                    raise EOFError()
+                timestamp, index, path_length, length = _RECORD.unpack(header)
+                path = _read_exactly(f, path_length).decode("utf-8")
+                data = _read_exactly(f, length)
+            except EOFError:
+                _log.warning("The recording {} was cut short.".format(self.path))
+                return
+            if index >= len(SIGNALS):
+                raise FormatError("Unknown signal {} in the recording.".format(index))
+            signal, interface, _ = SIGNALS[index]
+            params = GLib.Variant.new_from_bytes(_TYPES[index],
+                                                 GLib.Bytes.new(data), False)
+            if sys.byteorder == "big":
+                params = params.byteswap()
+            yield timestamp, path, interface, signal, params
+
+    def close(self) -> None:
+        self._stack.close()
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._stack = ExitStack()
+        self._stream = self._stack.enter_context(open_decompressed(path))
+        try:
+            if self._stream.read(len(MAGIC)) != MAGIC:
+                raise FormatError("Not a signal recording.")
+            version, = _VERSION.unpack(_read_exactly(self._stream, _VERSION.size))
+            if version > VERSION:
+                raise FormatError("Unsupported recording version {}.".format(version))
+            length, = _U16.unpack(_read_exactly(self._stream, _U16.size))
+            self.adapter_path = _read_exactly(self._stream, length).decode("utf-8")
+        except EOFError:
+            self._stack.close()
+            raise FormatError("The recording {} is truncated.".format(path))
+        except Exception:
+            self._stack.close()
+            raise
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the DeviceRegistry, a collection of devices indexed by their address
+and by their D-Bus object path.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .device import Device, GATTService, GATTCharacteristic, GATTDescriptor
+
+GATTObject = Union[GATTService, GATTCharacteristic, GATTDescriptor]
+
+
+class DeviceRegistry(object):
+    """
+    Keep track of all discovered devices. Devices may be looked up in
+    constant time by their address and by their D-Bus object path.
+
+    A registry may be backed by a loader (such as a database backup) that
+    supplies previously seen devices on their first lookup. Iteration only
+    covers the devices that are loaded.
+    """
+    @classmethod
+    def from_backup(cls, obj: Any) -> "DeviceRegistry":
+        """
+        Convert an unpickled registry backup into a DeviceRegistry. Older
+        backups contain a plain list of devices.
+        """
+        if isinstance(obj, cls):
+            return obj
+        return cls(obj)
+
+    def get_by_address(self, address: str) -> Optional[Device]:
+        device = self._by_address.get(address)
+        if device is None and self.loader is not None:
+            device = self._load(self.loader.load_by_address(address))
+        return device
+
+    def get_by_path(self, path: str) -> Optional[Device]:
+        device = self._by_path.get(path)
+        if device is None and self.loader is not None:
+            device = self._load(self.loader.load_by_path(path))
+        return device
+
+    def lookup(self, path: str) -> Tuple[Optional[Device], Any]:
+        """
+        Map any BlueZ object path to the owning device and the object
+        registered at that path (a device or one of its GATT objects).
+        """
+        obj = self._gatt_by_path.get(path)
+        if obj is not None:
+            return obj
+        device = self.get_by_path(path)
+        if device is not None:
+            return device, device
+        return None, None
+
+    def find(self, device: Device) -> Optional[Device]:
+        """
+        Return the registered device that is equal to the given one.
+        """
+        return self.get_by_address(device.address)
+
+    def add(self, device: Device) -> Tuple[Device, bool]:
+        """
+        Register the device or merge it into the already registered device
+        with the same address. Return the registered device and whether it
+        is new to the registry.
+        """
+        d = self.find(device)
+        if d is not None:
+            address, path = d.address, d.path
+            d.update_from_device(device)
+            self._index_gatt(d)
+            self.reindex(d, address, path)
+            self.mark_dirty(d)
+            return d, False
+        else:
+            self._insert(device)
+            self.mark_dirty(device)
+            return device, True
+
+    def put(self, device: Device) -> None:
+        """
+        Register the device, replacing any registered device with the same
+        address instead of merging the two.
+        """
+        d = self.find(device)
+        if d is not None:
+            self._remove(d)
+        self._insert(device)
+
+    def add_gatt(self, path: str, parent_path: str,
+                 obj: GATTObject) -> List[Tuple[Device, GATTObject]]:
+        """
+        Attach a GATT service, characteristic or descriptor to the object
+        registered at the parent path. If the parent is not yet known, the
+        object is buffered until the parent arrives. Return the attached
+        objects with their owning device: the object itself, followed by
+        the buffered objects below it, or nothing if it was buffered.
+        """
+        device, parent = self.lookup(parent_path)
+        if parent is None:
+            self._pending.setdefault(parent_path, list()).append((path, obj))
+            return []
+        parent[path] = obj
+        self._gatt_by_path[path] = (device, obj)
+        self.mark_dirty(device)
+        return [(device, obj)] + self._flush_pending(path)
+
+    def discard_pending(self, path: str) -> None:
+        """
+        Drop all buffered GATT objects that belong below the given path.
+        """
+        prefix = path + "/"
+        for parent_path in list(self._pending.keys()):
+            if parent_path == path or parent_path.startswith(prefix):
+                del self._pending[parent_path]
+
+    def update_device(self, device: Device, path: str,
+                      data: Dict[str, Any], timestamp: float = None,
+                      samples: Iterable[Tuple[float, Dict[str, Any]]] = ()) -> None:
+        """
+        Update a registered device from a D-Bus property dictionary (see
+        `Device.update_from_dbus_dict`) and keep the indexes consistent.
+        """
+        address, old_path = device.address, device.path
+        device.update_from_dbus_dict(path, data, timestamp, samples)
+        self.reindex(device, address, old_path)
+        self.mark_dirty(device)
+
+    @property
+    def dirty(self) -> bool:
+        """
+        Return whether any device changed since the last backup.
+        """
+        return len(self._dirty) > 0
+
+    def mark_dirty(self, device: Device) -> None:
+        """
+        Note that a registered device has changed since the last backup.
+        """
+        device.dirty = True
+        self._dirty[device.address] = device
+
+    def pop_dirty(self) -> List[Device]:
+        """
+        Return the devices that changed since the last call and mark them
+        as clean.
+        """
+        dirty = list(self._dirty.values())
+        for device in dirty:
+            device.dirty = False
+        self._dirty.clear()
+        return dirty
+
+    def reindex(self, device: Device, old_address: str, old_path: str) -> None:
+        """
+        Move the index entries of a device after its address or path changed.
+        """
+        if device.address != old_address:
+            if self._by_address.get(old_address) is device:
+                del self._by_address[old_address]
+            other = self.get_by_address(device.address)
+            if other is not None and other is not device:
+                # Fold the previous record into this one, but keep the
+                # current state of the device.
+                active, path, last_seen = device.active, device.path, device.last_seen
+                device.update_from_device(other)
+                device.active, device.path, device.last_seen = active, path, last_seen
+                self._index_gatt(device)
+                if self._by_path.get(other.path) is other:
+                    del self._by_path[other.path]
+            self._by_address[device.address] = device
+        if device.path != old_path:
+            if self._by_path.get(old_path) is device:
+                del self._by_path[old_path]
+            self._by_path[device.path] = device
+            self._flush_pending(device.path)
+
+    def _insert(self, device: Device) -> None:
+        self._by_address[device.address] = device
+        self._by_path[device.path] = device
+        self._index_gatt(device)
+        self._flush_pending(device.path)
+
+    def _index_gatt(self, device: Device) -> None:
+        for path, obj in self._gatt_objects(device):
+            self._gatt_by_path[path] = (device, obj)
+
+    def _load(self, device: Optional[Device]) -> Optional[Device]:
+        if device is not None:
+            self._insert(device)
+        return device
+
+    def _remove(self, device: Device) -> None:
+        del self._by_address[device.address]
+        if self._by_path.get(device.path) is device:
+            del self._by_path[device.path]
+        for path, _ in self._gatt_objects(device):
+            if self._gatt_by_path.get(path, (None, None))[0] is device:
+                del self._gatt_by_path[path]
+        self._dirty.pop(device.address, None)
+
+    @staticmethod
+    def _gatt_objects(device: Device) -> Iterator[Tuple[str, GATTObject]]:
+        for s_path, service in device.services.items():
+            yield s_path, service
+            for c_path, characteristic in service.characteristics.items():
+                yield c_path, characteristic
+                for d_path, descriptor in characteristic.descriptors.items():
+                    yield d_path, descriptor
+
+    def _flush_pending(self, path: str) -> List[Tuple[Device, GATTObject]]:
+        attached = list()
+        for child_path, child in self._pending.pop(path, ()):
+            attached.extend(self.add_gatt(child_path, path, child))
+        return attached
+
+    def __init__(self, devices: Iterable[Device] = None,
+                 loader: Any = None) -> None:
+        self.loader = loader
+        self._by_address: Dict[str, Device] = dict()
+        self._by_path: Dict[str, Device] = dict()
+        self._gatt_by_path: Dict[str, Tuple[Device, GATTObject]] = dict()
+        self._pending: Dict[str, List[Tuple[str, GATTObject]]] = dict()
+        self._dirty: Dict[str, Device] = dict()
+        if devices is not None:
+            for device in devices:
+                self.add(device)
+            self.pop_dirty()
+
+    def __iter__(self) -> Iterator[Device]:
+        return iter(list(self._by_address.values()))
+
+    def __len__(self) -> int:
+        if self.loader is not None:
+            return len(self._by_address) + len(self.loader)
+        return len(self._by_address)
+
+    def __contains__(self, device: Any) -> bool:
+        return isinstance(device, Device) and self.find(device) is not None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"devices": list(self._by_address.values())}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["devices"])
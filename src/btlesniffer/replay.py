@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the replay of recorded BlueZ signals to a sniffer without D-Bus,
+which reproduces captured load as a repeatable throughput benchmark.
+"""
+
+import time
+
+from gi.repository import GLib
+
+from .recording import SignalReader
+from .sniffer import Sniffer
+
+# How many signals are replayed before other sources of the main loop, such
+# as the coalescing timer, get to run.
+REPLAY_CHUNK = 256
+
+
+class ReplaySniffer(Sniffer):
+    """
+    Feed the signals of a recording to the sniffer as if they arrived from
+    BlueZ, at their recorded pace multiplied by the speed, or as fast as
+    possible with a speed of zero. The signals pass the ingestion, filters,
+    coalescing, worker, sinks and backup exactly as live ones, but are
+    timestamped as they are replayed. Devices are never connected to.
+    """
+    def run(self):
+        """
+        Replay the recording on a GLib main loop until it is exhausted and
+        the pending property changes are applied.
+        """
+        if self._reader is None:
+            raise ValueError("ReplaySniffer.run can only be called in a context "
+                             "(e.g. `with ReplaySniffer(...) as s: s.run()`)")
+
+        self._start_worker()
+        self._start_overload_monitor()
+        if self.output_path is not None and self.backup_interval > 0:
+            GLib.timeout_add_seconds(self.backup_interval, self._cb_backup_registry)
+
+        self._log.debug("Replaying the signals of {}.".format(self.recording_path))
+        self._signals = iter(self._reader)
+        self._main_loop = GLib.MainLoop()
+        self._started = time.monotonic()
+        GLib.idle_add(self._cb_replay)
+        self._main_loop.run()
+        if self._worker is not None:
+            self._log.debug("Waiting for the worker to drain the event queue.")
+            self._events.put(None)
+            self._worker.join()
+            self._worker = None
+        self.elapsed = time.monotonic() - self._started
+
+        self._log.info("Replayed {} signals in {:.3f} s.".format(
+            self.replayed_signals, self.elapsed))
+
+    def _cb_replay(self):
+        """
+        Replay the signals that are due, up to a chunk at once, and wait
+        for the next one otherwise.
+        """
+        for _ in range(REPLAY_CHUNK):
+            if self._next is None:
+                self._next = next(self._signals, None)
+                if self._next is None:
+                    self._finish()
+                    return False
+            timestamp, path, iface, signal, params = self._next
+            if self.speed > 0:
+                if self._first_timestamp is None:
+                    self._first_timestamp = timestamp
+                delay = (timestamp - self._first_timestamp) / self.speed - \
+                    (time.monotonic() - self._started)
+                if delay > 0:
+                    GLib.timeout_add(int(delay * 1000) + 1, self._cb_replay)
+                    return False
+            self._next = None
+            self._dispatch_signal(path, iface, signal, params)
+            self.replayed_signals += 1
+
+        return True
+
+    def _finish(self):
+        """
+        Apply the property changes and the backup that would otherwise wait
+        for their timers, and end the main loop.
+        """
+        self._flush_pending()
+        self._main_loop.quit()
+
+    def __enter__(self):
+        self._reader = SignalReader(self.recording_path)
+        self._filter = self._create_filter(self._reader.adapter_path)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        return super().__exit__(exc_type, exc_val, exc_tb)
+
+    def __init__(self, *args, recording_path=None, speed=1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        if recording_path is None:
+            raise ValueError("A recording to replay is required.")
+        if self.attempt_connection:
+            raise ValueError("Devices cannot be connected to during a replay.")
+        if self.record_path is not None:
+            raise ValueError("A replay cannot be recorded.")
+        self.recording_path = recording_path
+        self.speed = speed
+        self.replayed_signals = 0
+        self.elapsed = 0.0
+        self._reader = None
+        self._signals = None
+        self._next = None
+        self._first_timestamp = None
+        self._started = None
+        self._main_loop = None
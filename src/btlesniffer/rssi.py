@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides a compact, bounded history of received signal strength (RSSI)
+samples with running statistics.
+"""
+
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from .compact import Slotted
+
+DEFAULT_CAPACITY = 256
+EMA_WEIGHT = 0.2
+
+
+class RSSIHistory(Slotted):
+    """
+    Keep the most recent RSSI samples of a device in a fixed-capacity ring
+    buffer of signed bytes, along with their timestamps. The minimum,
+    maximum, mean and exponential moving average cover all samples ever
+    recorded, not only the retained ones. Samples that are only folded
+    into the statistics are counted in `count` but not in `pushed`, the
+    number of samples ever written to the buffer.
+    """
+    __slots__ = ("capacity", "count", "pushed", "total", "minimum", "maximum",
+                 "ema", "_values", "_timestamps", "_start")
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[int], capacity: int = None,
+                     timestamp: float = 0.0) -> "RSSIHistory":
+        """
+        Create a history from bare samples, such as the RSSI lists of older
+        registry backups. All samples receive the same timestamp.
+        """
+        history = cls(capacity)
+        for value in samples:
+            history.append(value, timestamp)
+        return history
+
+    @classmethod
+    def restore(cls, timestamps: Iterable[float], values: Iterable[int],
+                count: int, total: int, minimum: Optional[int],
+                maximum: Optional[int], ema: Optional[float],
+                capacity: int = None) -> "RSSIHistory":
+        """
+        Recreate a history from the timestamps and values of its samples,
+        oldest first, and the running statistics over all samples. Only the
+        retained samples count as pushed.
+        """
+        history = cls(capacity)
+        history._values = array("b", values)[-history.capacity:]
+        history._timestamps = array("d", timestamps)[-history.capacity:]
+        history.pushed = len(history._values)
+        history.count = count
+        history.total = total
+        history.minimum = minimum
+        history.maximum = maximum
+        history.ema = ema
+        return history
+
+    @property
+    def last(self) -> Optional[int]:
+        """
+        Return the most recent sample, or None if there are none.
+        """
+        if len(self._values) == 0:
+            return None
+        return self._values[self._start - 1]
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        """
+        Return the time of the most recent sample, or None if there are none.
+        """
+        if len(self._timestamps) == 0:
+            return None
+        return self._timestamps[self._start - 1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def append(self, value: int, timestamp: float = None) -> None:
+        """
+        Record a new sample, overwriting the oldest retained one if the
+        buffer is full.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        value = max(-128, min(127, int(value)))
+        self._push(value, timestamp)
+        self._count(value)
+
+    def fold(self, value: int) -> None:
+        """
+        Count a sample in the statistics without retaining it, such as
+        jitter that is not worth a place in the buffer.
+        """
+        self._count(max(-128, min(127, int(value))))
+
+    def extend_samples(self, timestamps: Sequence[float],
+                       values: Sequence[int]) -> None:
+        """
+        Record a batch of samples, oldest first, with the same outcome as
+        appending them one by one.
+        """
+        values = [max(-128, min(127, int(v))) for v in values]
+        n = len(values)
+        if n == 0:
+            return
+        keep = min(n, self.capacity)
+        # The older samples of the batch would be overwritten right away.
+        self.pushed += n - keep
+        self._push_many(timestamps[n - keep:], values[n - keep:])
+
+        if self.count == 0:
+            ema = float(values[0])
+            self.minimum, self.maximum = min(values), max(values)
+            rest = values[1:]
+        else:
+            ema = self.ema
+            self.minimum = min(self.minimum, min(values))
+            self.maximum = max(self.maximum, max(values))
+            rest = values
+        for value in rest:
+            ema += EMA_WEIGHT * (value - ema)
+        self.ema = ema
+        self.count += n
+        self.total += sum(values)
+
+    def extend(self, other: "RSSIHistory") -> None:
+        """
+        Append the retained samples of another history and merge its
+        statistics. The other history is assumed to be the more recent one.
+        """
+        if other.count == 0:
+            return
+        for timestamp, value in other.items():
+            self._push(value, timestamp)
+        if self.count == 0:
+            self.minimum, self.maximum = other.minimum, other.maximum
+        else:
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+        self.ema = other.ema
+        self.count += other.count
+        self.total += other.total
+
+    def items(self) -> Iterator[Tuple[float, int]]:
+        """
+        Yield the retained samples as (timestamp, value) pairs, oldest first.
+        """
+        for i in self._order():
+            yield self._timestamps[i], self._values[i]
+
+    def resize(self, capacity: int) -> None:
+        """
+        Change the capacity of the buffer, keeping the newest samples.
+        """
+        if capacity < 1:
+            raise ValueError("The RSSI history capacity must be positive.")
+        order = list(self._order())[-capacity:]
+        self._values = array("b", (self._values[i] for i in order))
+        self._timestamps = array("d", (self._timestamps[i] for i in order))
+        self._start = 0
+        self.capacity = capacity
+
+    def _count(self, value: int) -> None:
+        if self.count == 0:
+            self.minimum = self.maximum = value
+            self.ema = float(value)
+        else:
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+            self.ema += EMA_WEIGHT * (value - self.ema)
+        self.count += 1
+        self.total += value
+
+    def _push(self, value: int, timestamp: float) -> None:
+        self.pushed += 1
+        if len(self._values) < self.capacity:
+            self._values.append(value)
+            self._timestamps.append(timestamp)
+        else:
+            self._values[self._start] = value
+            self._timestamps[self._start] = timestamp
+            self._start = (self._start + 1) % self.capacity
+
+    def _push_many(self, timestamps: Sequence[float], values: Sequence[int]) -> None:
+        self.pushed += len(values)
+        free = self.capacity - len(self._values)
+        if free > 0:
+            self._values.extend(values[:free])
+            self._timestamps.extend(timestamps[:free])
+            timestamps, values = timestamps[free:], values[free:]
+        for value, timestamp in zip(values, timestamps):
+            self._values[self._start] = value
+            self._timestamps[self._start] = timestamp
+            self._start = (self._start + 1) % self.capacity
+
+    def _order(self) -> Iterator[int]:
+        n = len(self._values)
+        return ((self._start + i) % n for i in range(n))
+
+    def __init__(self, capacity: int = None) -> None:
+        if capacity is None:
+            capacity = DEFAULT_CAPACITY
+        if capacity < 1:
+            raise ValueError("The RSSI history capacity must be positive.")
+        self.capacity = capacity
+        self.count = 0
+        self.pushed = 0
+        self.total = 0
+        self.minimum: Optional[int] = None
+        self.maximum: Optional[int] = None
+        self.ema: Optional[float] = None
+        self._values = array("b")
+        self._timestamps = array("d")
+        self._start = 0
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # Histories pickled before `pushed` existed count their retained
+        # samples as pushed.
+        state.setdefault("pushed", len(state.get("_values", ())))
+        super().__setstate__(state)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self) -> Iterator[int]:
+        for i in self._order():
+            yield self._values[i]
+
+    def __getitem__(self, index: int) -> int:
+        n = len(self._values)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("RSSI history index out of range")
+        return self._values[(self._start + index) % n]
+
+    def __repr__(self):
+        return "<RSSIHistory {} of {} samples, last {}>".format(
+            len(self), self.count, self.last
+        )
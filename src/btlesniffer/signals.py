@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the decoding of BlueZ signals straight from their GLib variants,
+which skips the properties the sniffer does not record and avoids the
+generic unpacking of pydbus.
+"""
+
+from typing import Any, Dict
+
+from gi.repository import GLib
+
+# The properties of Device1 that `Device.update_from_dbus_dict` records.
+DEVICE_PROPERTIES = frozenset((
+    "Address", "Paired", "Connected", "ServicesResolved", "Name", "Class",
+    "Appearance", "UUIDs", "TxPower", "RSSI", "ManufacturerData",
+    "ServiceData"
+))
+
+
+def _payloads(value: GLib.Variant) -> Dict[Any, bytes]:
+    """
+    Decode a dictionary of byte arrays (`a{qv}` or `a{sv}`) into bytes,
+    which is the storage form of `PayloadHistory`.
+    """
+    payloads = dict()
+    for i in range(value.n_children()):
+        entry = value.get_child_value(i)
+        payload = entry.get_child_value(1).get_variant()
+        payloads[entry.get_child_value(0).unpack()] = \
+            payload.get_data_as_bytes().get_data()
+    return payloads
+
+
+# Decoders for the frequent properties; any other one is unpacked generically.
+_DECODERS = {
+    "RSSI": GLib.Variant.get_int16,
+    "TxPower": GLib.Variant.get_int16,
+    "ManufacturerData": _payloads,
+    "ServiceData": _payloads,
+}
+
+
+def decode_properties(changed: GLib.Variant) -> Dict[str, Any]:
+    """
+    Decode the recorded properties of a Device1 property dictionary
+    (`a{sv}`), leaving out all others.
+    """
+    data = dict()
+    for i in range(changed.n_children()):
+        entry = changed.get_child_value(i)
+        key = entry.get_child_value(0).get_string()
+        if key in DEVICE_PROPERTIES:
+            value = entry.get_child_value(1).get_variant()
+            decoder = _DECODERS.get(key)
+            data[key] = value.unpack() if decoder is None else decoder(value)
+    return data
+
+
+def is_rssi_sample(changed: GLib.Variant) -> bool:
+    """
+    Return whether a Device1 property dictionary holds nothing but RSSI.
+    """
+    return changed.n_children() == 1 and \
+        changed.get_child_value(0).get_child_value(0).get_string() == "RSSI"
+
+
+def decode_interfaces(interfaces: GLib.Variant, device_interface: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Decode the interfaces and properties of an InterfacesAdded signal
+    (`a{sa{sv}}`), where the properties of the device interface are
+    decoded by `decode_properties`.
+    """
+    data = dict()
+    for i in range(interfaces.n_children()):
+        entry = interfaces.get_child_value(i)
+        name = entry.get_child_value(0).get_string()
+        properties = entry.get_child_value(1)
+        if name == device_interface:
+            data[name] = decode_properties(properties)
+        else:
+            data[name] = properties.unpack()
+    return data
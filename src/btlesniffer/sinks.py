@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the output of the sniffer as typed events, which are delivered in
+batches to pluggable sinks, each with a queue and a thread of its own.
+"""
+
+import abc
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple, Type
+
+from . import codec
+from .compact import Slotted
+from .device import Device, print_device
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 256
+
+_log = logging.getLogger("btlesniffer.sinks")
+
+
+class Event(Slotted):
+    """
+    Something the sniffer observed at the given POSIX time.
+    """
+    __slots__ = ("timestamp",)
+
+    def __init__(self, timestamp: float = None) -> None:
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+
+class DeviceEvent(Event):
+    """
+    An event concerning a device as a whole. The device is captured when
+    the event occurs, since the registry keeps changing while the sinks
+    work: as a binary record, which is decoded on demand, for the sinks
+    that want the whole device, and as its formatted text for the others.
+    """
+    __slots__ = ("address", "record", "text")
+
+    @property
+    def device(self) -> Device:
+        if self.record is None:
+            raise ValueError("The device of the event was not captured.")
+        return codec.decode_device(self.record)
+
+    def __init__(self, device: Device, timestamp: float = None,
+                 record: bool = True, text: bool = True) -> None:
+        super().__init__(timestamp)
+        self.address = device.address
+        self.record = codec.encode_device(device) if record else None
+        self.text = str(device) if text else None
+
+    def __repr__(self):
+        return "<{} {} at {}>".format(type(self).__name__, self.address,
+                                      self.timestamp)
+
+
+class New(DeviceEvent):
+    """A device was discovered."""
+    __slots__ = ()
+
+
+class Merge(DeviceEvent):
+    """A known device was discovered again."""
+    __slots__ = ()
+
+
+class Update(DeviceEvent):
+    """A GATT service of a device was discovered."""
+    __slots__ = ()
+
+
+class Lost(DeviceEvent):
+    """A device disappeared."""
+    __slots__ = ()
+
+
+class Characteristic(DeviceEvent):
+    """A GATT characteristic of a device was discovered."""
+    __slots__ = ()
+
+
+class Descriptor(DeviceEvent):
+    """A GATT descriptor of a device was discovered."""
+    __slots__ = ()
+
+
+class Connecting(DeviceEvent):
+    """The sniffer attempts to connect to a device."""
+    __slots__ = ()
+
+
+class RSSI(Event):
+    """
+    An RSSI sample of a device was recorded.
+    """
+    __slots__ = ("address", "value")
+
+    def __init__(self, address: str, value: int, timestamp: float = None) -> None:
+        super().__init__(timestamp)
+        self.address = address
+        self.value = value
+
+    def __repr__(self):
+        return "<RSSI {} of {} at {}>".format(self.value, self.address,
+                                              self.timestamp)
+
+
+DEVICE_EVENTS = (New, Merge, Update, Lost, Characteristic, Descriptor,
+                 Connecting)
+
+
+class Sink(abc.ABC):
+    """
+    Receive the events of the sniffer in batches. `handle` is called on a
+    thread of the sink's own, so it may block without stalling the sniffer
+    or other sinks; `close` is called once all events were handled.
+    """
+    # The types of events the sink receives.
+    events: Tuple[Type[Event], ...] = DEVICE_EVENTS
+    # Whether the sink forgoes its device events while the sniffer is
+    # overloaded, rather than receive every one of them.
+    sheddable = False
+    # Whether the sink uses the `device` of the device events, which costs
+    # an encoding of the whole device per event, rather than their `text`.
+    wants_record = True
+
+    @abc.abstractmethod
+    def handle(self, events: List[Event]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class PrintSink(Sink):
+    """
+    Print the device events to standard output, except while the sniffer
+    is overloaded.
+    """
+    events = DEVICE_EVENTS
+    sheddable = True
+    wants_record = False
+
+    def handle(self, events: List[Event]) -> None:
+        for event in events:
+            print_device(event.text, type(event).__name__)
+
+
+class _Channel(object):
+    """
+    Queue the events for one sink and hand them over to it in batches on
+    a worker thread. Events beyond a full queue are dropped.
+    """
+    def put(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        self.sink.close()
+
+    def _run(self) -> None:
+        while True:
+            event = self.queue.get()
+            events = list()
+            while event is not None:
+                events.append(event)
+                if len(events) >= self.batch_size:
+                    break
+                try:
+                    event = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if len(events) > 0:
+                try:
+                    self.sink.handle(events)
+                except Exception:
+                    _log.exception("The sink {!r} failed to handle {} "
+                                   "events.".format(self.sink, len(events)))
+                self.delivered += len(events)
+            if event is None:
+                return
+
+    def __init__(self, sink: Sink, queue_size: int, batch_size: int) -> None:
+        self.sink = sink
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.batch_size = batch_size
+        self.delivered = 0
+        self.dropped = 0
+        self.thread = threading.Thread(
+            target=self._run, name="btlesniffer-sink-{}".format(type(sink).__name__),
+            daemon=True
+        )
+        self.thread.start()
+
+
+class SinkDispatcher(object):
+    """
+    Deliver the events of the sniffer to the sinks that accept them.
+    """
+    def wants(self, event_type: Type[Event], shedding: bool = False) -> bool:
+        """
+        Return whether any sink accepts events of the type, apart from the
+        sheddable ones while shedding, such that the sniffer can skip
+        creating unwanted ones.
+        """
+        routes = self._kept_routes if shedding else self._routes
+        return len(routes.get(event_type, ())) > 0
+
+    def sheds(self, event_type: Type[Event]) -> bool:
+        """
+        Return whether any sheddable sink accepts events of the type.
+        """
+        return len(self._routes.get(event_type, ())) > \
+            len(self._kept_routes.get(event_type, ()))
+
+    def emit_device(self, event_type: Type[DeviceEvent], device: Device,
+                    shedding: bool = False) -> None:
+        """
+        Capture the device for the sinks that accept the event type, apart
+        from the sheddable ones while shedding, as far as they need it.
+        """
+        routes = self._kept_routes if shedding else self._routes
+        channels = routes.get(event_type, ())
+        if len(channels) == 0:
+            return
+        records = [c.sink.wants_record for c in channels]
+        event = event_type(device, record=any(records), text=not all(records))
+        for channel in channels:
+            channel.put(event)
+
+    def emit(self, event: Event, shedding: bool = False) -> None:
+        """
+        Queue the event for the sinks that accept it, apart from the
+        sheddable ones while shedding.
+        """
+        routes = self._kept_routes if shedding else self._routes
+        for channel in routes.get(type(event), ()):
+            channel.put(event)
+
+    def close(self) -> None:
+        """
+        Wait for the sinks to handle the queued events and close them.
+        """
+        for channel in self.channels:
+            channel.close()
+        for channel in self.channels:
+            if channel.dropped > 0:
+                _log.warning("The sink {!r} dropped {} events.".format(
+                    channel.sink, channel.dropped))
+        self.channels = list()
+        self._routes = dict()
+        self._kept_routes = dict()
+
+    def __init__(self, sinks: Iterable[Sink],
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.channels: List[_Channel] = [
+            _Channel(s, queue_size, batch_size) for s in sinks
+        ]
+        self._routes: Dict[Type[Event], List[_Channel]] = dict()
+        self._kept_routes: Dict[Type[Event], List[_Channel]] = dict()
+        for channel in self.channels:
+            for event_type in channel.sink.events:
+                self._routes.setdefault(event_type, list()).append(channel)
+                if not channel.sink.sheddable:
+                    self._kept_routes.setdefault(event_type, list()).append(channel)
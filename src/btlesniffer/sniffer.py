@@ -6,26 +6,48 @@ devices.
 """
 
 import logging
-import pickle
-
-import pydbus
-from gi.repository import GLib
+import queue
+import threading
+import time
 
 from .util import SERVICE_NAME, DEVICE_INTERFACE, OBJECT_MANAGER_INTERFACE, \
     PROPERTIES_INTERFACE, find_adapter, GATT_SERVICE_INTERFACE, \
     GATT_CHARACTERISTIC_INTERFACE, GATT_DESCRIPTOR_INTERFACE, get_known_devices
-from .device import GATTService, GATTCharacteristic, GATTDescriptor, Device, \
-    print_device
+from .device import GATTService, GATTCharacteristic, GATTDescriptor, Device
+from .registry import DeviceRegistry
+from .backup import create_backup
+from .coalesce import SAMPLE_PROPERTIES, PropertiesBatch
+from .filters import SignalFilter
+from .hysteresis import RSSIHysteresis
+from .overload import OVERLOAD_INTERVAL, SHED_DEBUG, SHED_PRINTING, \
+    SHED_SAMPLES, OverloadMonitor
+from .sinks import DEFAULT_BATCH_SIZE, DEFAULT_QUEUE_SIZE, RSSI, \
+    Characteristic, Connecting, Descriptor, Lost, Merge, New, PrintSink, \
+    SinkDispatcher, Update
+
+# The ways of receiving the signals of BlueZ: unpacked by pydbus, or decoded
+# from the GLib variants of a Gio subscription.
+INGESTIONS = ("pydbus", "gio")
+
+# How frequently the depth of the event queue is logged (in seconds).
+QUEUE_REPORT_INTERVAL = 10
 
 
 class Sniffer(object):
     """
     Capture reachable Bluetooth devices and attempt to fingerprint them.
+    PyGObject and pydbus are only imported by the GLib engine itself, such
+    that the asyncio engine can do without them.
     """
     def run(self):
         """
         Run the Sniffer main loop.
         """
+        import pydbus
+        from gi.repository import GLib
+
+        from .recording import SignalRecorder
+
         if self.adapter is not None:
             self._log.debug("Clearing the BlueZ device registry.")
             for path, _ in get_known_devices():
@@ -33,27 +55,26 @@ class Sniffer(object):
 
             self._log.debug("Registering the signals InterfacesAdded and PropertiesChanged.")
             bus = pydbus.SystemBus()
-            bus.subscribe(
-                sender=SERVICE_NAME,
-                iface=OBJECT_MANAGER_INTERFACE,
-                signal="InterfacesAdded",
-                signal_fired=self._cb_interfaces_added
-            )
-            bus.subscribe(
-                sender=SERVICE_NAME,
-                iface=OBJECT_MANAGER_INTERFACE,
-                signal="InterfacesRemoved",
-                signal_fired=self._cb_interfaces_removed
-            )
-            bus.subscribe(
-                sender=SERVICE_NAME,
-                iface=PROPERTIES_INTERFACE,
-                signal="PropertiesChanged",
-                arg0=DEVICE_INTERFACE,
-                signal_fired=self._cb_properties_changed
-            )
+            for rule in self._filter.match_rules():
+                bus.dbus.AddMatch(rule)
+            if self.record_path is not None:
+                self._log.debug("Recording the signals to {}.".format(self.record_path))
+                self._recorder = SignalRecorder(self.record_path,
+                                                self.adapter._path)
+                self._subscribe_gio(bus.con, (self._cb_record,) * 3)
+            elif self.ingestion == "gio":
+                self._subscribe_gio(bus.con, (
+                    self._cb_gio_interfaces_added,
+                    self._cb_gio_interfaces_removed,
+                    self._cb_gio_properties_changed
+                ))
+            else:
+                self._subscribe_pydbus(bus)
+
+            self._start_worker()
 
             self._log.debug("Running the main loop.")
+            self._start_overload_monitor()
             if self.output_path is not None and self.backup_interval > 0:
                 GLib.timeout_add_seconds(self.backup_interval, self._cb_backup_registry)
             if self.attempt_connection:
@@ -64,15 +85,143 @@ class Sniffer(object):
             raise ValueError("Sniffer.run can only be called in a context "
                              "(e.g. `with Sniffer(...) as s: s.run()`)")
 
+    def _subscribe_pydbus(self, bus):
+        from gi.repository import Gio
+
+        # The match rules of the signal filter were added instead.
+        flags = Gio.DBusSignalFlags.NO_MATCH_RULE
+        bus.subscribe(
+            sender=SERVICE_NAME,
+            iface=OBJECT_MANAGER_INTERFACE,
+            signal="InterfacesAdded",
+            flags=flags,
+            signal_fired=self._cb_interfaces_added
+        )
+        bus.subscribe(
+            sender=SERVICE_NAME,
+            iface=OBJECT_MANAGER_INTERFACE,
+            signal="InterfacesRemoved",
+            flags=flags,
+            signal_fired=self._cb_interfaces_removed
+        )
+        bus.subscribe(
+            sender=SERVICE_NAME,
+            iface=PROPERTIES_INTERFACE,
+            signal="PropertiesChanged",
+            arg0=DEVICE_INTERFACE,
+            flags=flags,
+            signal_fired=self._cb_properties_changed
+        )
+
+    def _subscribe_gio(self, connection, callbacks):
+        """
+        Subscribe the callbacks to InterfacesAdded, InterfacesRemoved and
+        PropertiesChanged on the Gio connection directly, such that the
+        signals arrive as GLib variants which are decoded only as far as
+        needed.
+        """
+        from gi.repository import Gio
+
+        flags = Gio.DBusSignalFlags.NO_MATCH_RULE
+        added, removed, changed = callbacks
+        connection.signal_subscribe(
+            SERVICE_NAME, OBJECT_MANAGER_INTERFACE, "InterfacesAdded",
+            None, None, flags, added
+        )
+        connection.signal_subscribe(
+            SERVICE_NAME, OBJECT_MANAGER_INTERFACE, "InterfacesRemoved",
+            None, None, flags, removed
+        )
+        connection.signal_subscribe(
+            SERVICE_NAME, PROPERTIES_INTERFACE, "PropertiesChanged",
+            None, DEVICE_INTERFACE, flags, changed
+        )
+
+    def _start_worker(self):
+        if self._events is not None:
+            from gi.repository import GLib
+
+            self._log.debug("Starting the worker thread.")
+            self._worker = threading.Thread(
+                target=self._run_worker, name="btlesniffer-worker",
+                daemon=True
+            )
+            self._worker.start()
+            GLib.timeout_add_seconds(QUEUE_REPORT_INTERVAL,
+                                     self._cb_report_queue)
+
+    def _cb_record(self, connection, sender, obj, iface, signal, params):
+        """
+        Record a raw signal and hand it over to the ingestion in use.
+        """
+        self._recorder.record(obj, signal, params)
+        self._dispatch_signal(obj, iface, signal, params)
+
+    def _dispatch_signal(self, obj, iface, signal, params):
+        """
+        Hand a signal, as a GLib variant, to the callbacks of the ingestion
+        in use; pydbus would unpack it entirely.
+        """
+        callback = self._signal_callbacks[signal]
+        if self.ingestion == "gio":
+            callback(None, SERVICE_NAME, obj, iface, signal, params)
+        else:
+            callback(SERVICE_NAME, obj, iface, signal, params.unpack())
+
+    def _cb_gio_interfaces_added(self, connection, sender, obj, iface, signal, params):
+        path = params.get_child_value(0).get_string()
+        interfaces = self._decoder.decode_interfaces(params.get_child_value(1),
+                                                     DEVICE_INTERFACE)
+        self._cb_interfaces_added(sender, obj, iface, signal, (path, interfaces))
+
+    def _cb_gio_interfaces_removed(self, connection, sender, obj, iface, signal, params):
+        self._cb_interfaces_removed(sender, obj, iface, signal, params.unpack())
+
+    def _cb_gio_properties_changed(self, connection, sender, obj, iface, signal, params):
+        """
+        Decode the PropertiesChanged signal of a known device. The signals
+        of devices that were never announced by InterfacesAdded would be
+        ignored anyway, so they are discarded before any decoding; this
+        includes the devices rejected by the signal filter.
+        """
+        if obj not in self._known_paths:
+            self.discarded_signals += 1
+            return
+        changed = params.get_child_value(1)
+        if self._overload is not None and \
+                self._overload.level >= SHED_SAMPLES and \
+                self._decoder.is_rssi_sample(changed):
+            self._overload.shed_samples += 1
+            return
+        data = self._decoder.decode_properties(changed)
+        self._cb_properties_changed(sender, obj, iface, signal,
+                                    (DEVICE_INTERFACE, data))
+
     def _cb_interfaces_added(self, sender, obj, iface, signal, params):
         """
         Upon receiving the InterfacesAdded signal, register any new device.
         """
-        self._log.debug("Caught the signal InterfacesAddded.")
-        self._log.debug("Added: {}".format(params))
+        if self._filter is not None and not self._filter.accepts_path(params[0]):
+            self.filtered_signals += 1
+            return
+        if DEVICE_INTERFACE in params[1]:
+            self._known_paths.add(params[0])
+        if self._events is not None:
+            self._enqueue_discovery(self._on_interfaces_added, params,
+                                    time.time())
+        else:
+            self._on_interfaces_added(params, time.time())
+
+    def _on_interfaces_added(self, params, timestamp=None):
+        self._debug("Caught the signal InterfacesAddded.")
+        self._debug("Added: {}", params)
         (path, interfaces) = params
         if DEVICE_INTERFACE in interfaces:
-            self._register_device(Device.create_from_dbus_dict(path, interfaces[DEVICE_INTERFACE]))
+            self._flush_properties(path)
+            self._register_device(Device.create_from_dbus_dict(
+                path, interfaces[DEVICE_INTERFACE], self.rssi_capacity,
+                timestamp
+            ))
         if GATT_SERVICE_INTERFACE in interfaces:
             self._register_service(path, interfaces[GATT_SERVICE_INTERFACE])
         if GATT_CHARACTERISTIC_INTERFACE in interfaces:
@@ -84,13 +233,29 @@ class Sniffer(object):
         """
         Upon receiving the InterfacesRemoved signal, note the loss of a device.
         """
-        self._log.debug("Caught the signal InterfacesRemoved.")
-        self._log.debug("Removed: {}".format(params))
+        if self._filter is not None and not self._filter.accepts_path(params[0]):
+            self.filtered_signals += 1
+            return
+        if DEVICE_INTERFACE in params[1]:
+            self._known_paths.discard(params[0])
+        if self._events is not None:
+            self._enqueue_discovery(self._on_interfaces_removed, params)
+        else:
+            self._on_interfaces_removed(params)
+
+    def _on_interfaces_removed(self, params):
+        self._debug("Caught the signal InterfacesRemoved.")
+        self._debug("Removed: {}", params)
         (path, ifaces) = params
-        device = self._find_device_by_path(path)
-        if device is not None:
+        if DEVICE_INTERFACE in ifaces:
+            self.registry.discard_pending(path)
+            # Changes received before the removal must not revive the device.
+            self._flush_properties(path)
+        device = self.registry.get_by_path(path)
+        if device is not None and device.active:
             device.active = False
-            print_device(device, "Lost")
+            self.registry.mark_dirty(device)
+            self._emit_device(Lost, device)
 
     def _cb_properties_changed(self, sender, obj, iface, signal, params):
         """
@@ -98,90 +263,359 @@ class Sniffer(object):
         registered devices.
         """
         if DEVICE_INTERFACE in params:
-            device = self._find_device_by_path(obj)
-            if device is not None:
-                device.update_from_dbus_dict(obj, params[1])
-                if self.backup_interval == 0:
-                    self._cb_backup_registry()
+            data = params[1]
+            if self._overload is not None and self._shed_sample(data):
+                return
+            if self._filter is not None:
+                if self._filter.accepts_path(obj):
+                    data = self._filter.filter_properties(data)
+                else:
+                    data = None
+                if data is None:
+                    self.filtered_signals += 1
+                    return
+            if self._events is not None:
+                self._enqueue(self._on_properties_changed, obj, data,
+                              time.time())
             else:
-                self._log.debug("Received PropertiesChanged for an "
-                                "unknown device.")
+                self._on_properties_changed(obj, data, time.time())
+
+    def _shed_sample(self, data):
+        """
+        Return whether the changed properties are a bare RSSI sample, which
+        is shed under the heaviest overload.
+        """
+        if self._overload.level >= SHED_SAMPLES and len(data) == 1 \
+                and "RSSI" in data:
+            self._overload.shed_samples += 1
+            return True
+        return False
+
+    def _on_properties_changed(self, path, data, timestamp):
+        if self.coalescing_interval <= 0:
+            self._update_device(path, data, timestamp)
+            return
+
+        batch = self._pending_properties.get(path)
+        if batch is None:
+            batch = self._pending_properties[path] = PropertiesBatch()
+        batch.add(data, timestamp)
+        # The worker applies the batches after every drained chunk of events.
+        if self._events is None and self._coalescing_source is None:
+            self._coalescing_source = self._call_later(
+                self.coalescing_interval, self._cb_coalescing_tick
+            )
+
+    def _cb_coalescing_tick(self):
+        """
+        Apply the PropertiesChanged signals gathered during the last tick,
+        with one update per device.
+        """
+        self._coalescing_source = None
+        pending = self._pending_properties
+        self._pending_properties = dict()
+        for path, batch in pending.items():
+            self._apply_batch(path, batch)
+
+        return False
+
+    def _call_later(self, delay, callback):
+        """
+        Call back once on the main loop after the delay (in milliseconds)
+        and return a handle for `_cancel_call`.
+        """
+        from gi.repository import GLib
+
+        return GLib.timeout_add(delay, callback)
+
+    def _cancel_call(self, handle):
+        from gi.repository import GLib
+
+        GLib.source_remove(handle)
+
+    def _debug(self, message, *args):
+        """
+        Log a debug message about a signal, unless debug messages are shed.
+        """
+        if not self._log.isEnabledFor(logging.DEBUG):
+            return
+        if self._overload is not None and self._overload.level >= SHED_DEBUG:
+            self._overload.shed_debug += 1
+        else:
+            self._log.debug(message.format(*args))
+
+    def _emit_device(self, event_type, device):
+        """
+        Hand a device event over to the sinks that accept it, apart from
+        the sheddable ones while shedding printing.
+        """
+        shedding = self._overload is not None and \
+            self._overload.level >= SHED_PRINTING
+        if shedding and self._sinks.sheds(event_type):
+            self._overload.shed_events += 1
+        self._sinks.emit_device(event_type, device, shedding)
+
+    def _emit_rssi(self, device, data, timestamp, samples):
+        if "RSSI" in data:
+            self._sinks.emit(RSSI(device.address, data["RSSI"], timestamp))
+        for sample_timestamp, sample in samples:
+            if "RSSI" in sample:
+                self._sinks.emit(RSSI(device.address, sample["RSSI"],
+                                      sample_timestamp))
+
+    def _start_overload_monitor(self):
+        if self._overload is not None:
+            self._overload_due = time.monotonic() + OVERLOAD_INTERVAL / 1000
+            self._call_later(OVERLOAD_INTERVAL, self._cb_overload_check)
+
+    def _cb_overload_check(self):
+        """
+        Measure how late this timer fires and how many events are queued,
+        and adjust the shedding level accordingly.
+        """
+        now = time.monotonic()
+        backlog = self._events.qsize() if self._events is not None else 0
+        level = self._overload.update(max(0.0, now - self._overload_due), backlog)
+        if level is not None:
+            log = self._log.warning if level > 0 else self._log.info
+            log("Overload: {}.".format(self._overload))
+        self._overload_due = now + OVERLOAD_INTERVAL / 1000
+        self._call_later(OVERLOAD_INTERVAL, self._cb_overload_check)
+
+        return False
+
+    def _enqueue(self, handler, *args):
+        """
+        Hand a signal over to the worker thread, or drop it if the event
+        queue is full.
+        """
+        if self._events.qsize() >= self.worker_queue_size:
+            self.dropped_events += 1
+            return
+        self._events.put_nowait((handler, args))
+
+    def _enqueue_discovery(self, handler, *args):
+        """
+        Hand an InterfacesAdded or InterfacesRemoved signal over to the
+        worker thread even if the event queue is full, since losing one
+        would leave a device unknown, or active forever. The signal shares
+        the queue with the property changes, which keeps them in order.
+        """
+        if self._events.qsize() >= self.worker_queue_size:
+            self.overflow_events += 1
+        self._events.put_nowait((handler, args))
+
+    def _run_worker(self):
+        """
+        Drain the event queue in chunks of up to `worker_batch_size` events
+        and apply them to the registry.
+        """
+        while True:
+            event = self._events.get()
+            self.max_queue_depth = max(self.max_queue_depth,
+                                       self._events.qsize() + 1)
+            events = list()
+            while event is not None:
+                events.append(event)
+                if len(events) >= self.worker_batch_size:
+                    break
+                try:
+                    event = self._events.get_nowait()
+                except queue.Empty:
+                    break
+
+            with self._lock:
+                for handler, args in events:
+                    try:
+                        handler(*args)
+                    except Exception:
+                        self._log.exception("Failed to process a signal.")
+                self._cb_coalescing_tick()
+            self.processed_events += len(events)
+            if event is None:
+                return
+
+    def _cb_report_queue(self):
+        """
+        Log the depth of the event queue and the number of dropped events
+        and of discovery events beyond its size.
+        """
+        depth = self._events.qsize()
+        self._log.info("Event queue: {} of {} events pending (at most {}), "
+                       "{} processed, {} dropped, {} overflowed.".format(
+                           depth, self.worker_queue_size, self.max_queue_depth,
+                           self.processed_events, self.dropped_events,
+                           self.overflow_events))
+
+        return True
+
+    def _flush_properties(self, path):
+        """
+        Apply the pending PropertiesChanged signals of a device object path
+        ahead of the next tick.
+        """
+        batch = self._pending_properties.pop(path, None)
+        if batch is not None:
+            self._apply_batch(path, batch)
+
+    def _apply_batch(self, path, batch):
+        self.coalesced_signals += len(batch) - 1
+        self._update_device(path, batch.data, batch.timestamp, batch.samples)
+
+    def _update_device(self, path, data, timestamp=None, samples=()):
+        device = self.registry.get_by_path(path)
+        if device is not None:
+            if self._hysteresis is not None:
+                if timestamp is None:
+                    timestamp = time.time()
+                if len(samples) > 0:
+                    samples = self._hysteresis.filter(device, samples)
+                    if len(samples) == 0 and len(data) == 0:
+                        return
+                elif data.keys() <= SAMPLE_PROPERTIES and \
+                        len(self._hysteresis.filter(device, [(timestamp, data)])) == 0:
+                    return
+            self.registry.update_device(device, path, data, timestamp, samples)
+            if self._sinks.wants(RSSI):
+                self._emit_rssi(device, data, timestamp or time.time(), samples)
+            self._request_write_through()
+        else:
+            self._debug("Received PropertiesChanged for an unknown device.")
+
+    @property
+    def suppressed_samples(self):
+        """
+        Return the number of RSSI samples that were folded as jitter.
+        """
+        if self._hysteresis is None:
+            return 0
+        return self._hysteresis.suppressed
 
     def _cb_backup_registry(self):
         """
-        If the backup path is set, dump the registry object to a Pickle backup.
+        If the backup path is set, write the registry to the backup.
         """
-        self._log.info("Backing up the device registry.")
-        with self.output_path.open("wb") as f:
-            pickle.dump(self.registry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.backup is not None:
+            self._log.info("Backing up the device registry.")
+            with self._lock:
+                self.backup.write(self.registry)
 
         return True
 
+    def _cb_write_through(self):
+        """
+        Write the backup on behalf of the updates collected since the last
+        write-through.
+        """
+        with self._lock:
+            self._write_through_source = None
+            self._write_through_events = 0
+            self._cb_backup_registry()
+
+        return False
+
+    def _flush_pending(self):
+        """
+        Apply the work that still waits for a timer, such that it is not
+        lost when the sniffer stops: the coalesced property changes first,
+        then the write-through backup they request.
+        """
+        if self._coalescing_source is not None:
+            self._cancel_call(self._coalescing_source)
+            self._cb_coalescing_tick()
+        if self._write_through_source is not None:
+            self._cancel_call(self._write_through_source)
+            self._cb_write_through()
+
+    def _request_write_through(self):
+        """
+        If the backup shall be written with every device update, debounce
+        the writes: a burst of updates results in a single backup after at
+        most `write_through_delay` milliseconds or `write_through_events`
+        updates, whichever comes first.
+        """
+        if self.backup is None or self.backup_interval != 0:
+            return
+
+        self._write_through_events += 1
+        if self._write_through_events >= self.write_through_events:
+            if self._write_through_source is not None:
+                self._cancel_call(self._write_through_source)
+            self._cb_write_through()
+        elif self._write_through_source is None:
+            self._write_through_source = self._call_later(
+                self.write_through_delay, self._cb_write_through
+            )
+
     def _cb_connect_check(self):
-        for device in self.registry:
-            if device.active and not device.connected \
-                    and device.rssis[-1] >= self.threshold_rssi:
-                self._connect(device)
+        with self._lock:
+            for device in self.registry:
+                rssi = device.rssis.last
+                if device.active and not device.connected \
+                        and rssi is not None and rssi >= self.threshold_rssi:
+                    self._connect(device)
 
         return True
 
     def _register_device(self, device):
-        d = self._find_device(device)
-        if d is not None:
-            d.update_from_device(device)
-            print_device(d, "Merge")
+        d, new = self.registry.add(device)
+        if new:
+            self._emit_device(New, d)
         else:
-            self.registry.append(device)
-            print_device(device, "New")
+            self._emit_device(Merge, d)
 
-        if self.backup_interval == 0:
-            self._cb_backup_registry()
+        self._request_write_through()
 
     def _register_service(self, path, service):
-        device_path = service["Device"]
-        device = self._find_device_by_path(device_path)
-        if device is not None:
-            device[path] = GATTService(service["UUID"], service["Primary"])
-            print_device(device, "Update")
+        attached = self.registry.add_gatt(
+            path, service["Device"],
+            GATTService(service["UUID"], service["Primary"])
+        )
+        if len(attached) > 0:
+            self._emit_gatt(attached)
         else:
-            self._log.debug("Received a service for an unknown device.")
+            self._debug("Buffered a service for an unknown device.")
 
     def _register_characteristic(self, path, characteristic):
-        service_path = characteristic["Service"]
-        device_path = "/".join(service_path.split("/")[:-1])
-        device = self._find_device_by_path(device_path)
-        if device is not None:
-            if service_path in device.services:
-                device[service_path][path] = GATTCharacteristic(
-                    characteristic["UUID"], characteristic.get("Value"),
-                    characteristic["Flags"]
-                )
-                print_device(device, "Characteristic")
-            else:
-                self._log.debug("Received a characteristic for an unknown service.")
+        attached = self.registry.add_gatt(
+            path, characteristic["Service"],
+            GATTCharacteristic(characteristic["UUID"],
+                               characteristic.get("Value"),
+                               characteristic["Flags"])
+        )
+        if len(attached) > 0:
+            self._emit_gatt(attached)
         else:
-            self._log.debug("Received a characteristic for an unknown device.")
+            self._debug("Buffered a characteristic for an unknown service.")
 
     def _register_descriptor(self, path, descriptor):
-        characteristic_path = descriptor["Characteristic"]
-        service_path = "/".join(characteristic_path.split("/")[:-1])
-        device_path = "/".join(service_path.split("/")[:-1])
-        device = self._find_device_by_path(device_path)
-        if device is not None:
-            if service_path in device.services:
-                if characteristic_path in device[service_path].characteristics:
-                    device[service_path][characteristic_path][path] = GATTDescriptor(
-                        descriptor["UUID"], descriptor.get("Value"), descriptor.get("Flags")
-                    )
-                    print_device(device, "Descriptor")
-                else:
-                    self._log.debug("Received a descriptor for an unknown characteristic.")
-            else:
-                self._log.debug("Received a descriptor for an unknown service.")
+        attached = self.registry.add_gatt(
+            path, descriptor["Characteristic"],
+            GATTDescriptor(descriptor["UUID"], descriptor.get("Value"),
+                           descriptor.get("Flags"))
+        )
+        if len(attached) > 0:
+            self._emit_gatt(attached)
         else:
-            self._log.debug("Received a descriptor for an unknown device.")
+            self._debug("Buffered a descriptor for an unknown characteristic.")
+
+    def _emit_gatt(self, attached):
+        """
+        Emit an event for every attached GATT object, including the ones
+        that were buffered until their parent arrived.
+        """
+        for device, obj in attached:
+            if isinstance(obj, GATTService):
+                self._emit_device(Update, device)
+            elif isinstance(obj, GATTCharacteristic):
+                self._emit_device(Characteristic, device)
+            else:
+                self._emit_device(Descriptor, device)
 
     def _connect(self, device):
+        import pydbus
+        from gi.repository import GLib
+
         def cb_connect():
             try:
                 bus = pydbus.SystemBus()
@@ -197,47 +631,135 @@ class Sniffer(object):
             self.queued_connections -= 1
 
         if self.queued_connections == 0:
-            print_device(device, "Connecting")
+            self._emit_device(Connecting, device)
             GLib.idle_add(cb_connect)
             device.connected = True
+            self.registry.mark_dirty(device)
             self.queued_connections += 1
 
-    def _find_device(self, device):
-        for d in self.registry:
-            if device == d:
-                return d
-
-    def _find_device_by_path(self, path):
-        for d in self.registry:
-            if path == d.path:
-                return d
-
     def __init__(self, output_path=None, backup_interval=5, resume=False,
                  attempt_connection=False, threshold_rssi=-80,
-                 queueing_interval=5):
+                 queueing_interval=5, rssi_capacity=None,
+                 backup_mode="snapshot", compaction_threshold=10000,
+                 write_through_delay=1000, write_through_events=1000,
+                 compression="none", compression_level=None,
+                 coalescing_interval=50, worker_queue_size=0,
+                 worker_batch_size=256, ingestion="pydbus", adapter=None,
+                 allow_addresses=None, deny_addresses=(), min_rssi=None,
+                 rssi_delta=0, rssi_interval=10.0, overload_lag=0,
+                 sinks=None, sink_queue_size=DEFAULT_QUEUE_SIZE,
+                 sink_batch_size=DEFAULT_BATCH_SIZE, record_path=None):
         self.output_path = output_path
         self.backup_interval = backup_interval
         self.attempt_connection = attempt_connection
         self.threshold_rssi = threshold_rssi
         self.queueing_interval = queueing_interval
+        self.rssi_capacity = rssi_capacity
+        self.write_through_delay = write_through_delay
+        self.write_through_events = write_through_events
+        self.coalescing_interval = coalescing_interval
+        self._write_through_source = None
+        self._write_through_events = 0
+        self._pending_properties = dict()
+        self._coalescing_source = None
+        self.coalesced_signals = 0
+        self.worker_batch_size = worker_batch_size
+        self.ingestion = ingestion
+        if ingestion == "gio":
+            # The decoding of GLib variants is only needed, and importable,
+            # with PyGObject.
+            from . import signals
+            self._decoder = signals
+            self._signal_callbacks = {
+                "InterfacesAdded": self._cb_gio_interfaces_added,
+                "InterfacesRemoved": self._cb_gio_interfaces_removed,
+                "PropertiesChanged": self._cb_gio_properties_changed,
+            }
+        else:
+            self._signal_callbacks = {
+                "InterfacesAdded": self._cb_interfaces_added,
+                "InterfacesRemoved": self._cb_interfaces_removed,
+                "PropertiesChanged": self._cb_properties_changed,
+            }
+        # The device object paths announced by BlueZ, as seen by the signal
+        # callbacks rather than the registry, which the worker may lag behind.
+        self._known_paths = set()
+        self.discarded_signals = 0
+        self.adapter_pattern = adapter
+        self.allow_addresses = allow_addresses
+        self.deny_addresses = deny_addresses
+        self.min_rssi = min_rssi
+        # The signal filter needs the path of the adapter in use.
+        self._filter = None
+        self.filtered_signals = 0
+        # Crossing the connection threshold is never jitter.
+        if rssi_delta > 0:
+            self._hysteresis = RSSIHysteresis(rssi_delta, rssi_interval,
+                                              (threshold_rssi,))
+        else:
+            self._hysteresis = None
+        # The worker queue counts as backlogged when half full.
+        if overload_lag > 0:
+            self._overload = OverloadMonitor(
+                overload_lag / 1000,
+                worker_queue_size // 2 if worker_queue_size > 1 else None
+            )
+        else:
+            self._overload = None
+        self._overload_due = None
+        # The devices are printed unless other sinks are given.
+        self._sinks = SinkDispatcher(
+            [PrintSink()] if sinks is None else sinks, sink_queue_size,
+            sink_batch_size
+        )
+        # The raw signals are recorded as they arrive, if requested.
+        self.record_path = record_path
+        self._recorder = None
+        # The registry and the backup are shared between the main loop and
+        # the worker thread, if there is one.
+        self._lock = threading.RLock()
+        self._worker = None
+        # Only property changes are bounded by the size of the queue.
+        self.worker_queue_size = worker_queue_size
+        if worker_queue_size > 0:
+            self._events = queue.Queue()
+        else:
+            self._events = None
+        self.processed_events = 0
+        self.dropped_events = 0
+        self.overflow_events = 0
+        self.max_queue_depth = 0
         self.queued_connections = 0
         self.adapter = None
         self._log = logging.getLogger("btlesniffer.Sniffer")
 
-        if resume and self.output_path is not None and self.output_path.exists():
+        if self.output_path is not None:
+            self.backup = create_backup(self.output_path, backup_mode,
+                                        compaction_threshold, rssi_capacity,
+                                        compression, compression_level)
+        else:
+            self.backup = None
+
+        if resume and self.backup is not None and self.backup.exists():
             self._log.info("Resuming from a previous device registry backup.")
-            with self.output_path.open("rb") as f:
-                self.registry = pickle.load(f)
+            self.registry = self.backup.load()
+            if self.rssi_capacity is not None:
+                for device in self.registry:
+                    device.rssis.resize(self.rssi_capacity)
         else:
-            self.registry = list()
+            self.registry = DeviceRegistry()
 
     def __enter__(self):
         self._log.debug("Choosing the first available Bluetooth adapter and "
                         "starting device discovery.")
         self._log.debug("The discovery filter is set to Bluetooth LE only.")
+        import pydbus
+        from gi.repository import GLib
+
         try:
-            self.adapter = find_adapter()
-            self.adapter.SetDiscoveryFilter({"Transport": pydbus.Variant("s", "le")})
+            self.adapter = find_adapter(self.adapter_pattern)
+            self._filter = self._create_filter(self.adapter._path)
+            self.adapter.SetDiscoveryFilter(self._discovery_filter(pydbus.Variant))
             self.adapter.StartDiscovery()
         except GLib.Error as ex:
             self._log.exception("Is the bluetooth controller powered on? "
@@ -245,10 +767,48 @@ class Sniffer(object):
             raise ex
         return self
 
+    def _create_filter(self, adapter_path):
+        return SignalFilter(adapter_path, self.allow_addresses,
+                            self.deny_addresses, self.min_rssi,
+                            namespace=self.adapter_pattern is not None)
+
+    def _discovery_filter(self, variant):
+        """
+        Return the discovery filter of the adapter. BlueZ itself ignores
+        the devices below the minimum RSSI, if any.
+        """
+        discovery_filter = {"Transport": variant("s", "le")}
+        if self.min_rssi is not None:
+            discovery_filter["RSSI"] = variant("n", self.min_rssi)
+        return discovery_filter
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.adapter is not None:
             self._log.debug("Stopping device discovery.")
             self.adapter.StopDiscovery()
 
+        if self._worker is not None:
+            self._log.debug("Waiting for the worker to drain the event queue.")
+            self._events.put(None)
+            self._worker.join()
+
+        self._log.debug("Applying the pending updates.")
+        self._flush_pending()
+
+        if self._recorder is not None:
+            self._log.debug("Closing the signal recording.")
+            self._recorder.close()
+            self._recorder = None
+
+        if self._overload is not None:
+            self._log.info("Overload: {}.".format(self._overload))
+
+        self._log.debug("Waiting for the sinks to handle the queued events.")
+        self._sinks.close()
+
+        if self.backup is not None:
+            self._log.debug("Waiting for outstanding backups to be written.")
+            self.backup.close()
+
         return False
 
@@ -6,8 +6,6 @@ With only minor changes, this code is based on the bluezutils.py test script
 at https://git.kernel.org/pub/scm/bluetooth/bluez.git/tree/test/bluezutils.py
 """
 
-import pydbus
-
 SERVICE_NAME = "org.bluez"
 ADAPTER_INTERFACE = "{}.Adapter1".format(SERVICE_NAME)
 DEVICE_INTERFACE = "{}.Device1".format(SERVICE_NAME)
@@ -22,12 +20,18 @@ class BlueZDBusException(Exception):
     pass
 
 
+def _system_bus():
+    # pydbus needs PyGObject, which the asyncio engine does without.
+    import pydbus
+    return pydbus.SystemBus()
+
+
 def get_managed_objects():
     """
     Use the D-Bus ObjectManager interface to determine all managed objects
     of the BlueZ service.
     """
-    bus = pydbus.SystemBus()
+    bus = _system_bus()
     manager = bus.get(SERVICE_NAME, "/")[OBJECT_MANAGER_INTERFACE]
     return manager.GetManagedObjects()
 
@@ -37,11 +41,11 @@ def find_adapter_in_objects(objects, pattern=None):
     Given a dictionary of objects, find either the first Adapter interface
     or the one defined by the specified string pattern.
     """
-    bus = pydbus.SystemBus()
+    bus = _system_bus()
     for path, ifaces in objects.items():
         adapter = ifaces.get(ADAPTER_INTERFACE)
         if adapter is not None:
-            if pattern is None or pattern == adapter.Address or path.endswith(pattern):
+            if pattern is None or pattern == adapter["Address"] or path.endswith(pattern):
                 return bus.get(SERVICE_NAME, path)[ADAPTER_INTERFACE]
     else:
         raise BlueZDBusException("Bluetooth adapter not found.")
@@ -52,7 +56,7 @@ def find_device_in_objects(objects, device_address, adapter_pattern=None):
     Given a dictionary of objects, find the Device interface that
     corresponds to the given address and the related adapter pattern.
     """
-    bus = pydbus.SystemBus()
+    bus = _system_bus()
     path_prefix = ""
     if adapter_pattern is not None:
         adapter = find_adapter_in_objects(objects, adapter_pattern)
@@ -91,7 +95,7 @@ def get_known_devices():
     """
     Using the DBus ObjectManager, yield all known Devices.
     """
-    bus = pydbus.SystemBus()
+    bus = _system_bus()
     manager = bus.get(SERVICE_NAME, "/")[OBJECT_MANAGER_INTERFACE]
     objs = manager.GetManagedObjects()
     for path, ifaces in objs.items():
@@ -103,7 +107,7 @@ def get_known_services():
     """
     Using the DBus ObjectManager, yield all known GATT services.
     """
-    bus = pydbus.SystemBus()
+    bus = _system_bus()
     manager = bus.get(SERVICE_NAME, "/")[OBJECT_MANAGER_INTERFACE]
     objs = manager.GetManagedObjects()
     for path, ifaces in objs.items():
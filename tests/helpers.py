@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides the devices and comparisons shared by the tests.
+"""
+
+import datetime
+import random
+from typing import Any, Dict, List, Tuple
+
+from btlesniffer.device import Device, GATTCharacteristic, GATTDescriptor, \
+    GATTService
+from btlesniffer.registry import DeviceRegistry
+from btlesniffer.util import DEVICE_INTERFACE, OBJECT_MANAGER_INTERFACE, \
+    PROPERTIES_INTERFACE, SERVICE_NAME
+
+ADDRESS = "AA:BB:CC:DD:EE:01"
+PATH = "/org/bluez/hci0/dev_AA_BB_CC_DD_EE_01"
+UUIDS = ["0000180f-0000-1000-8000-00805f9b34fb",
+         "0000180a-0000-1000-8000-00805f9b34fb"]
+
+
+def make_full_device() -> Device:
+    """
+    Return a device with every optional field set.
+    """
+    device = Device(
+        PATH, ADDRESS, True, True, True, name="Beacön", device_class=0x1f00,
+        appearance=0x0040, uuids=["0000180f-0000-1000-8000-00805f9b34fb"],
+        rssi=-60, tx_power=-4,
+        manufacturer_data={0x004c: [0x02, 0x15, 0x01]},
+        service_data={"0000feaa-0000-1000-8000-00805f9b34fb": [0x10, 0x00]},
+        rssi_capacity=4
+    )
+    for i, rssi in enumerate((-70, -65, -80, -55, -62)):
+        device.rssis.append(rssi, 1500000000.0 + i)
+    device.manufacturer_data[0x004c].add(bytes([0x02, 0x15, 0x02]), 1500000010.0)
+    device.manufacturer_data[0x004c].add(bytes([0x02, 0x15, 0x01]), 1500000011.0)
+    device.first_seen = datetime.datetime(2018, 5, 1, 12, 0, 0, 250000)
+    device.last_seen = datetime.datetime(2018, 5, 1, 12, 5, 0)
+
+    service = GATTService("0000180f-0000-1000-8000-00805f9b34fb", True)
+    characteristic = GATTCharacteristic("00002a19-0000-1000-8000-00805f9b34fb",
+                                        [87], ["read", "notify"])
+    characteristic[PATH + "/service000c/char000d/desc000f"] = GATTDescriptor(
+        "00002902-0000-1000-8000-00805f9b34fb", [1, 0], ["read"]
+    )
+    characteristic[PATH + "/service000c/char000d/desc0010"] = GATTDescriptor(
+        "00002901-0000-1000-8000-00805f9b34fb", None, None
+    )
+    service[PATH + "/service000c/char000d"] = characteristic
+    service[PATH + "/service000c/char0011"] = GATTCharacteristic(
+        "00002a1a-0000-1000-8000-00805f9b34fb", None, None
+    )
+    device[PATH + "/service000c"] = service
+    device[PATH + "/service0020"] = GATTService(
+        "0000180a-0000-1000-8000-00805f9b34fb", False
+    )
+    return device
+
+
+def make_bare_device() -> Device:
+    """
+    Return a device without any optional field.
+    """
+    device = Device("/org/bluez/hci0/dev_AA_BB_CC_DD_EE_02",
+                    "AA:BB:CC:DD:EE:02", False, False, False)
+    device.active = False
+    return device
+
+
+def make_registry() -> DeviceRegistry:
+    """
+    Return a registry of a full and a bare device, both of them dirty.
+    """
+    registry = DeviceRegistry()
+    for device in (make_full_device(), make_bare_device()):
+        registry.add(device)
+        registry.mark_dirty(device)
+    return registry
+
+
+def device_state(device: Device) -> Dict[str, Any]:
+    """
+    Return the recorded state of a device as plain values, which compare
+    equal exactly if the devices hold the same data.
+    """
+    rssis = device.rssis
+    return {
+        "active": device.active,
+        "path": device.path,
+        "address": device.address,
+        "paired": device.paired,
+        "connected": device.connected,
+        "services_resolved": device.services_resolved,
+        "name": device.name,
+        "device_class": device.device_class,
+        "appearance": device.appearance,
+        "uuids": set(device.uuids),
+        "tx_power": device.tx_power,
+        "first_seen": device.first_seen,
+        "last_seen": device.last_seen,
+        "rssis": (rssis.capacity, rssis.count, rssis.total, rssis.minimum,
+                  rssis.maximum, rssis.ema, list(rssis.items())),
+        "manufacturer_data": _payloads(device.manufacturer_data),
+        "service_data": _payloads(device.service_data),
+        "services": {
+            s_path: (service.uuid, service.primary, {
+                c_path: (_value(c.value), c.flags, {
+                    d_path: (d.uuid, _value(d.value), d.flags)
+                    for d_path, d in c.descriptors.items()
+                }) for c_path, c in service.characteristics.items()
+            }) for s_path, service in device.services.items()
+        },
+    }
+
+
+def _payloads(data):
+    return {
+        key: {p: (r.count, r.first_seen, r.last_seen)
+              for p, r in history.records.items()}
+        for key, history in data.items()
+    }
+
+
+def _value(value):
+    return list(value) if value is not None else None
+
+
+def device_path(index: int) -> str:
+    """
+    Return the object path of the numbered device of the signals below.
+    """
+    return "/org/bluez/hci0/dev_00_00_00_00_00_{:02X}".format(index)
+
+
+def announce(sniffer, index: int, rssi: int = -70) -> None:
+    """
+    Announce the numbered device to the sniffer by InterfacesAdded.
+    """
+    address = "00:00:00:00:00:{:02X}".format(index)
+    sniffer._cb_interfaces_added(
+        SERVICE_NAME, "/", OBJECT_MANAGER_INTERFACE, "InterfacesAdded",
+        (device_path(index), {DEVICE_INTERFACE: {
+            "Address": address, "Paired": False, "Connected": False,
+            "ServicesResolved": False, "RSSI": rssi,
+        }})
+    )
+
+
+def change(sniffer, index: int, **properties) -> None:
+    """
+    Change the properties of the numbered device by PropertiesChanged.
+    """
+    sniffer._cb_properties_changed(
+        SERVICE_NAME, device_path(index), PROPERTIES_INTERFACE,
+        "PropertiesChanged", (DEVICE_INTERFACE, properties, [])
+    )
+
+
+def random_signals(seed: int, devices: int = 8,
+                   count: int = 400) -> List[Tuple[str, tuple]]:
+    """
+    Return a random stream of device signals as the names of the handlers
+    of the sniffer and their arguments, with increasing timestamps: the
+    devices are announced, change their properties and advertisements,
+    and are removed and announced again.
+    """
+    rng = random.Random(seed)
+    timestamp = 1500000000.0
+    announced = set()
+    signals = list()
+    for _ in range(count):
+        timestamp += rng.uniform(0.001, 0.1)
+        index = rng.randrange(devices)
+        path = device_path(index)
+        choice = rng.random()
+        if index not in announced or choice < 0.03:
+            announced.add(index)
+            signals.append(("_on_interfaces_added", ((path, {DEVICE_INTERFACE: {
+                "Address": "00:00:00:00:00:{:02X}".format(index),
+                "Paired": False, "Connected": False,
+                "ServicesResolved": False, "RSSI": rng.randint(-90, -40),
+            }}), timestamp)))
+        elif choice < 0.06:
+            announced.discard(index)
+            signals.append(("_on_interfaces_removed",
+                            ((path, [DEVICE_INTERFACE]),)))
+        else:
+            data = {"RSSI": rng.randint(-90, -40)}
+            if choice < 0.3:
+                data["ManufacturerData"] = {
+                    0x004c: [0x02, 0x15, rng.randrange(4)]
+                }
+            if choice < 0.15:
+                data["Name"] = "Device {}".format(rng.randrange(3))
+                data["Connected"] = rng.random() < 0.5
+                data["UUIDs"] = [rng.choice(UUIDS)]
+            signals.append(("_on_properties_changed", (path, data, timestamp)))
+    return signals
+
+
+def feed_signals(sniffer, signals: List[Tuple[str, tuple]]) -> None:
+    """
+    Hand the signals to the handlers of the sniffer.
+    """
+    for handler, args in signals:
+        getattr(sniffer, handler)(*args)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+Provides a mock BlueZ object tree on a private D-Bus, served by dbus-next,
+with one adapter whose devices are announced and lost on demand.
+"""
+
+import shutil
+import subprocess
+from typing import Any, Dict, List
+
+from dbus_next import Message, PropertyAccess, Variant
+from dbus_next.aio import MessageBus
+from dbus_next.service import ServiceInterface, dbus_property, method
+
+from btlesniffer.util import SERVICE_NAME, ADAPTER_INTERFACE, \
+    DEVICE_INTERFACE, OBJECT_MANAGER_INTERFACE, PROPERTIES_INTERFACE
+
+ADAPTER_PATH = "/org/bluez/hci0"
+ADAPTER_ADDRESS = "00:00:00:00:00:AA"
+MANUFACTURER_DATA = bytes([0x02, 0x15])
+
+
+def start_bus_daemon() -> subprocess.Popen:
+    """
+    Start a private bus daemon, whose address is in its `address`
+    attribute, or return None if there is no dbus-daemon.
+    """
+    executable = shutil.which("dbus-daemon")
+    if executable is None:
+        return None
+    daemon = subprocess.Popen(
+        [executable, "--session", "--nofork", "--print-address"],
+        stdout=subprocess.PIPE, universal_newlines=True
+    )
+    daemon.address = daemon.stdout.readline().strip()
+    return daemon
+
+
+class Adapter(ServiceInterface):
+    """
+    Record the method calls of the sniffer. Removed devices are unexported,
+    which dbus-next announces by InterfacesRemoved.
+    """
+    @dbus_property(access=PropertyAccess.READ)
+    def Address(self) -> "s":
+        return ADAPTER_ADDRESS
+
+    @method()
+    def SetDiscoveryFilter(self, discovery_filter: "a{sv}"):
+        self.calls.append(("SetDiscoveryFilter", discovery_filter["Transport"].value))
+
+    @method()
+    def StartDiscovery(self):
+        self.calls.append("StartDiscovery")
+
+    @method()
+    def StopDiscovery(self):
+        self.calls.append("StopDiscovery")
+
+    @method()
+    def RemoveDevice(self, path: "o"):
+        self.calls.append(("RemoveDevice", path))
+        self.mock.remove_device(path)
+
+    def __init__(self) -> None:
+        super().__init__(ADAPTER_INTERFACE)
+        self.calls: List[Any] = list()
+        self.mock = None
+
+
+class Device(ServiceInterface):
+    @dbus_property(access=PropertyAccess.READ)
+    def Address(self) -> "s":
+        return self.address
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Paired(self) -> "b":
+        return False
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Connected(self) -> "b":
+        return False
+
+    @dbus_property(access=PropertyAccess.READ)
+    def ServicesResolved(self) -> "b":
+        return False
+
+    @dbus_property(access=PropertyAccess.READ)
+    def RSSI(self) -> "n":
+        return self.rssi
+
+    @dbus_property(access=PropertyAccess.READ)
+    def ManufacturerData(self) -> "a{qv}":
+        return {0x004c: Variant("ay", MANUFACTURER_DATA)}
+
+    def __init__(self, address: str, rssi: int) -> None:
+        super().__init__(DEVICE_INTERFACE)
+        self.address = address
+        self.rssi = rssi
+
+
+class MockBlueZ(object):
+    """
+    Own the name of BlueZ on a bus and serve the adapter and its devices.
+    """
+    def add_device(self, path: str, address: str, rssi: int) -> None:
+        """
+        Export a device, which dbus-next announces by InterfacesAdded.
+        """
+        self.devices[path] = Device(address, rssi)
+        self.bus.export(path, self.devices[path])
+
+    def announce_device(self, path: str) -> None:
+        """
+        Announce an exported device again, as BlueZ does from its root
+        object, for a sniffer that missed the first announcement.
+        """
+        device = self.devices[path]
+        properties = {
+            "Address": Variant("s", device.address),
+            "Paired": Variant("b", False),
+            "Connected": Variant("b", False),
+            "ServicesResolved": Variant("b", False),
+            "RSSI": Variant("n", device.rssi),
+            "ManufacturerData": Variant("a{qv}", {
+                0x004c: Variant("ay", MANUFACTURER_DATA)
+            }),
+        }
+        self.bus.send(Message.new_signal(
+            "/", OBJECT_MANAGER_INTERFACE, "InterfacesAdded", "oa{sa{sv}}",
+            [path, {DEVICE_INTERFACE: properties}]
+        ))
+
+    def remove_device(self, path: str) -> None:
+        """
+        Unexport a device, which dbus-next announces by InterfacesRemoved.
+        """
+        del self.devices[path]
+        self.bus.unexport(path)
+
+    async def change_properties(self, path: str, **properties: Variant) -> None:
+        await self.bus.send(Message.new_signal(
+            path, PROPERTIES_INTERFACE, "PropertiesChanged", "sa{sv}as",
+            [DEVICE_INTERFACE, properties, []]
+        ))
+
+    async def connect(self, bus_address: str) -> "MockBlueZ":
+        self.bus = await MessageBus(bus_address=bus_address).connect()
+        self.adapter.mock = self
+        self.bus.export(ADAPTER_PATH, self.adapter)
+        await self.bus.request_name(SERVICE_NAME)
+        return self
+
+    def disconnect(self) -> None:
+        self.bus.disconnect()
+
+    def __init__(self) -> None:
+        self.adapter = Adapter()
+        self.devices: Dict[str, Device] = dict()
+        self.bus = None
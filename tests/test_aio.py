@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("dbus_next")
+
+from dbus_next import Variant  # noqa: E402
+
+from btlesniffer.aio import AsyncSniffer  # noqa: E402
+from btlesniffer.backup import iter_backup  # noqa: E402
+from btlesniffer.sinks import Lost, New, Sink  # noqa: E402
+
+from mock_bluez import ADAPTER_PATH, MANUFACTURER_DATA, MockBlueZ, \
+    start_bus_daemon  # noqa: E402
+
+SRC = pathlib.Path(__file__).parent.parent / "src"
+
+# Imports the asyncio engine with PyGObject and pydbus made unimportable.
+WITHOUT_GI = """
+import sys
+
+class Block(object):
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("gi", "pydbus"):
+            raise ImportError("No module named " + name)
+
+sys.meta_path.insert(0, Block())
+from btlesniffer.aio import AsyncSniffer
+AsyncSniffer(sinks=(), bus_address="unix:path=/nonexistent")
+"""
+
+ADDRESS = "11:22:33:44:55:66"
+PATH = ADAPTER_PATH + "/dev_11_22_33_44_55_66"
+STALE_PATH = ADAPTER_PATH + "/dev_00_00_00_00_00_01"
+
+
+class ListSink(Sink):
+    events = (New, Lost)
+
+    def handle(self, events):
+        self.received.extend(type(e) for e in events)
+
+    def __init__(self):
+        self.received = list()
+
+
+@pytest.fixture
+def bus_address():
+    daemon = start_bus_daemon()
+    if daemon is None:
+        pytest.skip("dbus-daemon is not available")
+    try:
+        yield daemon.address
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        daemon.stdout.close()
+
+
+async def until(condition, action=None):
+    """
+    Repeat the action until the condition holds, since the sniffer only
+    receives signals once its match rules are added.
+    """
+    for _ in range(100):
+        if action is not None:
+            action()
+        await asyncio.sleep(0.05)
+        if condition():
+            return
+    raise AssertionError("The sniffer did not catch up in time.")
+
+
+async def sniff(bus_address, output_path, sink):
+    bluez = await MockBlueZ().connect(bus_address)
+    bluez.add_device(STALE_PATH, "00:00:00:00:00:01", -70)
+    sniffer = AsyncSniffer(output_path, backup_interval=0,
+                           backup_mode="binary", sinks=[sink],
+                           bus_address=bus_address)
+    try:
+        async with sniffer:
+            task = asyncio.get_event_loop().create_task(sniffer.run())
+
+            # The sniffer removes the devices BlueZ knew beforehand.
+            await until(lambda: STALE_PATH not in bluez.devices)
+            bluez.add_device(PATH, ADDRESS, -40)
+            await until(lambda: sniffer.registry.get_by_path(PATH) is not None,
+                        lambda: bluez.announce_device(PATH))
+            await bluez.change_properties(PATH, RSSI=Variant("n", -50),
+                                          Name=Variant("s", "Mock"))
+            device = sniffer.registry.get_by_path(PATH)
+            await until(lambda: device.name == "Mock")
+            bluez.remove_device(PATH)
+            await until(lambda: not device.active)
+
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+    finally:
+        bluez.disconnect()
+    return bluez.adapter.calls
+
+
+def test_registration_removal_and_backup(tmp_path, bus_address):
+    output_path = tmp_path / "backup"
+    sink = ListSink()
+    loop = asyncio.new_event_loop()
+    try:
+        calls = loop.run_until_complete(sniff(bus_address, output_path, sink))
+    finally:
+        loop.close()
+
+    assert calls[:2] == [("SetDiscoveryFilter", "le"), "StartDiscovery"]
+    assert ("RemoveDevice", STALE_PATH) in calls
+    assert calls[-1] == "StopDiscovery"
+    assert sink.received[0] is New and sink.received[-1] is Lost
+
+    device, = iter_backup(output_path)
+    assert device.address == ADDRESS
+    assert device.name == "Mock"
+    assert not device.active
+    assert list(device.rssis)[-1] == -50
+    assert MANUFACTURER_DATA in device.manufacturer_data[0x004c]
+
+
+def test_import_without_gi():
+    # dbus-next may be installed anywhere on the path of the tests.
+    path = os.pathsep.join([str(SRC)] + sys.path)
+    subprocess.run([sys.executable, "-c", WITHOUT_GI],
+                   env={"PYTHONPATH": path}, check=True)
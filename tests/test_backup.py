@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import pathlib
+import pickle
+import shutil
+
+import pytest
+
+from btlesniffer.backup import BACKUP_MODES, create_backup, detect_mode, \
+    iter_backup
+from btlesniffer.registry import DeviceRegistry
+
+from helpers import device_state, make_full_device, make_registry
+
+BASELINE = pathlib.Path(__file__).parent / "data" / "baseline_registry.pickle"
+
+
+def check_baseline(registry):
+    """
+    Check the devices of the baseline pickle, a plain list of devices whose
+    RSSI samples and payloads were lists.
+    """
+    assert len(registry) == 2
+    device = registry.get_by_path("/org/bluez/hci0/dev_AA_BB_CC_DD_EE_01")
+    assert device.address == "AA:BB:CC:DD:EE:01"
+    assert device.name == "Beacon"
+    assert device.active and device.connected and not device.paired
+    assert (device.device_class, device.appearance, device.tx_power) == \
+        (0x1f00, 0x0040, 4)
+    assert device.first_seen == datetime.datetime(2018, 5, 1, 12, 0, 0)
+    assert list(device.rssis) == [-60, -70, -65]
+    assert device.rssis.count == 3
+    assert (device.rssis.minimum, device.rssis.maximum) == (-70, -60)
+    counts = {p: r.count for p, r in device.manufacturer_data[0x004c].records.items()}
+    assert counts == {bytes([2, 21, 1, 2]): 2, bytes([2, 21, 1, 3]): 1}
+    assert bytes([16, 0, 97]) in \
+        device.service_data["0000feaa-0000-1000-8000-00805f9b34fb"]
+    service = device.services["/org/bluez/hci0/dev_AA_BB_CC_DD_EE_01/service000c"]
+    assert service.primary
+
+    device = registry.get_by_address("AA:BB:CC:DD:EE:02")
+    assert not device.active
+    assert device.rssis.count == 0
+    assert device.rssis.last is None
+
+
+def test_baseline_pickle():
+    with BASELINE.open("rb") as f:
+        check_baseline(DeviceRegistry.from_backup(pickle.load(f)))
+
+
+@pytest.mark.parametrize("mode", BACKUP_MODES)
+def test_resume_from_baseline_pickle(tmp_path, mode):
+    path = tmp_path / "backup.pkl"
+    shutil.copy(str(BASELINE), str(path))
+    backup = create_backup(path, mode)
+    try:
+        registry = backup.load()
+        check_baseline(registry)
+        # The next backup converts the registry into the mode's format.
+        registry.mark_dirty(registry.get_by_address("AA:BB:CC:DD:EE:01"))
+        backup.write(registry)
+    finally:
+        backup.close()
+    check_baseline(DeviceRegistry(iter_backup(path)))
+
+
+@pytest.mark.parametrize("mode", ["snapshot", "journal", "binary", "indexed"])
+def test_round_trip(tmp_path, mode):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    backup = create_backup(path, mode)
+    backup.write(registry)
+    backup.close()
+
+    assert detect_mode(path) == mode
+    backup = create_backup(path, mode)
+    try:
+        loaded = backup.load()
+        for device in registry:
+            assert device_state(loaded.get_by_address(device.address)) == \
+                device_state(device)
+    finally:
+        backup.close()
+
+
+@pytest.mark.parametrize("mode", ["snapshot", "journal", "binary", "indexed"])
+def test_snapshot_keeps_unchanged_devices(tmp_path, mode):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    # Every write after the first compacts the journal.
+    backup = create_backup(path, mode, compaction_threshold=0)
+    backup.write(registry)
+    device = registry.get_by_address("AA:BB:CC:DD:EE:02")
+    device.name = "Renamed"
+    registry.mark_dirty(device)
+    captured = list()
+    capture_device = backup._capture_device
+    backup._capture_device = lambda d: captured.append(d) or capture_device(d)
+    backup.write(registry)
+    backup.close()
+    # Only the changed device was captured, the other one was copied from
+    # the previous snapshot.
+    assert captured == [device]
+
+    backup = create_backup(path, mode)
+    try:
+        loaded = backup.load()
+        for device in registry:
+            assert device_state(loaded.get_by_address(device.address)) == \
+                device_state(device)
+    finally:
+        backup.close()
+
+
+def resumed_state(device):
+    """
+    Return the state of a device apart from the capacity of its RSSI
+    history, which SQLite databases do not keep.
+    """
+    state = device_state(device)
+    state["rssis"] = state["rssis"][1:]
+    return state
+
+
+@pytest.mark.parametrize("mode", BACKUP_MODES)
+@pytest.mark.parametrize("previous_mode", BACKUP_MODES)
+def test_resume_from_other_mode(tmp_path, mode, previous_mode):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    backup = create_backup(path, previous_mode)
+    backup.write(registry)
+    backup.close()
+
+    # The backup is converted upon the first write after resuming, unless
+    # the mode reads it as it is.
+    backup = create_backup(path, mode)
+    try:
+        loaded = backup.load()
+        backup.write(loaded)
+    finally:
+        backup.close()
+    if {previous_mode, mode} != {"snapshot", "journal"}:
+        assert detect_mode(path) == mode
+
+    backup = create_backup(path, mode)
+    try:
+        loaded = backup.load()
+        for device in registry:
+            assert resumed_state(loaded.get_by_address(device.address)) == \
+                resumed_state(device)
+    finally:
+        backup.close()
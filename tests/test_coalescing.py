@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from btlesniffer.sniffer import Sniffer
+
+from helpers import device_state, feed_signals, random_signals
+
+
+class TickingSniffer(Sniffer):
+    """
+    Coalesce the property changes until the test ticks, rather than on a
+    GLib timer.
+    """
+    def _call_later(self, delay, callback):
+        return callback
+
+    def _cancel_call(self, handle):
+        pass
+
+
+def registry_state(sniffer):
+    return {d.address: device_state(d) for d in sniffer.registry}
+
+
+def test_coalescing_keeps_the_state_of_the_devices():
+    rng = random.Random(1)
+    for seed in range(5):
+        signals = random_signals(seed)
+        direct = Sniffer(coalescing_interval=0, rssi_capacity=16, sinks=[])
+        feed_signals(direct, signals)
+        direct.__exit__(None, None, None)
+
+        coalescing = TickingSniffer(coalescing_interval=50, rssi_capacity=16,
+                                    sinks=[])
+        start = 0
+        while start < len(signals):
+            end = start + rng.randint(1, 40)
+            feed_signals(coalescing, signals[start:end])
+            if coalescing._coalescing_source is not None:
+                coalescing._coalescing_source()
+            start = end
+        coalescing.__exit__(None, None, None)
+
+        assert len(direct.registry) == 8
+        assert coalescing.coalesced_signals > 0
+        assert registry_state(coalescing) == registry_state(direct)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+from btlesniffer import codec
+from btlesniffer.codec import FormatError
+
+from helpers import device_state, make_bare_device, make_full_device
+
+
+@pytest.mark.parametrize("make_device", [make_full_device, make_bare_device])
+def test_device_round_trip(make_device):
+    device = make_device()
+    decoded = codec.decode_device(codec.encode_device(device))
+    assert device_state(decoded) == device_state(device)
+
+
+def test_optional_fields_are_kept_apart_from_zero():
+    device = make_full_device()
+    device.device_class = 0
+    device.appearance = 0
+    device.tx_power = 0
+    decoded = codec.decode_device(codec.encode_device(device))
+    assert (decoded.device_class, decoded.appearance, decoded.tx_power) == (0, 0, 0)
+
+    decoded = codec.decode_device(codec.encode_device(make_bare_device()))
+    assert decoded.name is None
+    assert decoded.device_class is None
+    assert decoded.appearance is None
+    assert decoded.tx_power is None
+    assert decoded.rssis.count == 0
+    assert decoded.rssis.minimum is None
+    assert decoded.rssis.maximum is None
+    assert decoded.rssis.ema is None
+
+
+def test_full_device_covers_optional_fields():
+    device = make_full_device()
+    # The RSSI history overflowed; its statistics cover all samples.
+    assert device.rssis.count > device.rssis.capacity
+    service = device.services[next(iter(device.services))]
+    characteristics = service.characteristics.values()
+    assert any(c.value is None for c in characteristics)
+    assert any(c.flags is None for c in characteristics)
+
+
+def test_stream_round_trip():
+    devices = [make_full_device(), make_bare_device()]
+    f = io.BytesIO()
+    codec.dump_devices(devices, f)
+    f.seek(0)
+    assert codec.is_binary(f)
+    assert f.tell() == 0
+    decoded = list(codec.iter_devices(f))
+    assert [device_state(d) for d in decoded] == \
+        [device_state(d) for d in devices]
+
+
+def test_peek_address():
+    record = codec.encode_device(make_full_device())
+    assert codec.peek_address(record) == make_full_device().address
+
+
+@pytest.mark.parametrize("cut", [1, 10, 40, -1])
+def test_truncated_record(cut):
+    record = codec.encode_device(make_full_device())
+    with pytest.raises(FormatError):
+        codec.decode_device(record[:cut])
+
+
+def test_truncated_stream():
+    f = io.BytesIO()
+    codec.dump_devices([make_full_device()], f)
+    data = f.getvalue()
+    for end, message in ((len(data) - 5, "record"),
+                         (len(codec.MAGIC) + 3, "length")):
+        with pytest.raises(FormatError, match=message):
+            list(codec.iter_devices(io.BytesIO(data[:end])))
+
+
+def test_unknown_version():
+    f = io.BytesIO()
+    codec.dump_devices([make_full_device()], f)
+    data = bytearray(f.getvalue())
+    data[len(codec.MAGIC)] = codec.VERSION + 1
+    with pytest.raises(FormatError, match="version"):
+        list(codec.iter_devices(io.BytesIO(bytes(data))))
+
+
+def test_not_binary():
+    with pytest.raises(FormatError):
+        codec.read_header(io.BytesIO(b"\x80\x04not a backup"))
+    assert not codec.is_binary(io.BytesIO(b"\x80\x04"))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import pytest
+
+from btlesniffer.backup import COMPRESSIONS, STREAM_MODES, create_backup, \
+    detect_compression, detect_mode, iter_pickled, open_decompressed
+
+from helpers import device_state, make_registry
+
+
+@pytest.mark.parametrize("mode", STREAM_MODES)
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_compressed_round_trip(tmp_path, mode, compression):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    backup = create_backup(path, mode, compression=compression,
+                           compression_level=1)
+    backup.write(registry)
+    backup.close()
+
+    with path.open("rb") as f:
+        assert detect_compression(f) == compression
+    assert detect_mode(path) == mode
+    # The compression is detected regardless of the option.
+    backup = create_backup(path, mode)
+    try:
+        loaded = backup.load()
+        for device in registry:
+            assert device_state(loaded.get_by_address(device.address)) == \
+                device_state(device)
+    finally:
+        backup.close()
+
+
+def test_compressed_journal_is_compacted_on_resume(tmp_path):
+    path = tmp_path / "backup"
+    journal_path = path.with_name("backup.journal")
+    registry = make_registry()
+    backup = create_backup(path, "journal", compression="zlib")
+    backup.write(registry)
+    device = registry.get_by_address("AA:BB:CC:DD:EE:02")
+    device.name = "Renamed"
+    registry.mark_dirty(device)
+    backup.write(registry)
+    backup.close()
+
+    # Appending to a compressed journal could not tell a truncated record
+    # from the end of the stream, so the first write compacts.
+    backup = create_backup(path, "journal", compression="zlib")
+    try:
+        loaded = backup.load()
+        assert loaded.get_by_address("AA:BB:CC:DD:EE:02").name == "Renamed"
+        loaded.mark_dirty(loaded.get_by_address("AA:BB:CC:DD:EE:02"))
+        backup.write(loaded)
+    finally:
+        backup.close()
+    with open_decompressed(path) as f:
+        snapshot = [pickle.loads(o[1]) for o in iter_pickled(f)
+                    if isinstance(o, tuple)]
+    # The journal was folded into the snapshot and started anew.
+    assert sorted(d.name for d in snapshot) == ["Beacön", "Renamed"]
+    with open_decompressed(journal_path) as f:
+        assert list(iter_pickled(f)) == [2]
+
+
+def test_compression_is_limited_to_stream_modes(tmp_path):
+    with pytest.raises(ValueError):
+        create_backup(tmp_path / "backup", "indexed", compression="zlib")
+    with pytest.raises(ValueError):
+        create_backup(tmp_path / "backup", "snapshot", compression="zip")
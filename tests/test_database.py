@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+
+from btlesniffer.backup import create_backup
+
+from helpers import device_state, make_full_device, make_registry
+
+
+def test_sqlite_loads_lazily(tmp_path):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    backup = create_backup(path, "sqlite")
+    backup.write(registry)
+    backup.close()
+
+    full = registry.get_by_address(make_full_device().address)
+    backup = create_backup(path, "sqlite", rssi_capacity=full.rssis.capacity)
+    try:
+        loaded = backup.load()
+        assert len(list(loaded)) == 0
+        assert len(loaded) == 2
+        device = loaded.get_by_path(full.path)
+        assert device_state(device) == device_state(full)
+        assert list(loaded) == [device]
+        assert [d.address for d in backup.iter_devices()] == \
+            ["AA:BB:CC:DD:EE:02"]
+    finally:
+        backup.close()
+
+
+def test_sqlite_writes_folded_samples_once(tmp_path):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    device = registry.get_by_address(make_full_device().address)
+    backup = create_backup(path, "sqlite")
+    try:
+        backup.write(registry)
+        device.rssis.fold(-61)
+        registry.mark_dirty(device)
+        backup.write(registry)
+        device.rssis.append(-62, 1525176000.0)
+        registry.mark_dirty(device)
+        backup.write(registry)
+    finally:
+        backup.close()
+
+    connection = sqlite3.connect(str(path))
+    try:
+        values = [v for v, in connection.execute(
+            "SELECT rssi FROM rssi_samples WHERE address = ? ORDER BY rowid",
+            (device.address,)
+        )]
+    finally:
+        connection.close()
+    assert values == list(make_full_device().rssis) + [-62]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from btlesniffer.filters import SignalFilter
+
+
+def test_weak_sample_keeps_advertising_data():
+    signal_filter = SignalFilter("/org/bluez/hci0", min_rssi=-80)
+    data = {"RSSI": -90, "ManufacturerData": {76: [2, 21]}, "ServiceData": {}}
+
+    assert signal_filter.filter_properties(data) == \
+        {"ManufacturerData": {76: [2, 21]}, "ServiceData": {}}
+    assert "RSSI" in data
+
+
+def test_weak_sample_alone_is_dropped():
+    signal_filter = SignalFilter("/org/bluez/hci0", min_rssi=-80)
+
+    assert signal_filter.filter_properties({"RSSI": -90}) is None
+    assert signal_filter.filter_properties({"RSSI": -70}) == {"RSSI": -70}
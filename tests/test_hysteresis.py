@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from btlesniffer.device import Device
+from btlesniffer.hysteresis import RSSIHysteresis
+
+from helpers import ADDRESS, PATH
+
+START = 1500000000.0
+
+
+def make_device(rssi=-70):
+    device = Device(PATH, ADDRESS, False, False, False, rssi=rssi,
+                    manufacturer_data={0x004c: [0x02, 0x15, 0x01]},
+                    timestamp=START)
+    return device
+
+
+def test_small_changes_are_folded():
+    hysteresis = RSSIHysteresis(5, 10.0)
+    device = make_device()
+    samples = [(START + 1, {"RSSI": -66}), (START + 2, {"RSSI": -74})]
+    assert hysteresis.filter(device, samples) == []
+    assert hysteresis.suppressed == 2
+    # The jitter counts in the statistics, but is not retained.
+    assert list(device.rssis) == [-70]
+    assert (device.rssis.count, device.rssis.minimum) == (3, -74)
+    assert device.last_seen.timestamp() == START + 2
+
+
+def test_large_or_late_changes_are_kept():
+    hysteresis = RSSIHysteresis(5, 10.0)
+    device = make_device()
+    samples = [(START + 1, {"RSSI": -65}), (START + 20, {"RSSI": -66})]
+    assert hysteresis.filter(device, samples) == samples
+    assert hysteresis.suppressed == 0
+
+
+def test_kept_samples_are_the_reference_for_the_next_ones():
+    hysteresis = RSSIHysteresis(5, 10.0)
+    device = make_device()
+    samples = [(START + 1, {"RSSI": -60}), (START + 2, {"RSSI": -62}),
+               (START + 3, {"RSSI": -67})]
+    assert hysteresis.filter(device, samples) == [samples[0], samples[2]]
+
+
+def test_crossing_a_threshold_is_kept():
+    hysteresis = RSSIHysteresis(5, 10.0, (-80,))
+    device = make_device(-78)
+    samples = [(START + 1, {"RSSI": -80}), (START + 2, {"RSSI": -81}),
+               (START + 3, {"RSSI": -79})]
+    # A sample at the threshold is above it; -81 and -79 cross it.
+    assert hysteresis.filter(device, samples) == samples[1:]
+    assert hysteresis.suppressed == 1
+
+
+def test_new_payloads_are_kept():
+    hysteresis = RSSIHysteresis(5, 10.0)
+    device = make_device()
+    known = {"RSSI": -70, "ManufacturerData": {0x004c: bytes([0x02, 0x15, 0x01])}}
+    new = {"RSSI": -70, "ManufacturerData": {0x004c: bytes([0x02, 0x15, 0x02])}}
+    assert hysteresis.filter(device, [(START + 1, known), (START + 2, new)]) \
+        == [(START + 2, new)]
+    assert device.manufacturer_data[0x004c].records[bytes([0x02, 0x15, 0x01])] \
+        .count == 2
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from btlesniffer.backup import create_backup
+from btlesniffer.device import Device
+
+from helpers import make_full_device, make_registry
+
+
+def test_indexed_loads_lazily(tmp_path):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    backup = create_backup(path, "indexed")
+    backup.write(registry)
+    backup.close()
+
+    backup = create_backup(path, "indexed", rssi_capacity=2)
+    try:
+        loaded = backup.load()
+        assert len(list(loaded)) == 0
+        device = loaded.get_by_path(make_full_device().path)
+        assert device.rssis.capacity == 2
+        assert list(device.rssis) == list(make_full_device().rssis)[-2:]
+        assert [d.address for d in backup.iter_devices()] == \
+            ["AA:BB:CC:DD:EE:02"]
+    finally:
+        backup.close()
+
+
+def test_indexed_copies_unchanged_records(tmp_path):
+    path = tmp_path / "backup"
+    backup = create_backup(path, "indexed")
+    backup.write(make_registry())
+    backup.close()
+
+    full = make_full_device()
+    backup = create_backup(path, "indexed", rssi_capacity=2)
+    try:
+        registry = backup.load()
+        registry.get_by_address(full.address)
+        registry.add(Device(full.path + "_1", "AA:BB:CC:DD:EE:03", False,
+                            False, False))
+        backup.write(registry)
+    finally:
+        backup.close()
+
+    backup = create_backup(path, "indexed")
+    try:
+        loaded = backup.load()
+        assert len(loaded) == 3
+        # The resized device replaced its record, whereas the one that
+        # was never looked up was copied.
+        assert loaded.get_by_address(full.address).rssis.capacity == 2
+        assert loaded.get_by_address("AA:BB:CC:DD:EE:02").rssis.count == 0
+        assert loaded.get_by_address("AA:BB:CC:DD:EE:03") is not None
+    finally:
+        backup.close()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from btlesniffer.backup import create_backup
+
+from helpers import make_registry
+
+
+def test_journal_appends_changes(tmp_path):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    backup = create_backup(path, "journal")
+    backup.write(registry)
+    device = registry.get_by_address("AA:BB:CC:DD:EE:02")
+    device.name = "Renamed"
+    registry.mark_dirty(device)
+    backup.write(registry)
+    backup.close()
+
+    backup = create_backup(path, "journal")
+    try:
+        loaded = backup.load()
+        assert loaded.get_by_address("AA:BB:CC:DD:EE:02").name == "Renamed"
+    finally:
+        backup.close()
+
+
+def test_journal_of_older_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "backup"
+    journal_path = path.with_name("backup.journal")
+    registry = make_registry()
+    backup = create_backup(path, "journal")
+    backup.write(registry)
+    device = registry.get_by_address("AA:BB:CC:DD:EE:02")
+    device.name = "Old"
+    registry.mark_dirty(device)
+    backup.write(registry)
+    backup.close()
+    stale_journal = journal_path.read_bytes()
+
+    backup = create_backup(path, "journal")
+    registry = backup.load()
+    registry.get_by_address("AA:BB:CC:DD:EE:02").name = "New"
+    backup.compact(registry)
+    backup.close()
+    # A crash after the snapshot was replaced leaves the old journal.
+    journal_path.write_bytes(stale_journal)
+
+    backup = create_backup(path, "journal")
+    try:
+        assert backup.load().get_by_address("AA:BB:CC:DD:EE:02").name == "New"
+    finally:
+        backup.close()
+
+
+def test_journal_truncated_record(tmp_path):
+    path = tmp_path / "backup"
+    registry = make_registry()
+    backup = create_backup(path, "journal")
+    backup.write(registry)
+    device = registry.get_by_address("AA:BB:CC:DD:EE:02")
+    device.name = "Renamed"
+    registry.mark_dirty(device)
+    backup.write(registry)
+    backup.close()
+    journal_path = path.with_name("backup.journal")
+    journal_path.write_bytes(journal_path.read_bytes()[:-7])
+
+    backup = create_backup(path, "journal")
+    try:
+        loaded = backup.load()
+        assert loaded.get_by_address("AA:BB:CC:DD:EE:02").name is None
+    finally:
+        backup.close()
+
+
+def test_journal_is_compacted_at_the_threshold(tmp_path):
+    path = tmp_path / "backup"
+    journal_path = path.with_name("backup.journal")
+    registry = make_registry()
+    device = registry.get_by_address("AA:BB:CC:DD:EE:02")
+    backup = create_backup(path, "journal", compaction_threshold=2)
+    backup.write(registry)
+    backup.writer.flush()
+    compacted_size = journal_path.stat().st_size
+    for name in ("First", "Second"):
+        device.name = name
+        registry.mark_dirty(device)
+        backup.write(registry)
+    backup.writer.flush()
+    assert journal_path.stat().st_size > compacted_size
+    device.name = "Third"
+    registry.mark_dirty(device)
+    backup.write(registry)
+    backup.close()
+    assert journal_path.stat().st_size == compacted_size
+
+    backup = create_backup(path, "journal")
+    try:
+        loaded = backup.load()
+        assert loaded.get_by_address("AA:BB:CC:DD:EE:02").name == "Third"
+        assert len(loaded) == 2
+    finally:
+        backup.close()
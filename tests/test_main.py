@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+SRC = pathlib.Path(__file__).parent.parent / "src"
+BASELINE = pathlib.Path(__file__).parent / "data" / "baseline_registry.pickle"
+
+# Runs the command line with the D-Bus bindings made unimportable.
+WITHOUT_DBUS = """
+import sys
+
+class Block(object):
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("gi", "pydbus", "dbus_next"):
+            raise ImportError("No module named " + name)
+
+sys.meta_path.insert(0, Block())
+sys.argv = ["btlesniffer"] + sys.argv[1:]
+from btlesniffer.main import main
+main()
+"""
+
+
+def run_without_dbus(*args):
+    return subprocess.run(
+        [sys.executable, "-c", WITHOUT_DBUS] + [str(a) for a in args],
+        env={"PYTHONPATH": str(SRC)}, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+    )
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_merge_and_query_without_dbus(tmp_path, compression):
+    merged = tmp_path / "merged.bin"
+    run_without_dbus("merge", "-o", merged, "--compression", compression,
+                     BASELINE)
+    result = run_without_dbus("query", "--count", merged)
+    assert result.stdout.strip() == "2"
+    result = run_without_dbus("query", "--name", "beacon", merged)
+    assert "AA:BB:CC:DD:EE:01" in result.stdout
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from btlesniffer.device import GATTCharacteristic, GATTDescriptor, GATTService
+from btlesniffer.merge import merge_devices
+from btlesniffer.registry import DeviceRegistry
+
+from helpers import PATH, make_full_device
+
+
+def test_merge_keeps_gatt_of_every_record():
+    older = make_full_device()
+    older.services.clear()
+    older.last_seen = datetime.datetime(2018, 5, 1, 12, 0, 0)
+    newer = make_full_device()
+    newer.last_seen = datetime.datetime(2018, 5, 2, 12, 0, 0)
+
+    merged, = merge_devices([iter([older]), iter([newer])])
+    assert set(merged.services) == set(make_full_device().services)
+    characteristic = merged.services[PATH + "/service000c"][PATH + "/service000c/char000d"]
+    assert len(characteristic.descriptors) == 2
+
+
+def test_merge_folds_gatt_trees():
+    older = make_full_device()
+    older.last_seen = datetime.datetime(2018, 5, 1, 12, 0, 0)
+    newer = make_full_device()
+    newer.services.clear()
+    newer.last_seen = datetime.datetime(2018, 5, 2, 12, 0, 0)
+    service = GATTService("0000180f-0000-1000-8000-00805f9b34fb", True)
+    characteristic = GATTCharacteristic("00002a19-0000-1000-8000-00805f9b34fb",
+                                        [42], None)
+    characteristic[PATH + "/service000c/char000d/desc0012"] = GATTDescriptor(
+        "00002902-0000-1000-8000-00805f9b34fb", [0, 1], ["read"]
+    )
+    service[PATH + "/service000c/char000d"] = characteristic
+    newer[PATH + "/service000c"] = service
+
+    merged, = merge_devices([iter([older]), iter([newer])])
+    assert set(merged.services) == {PATH + "/service000c", PATH + "/service0020"}
+    characteristic = merged.services[PATH + "/service000c"][PATH + "/service000c/char000d"]
+    assert characteristic.value == [42]
+    assert characteristic.flags == ["read", "notify"]
+    assert len(characteristic.descriptors) == 3
+    assert len(merged.services[PATH + "/service000c"].characteristics) == 2
+
+
+def test_registry_indexes_merged_gatt():
+    registry = DeviceRegistry()
+    device = make_full_device()
+    device.services.clear()
+    registry.add(device)
+    d, new = registry.add(make_full_device())
+    assert not new
+    owner, service = registry.lookup(PATH + "/service000c")
+    assert owner is d
+    assert service is d.services[PATH + "/service000c"]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from btlesniffer.overload import SHED_PRINTING, SHED_SAMPLES, OverloadMonitor
+from btlesniffer.sniffer import Sniffer
+
+from helpers import announce, change, device_path
+
+
+def test_level_rises_with_every_overloaded_measurement():
+    monitor = OverloadMonitor(0.1)
+    assert [monitor.update(0.2) for _ in range(4)] == [1, 2, 3, None]
+    assert monitor.level == SHED_SAMPLES
+    assert monitor.max_observed_lag == 0.2
+
+
+def test_level_falls_once_lag_and_backlog_are_low():
+    monitor = OverloadMonitor(0.1, 100)
+    monitor.update(0.0, 100)
+    monitor.update(0.1, 0)
+    # A lag or backlog between half and all of its maximum holds the level.
+    assert monitor.update(0.06, 10) is None
+    assert monitor.update(0.01, 60) is None
+    assert monitor.update(0.01, 10) == 1
+    assert monitor.update(0.0, 0) == 0
+    assert monitor.update(0.0, 0) is None
+
+
+def test_samples_are_shed_at_the_highest_level():
+    sniffer = Sniffer(coalescing_interval=0, overload_lag=100, sinks=[])
+    announce(sniffer, 1)
+    sniffer._overload.level = SHED_PRINTING
+    change(sniffer, 1, RSSI=-60)
+    sniffer._overload.level = SHED_SAMPLES
+    change(sniffer, 1, RSSI=-50)
+    change(sniffer, 1, RSSI=-40, Name="Kept")
+    sniffer.__exit__(None, None, None)
+
+    # Only bare RSSI samples are shed, never other properties.
+    device = sniffer.registry.get_by_path(device_path(1))
+    assert list(device.rssis) == [-70, -60, -40]
+    assert device.name == "Kept"
+    assert sniffer._overload.shed_samples == 1
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from btlesniffer.payload import PayloadHistory
+
+IBEACON = bytes([0x02, 0x15, 0x01])
+OTHER = bytes([0x02, 0x15, 0x02])
+
+
+def make_history():
+    history = PayloadHistory()
+    for payload, timestamp in ((IBEACON, 10.0), (OTHER, 11.0), (IBEACON, 12.0)):
+        history.add(payload, timestamp)
+    return history
+
+
+def test_distinct_payloads_are_stored_once():
+    history = make_history()
+    assert len(history) == 2
+    assert list(history) == [IBEACON, OTHER]
+    record = history.records[IBEACON]
+    assert (record.count, record.first_seen, record.last_seen) == (2, 10.0, 12.0)
+    assert history.last == IBEACON
+
+
+def test_merge_adds_up_the_records():
+    history = make_history()
+    newer = PayloadHistory()
+    newer.add(OTHER, 5.0)
+    newer.add(bytes([0x03]), 20.0)
+    history.update(newer)
+    counts = {p: (r.count, r.first_seen, r.last_seen)
+              for p, r in history.records.items()}
+    assert counts == {IBEACON: (2, 10.0, 12.0), OTHER: (2, 5.0, 11.0),
+                      bytes([0x03]): (1, 20.0, 20.0)}
+    assert history.last == bytes([0x03])
+
+
+def test_restore_finds_the_last_payload():
+    history = PayloadHistory.restore(make_history().records)
+    assert history.last == IBEACON
+    assert PayloadHistory.restore(dict()).last is None
+
+
+def test_payloads_are_stored_as_bytes():
+    history = PayloadHistory()
+    # pydbus hands byte arrays over as lists of integers.
+    history.add([0x02, 0x15, 0x01], 10.0)
+    history.add(IBEACON, 11.0)
+    assert list(history) == [IBEACON]
+    assert type(history.last) is bytes
+    assert [0x02, 0x15, 0x01] in history
+    assert history.records[IBEACON].count == 2
+
+
+def test_older_payloads_are_converted_on_unpickling():
+    history = make_history()
+    state = history.__getstate__()
+    state["records"] = {tuple(p): r for p, r in state["records"].items()}
+    state["_last"] = tuple(state["_last"])
+    restored = PayloadHistory.__new__(PayloadHistory)
+    restored.__setstate__(state)
+    assert list(restored) == [IBEACON, OTHER]
+    assert restored.last == IBEACON
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from btlesniffer.device import GATTCharacteristic, GATTDescriptor, GATTService
+from btlesniffer.registry import DeviceRegistry
+from btlesniffer.sinks import Characteristic, Descriptor, Sink, Update
+from btlesniffer.sniffer import Sniffer
+
+from helpers import ADDRESS, PATH, make_bare_device, make_full_device
+
+SERVICE_PATH = PATH + "/service000c"
+CHARACTERISTIC_PATH = SERVICE_PATH + "/char000d"
+DESCRIPTOR_PATH = CHARACTERISTIC_PATH + "/desc000f"
+BATTERY = "0000180f-0000-1000-8000-00805f9b34fb"
+LEVEL = "00002a19-0000-1000-8000-00805f9b34fb"
+CONFIGURATION = "00002902-0000-1000-8000-00805f9b34fb"
+
+
+def make_device():
+    device = make_bare_device()
+    device.path = PATH
+    return device
+
+
+def test_devices_are_indexed_by_address_and_path():
+    full, bare = make_full_device(), make_bare_device()
+    registry = DeviceRegistry([full, bare])
+    assert len(registry) == 2
+    assert registry.get_by_address(ADDRESS) is full
+    assert registry.get_by_path(bare.path) is bare
+    assert registry.get_by_address("AA:BB:CC:DD:EE:FF") is None
+    assert registry.get_by_path(PATH + "0") is None
+    assert full in registry
+
+
+def test_known_devices_are_merged():
+    registry = DeviceRegistry([make_full_device()])
+    device = registry.get_by_address(ADDRESS)
+    again = make_bare_device()
+    again.address = ADDRESS
+    again.name = "Again"
+
+    assert registry.add(again) == (device, False)
+    assert len(registry) == 1
+    assert device.name == "Again"
+    # The device is found under the path BlueZ announced it at last.
+    assert registry.get_by_path(again.path) is device
+    assert registry.get_by_path(PATH) is None
+
+
+def test_devices_are_reindexed_when_their_path_changes():
+    registry = DeviceRegistry([make_full_device()])
+    device = registry.get_by_address(ADDRESS)
+    registry.update_device(device, PATH + "_1", {"RSSI": -50}, 1500000100.0)
+    assert registry.get_by_path(PATH + "_1") is device
+    assert registry.get_by_path(PATH) is None
+    assert registry.pop_dirty() == [device]
+
+
+def test_gatt_objects_are_indexed_by_path():
+    registry = DeviceRegistry([make_device()])
+    service = GATTService(BATTERY, True)
+    device = registry.get_by_path(PATH)
+    assert registry.add_gatt(SERVICE_PATH, PATH, service) == [(device, service)]
+    assert registry.lookup(SERVICE_PATH) == (device, service)
+    assert registry.lookup(PATH) == (device, device)
+    assert registry.lookup(PATH + "/service0020") == (None, None)
+
+
+def test_buffered_gatt_objects_are_returned_when_attached():
+    registry = DeviceRegistry([make_device()])
+    device = registry.get_by_path(PATH)
+    descriptor = GATTDescriptor(CONFIGURATION, [1, 0], ["read"])
+    characteristic = GATTCharacteristic(LEVEL, [87], ["read"])
+    service = GATTService(BATTERY, True)
+
+    assert registry.add_gatt(DESCRIPTOR_PATH, CHARACTERISTIC_PATH, descriptor) == []
+    assert registry.add_gatt(CHARACTERISTIC_PATH, SERVICE_PATH, characteristic) == []
+    attached = registry.add_gatt(SERVICE_PATH, PATH, service)
+    assert attached == [(device, service), (device, characteristic),
+                        (device, descriptor)]
+    assert device.services[SERVICE_PATH][CHARACTERISTIC_PATH][DESCRIPTOR_PATH] \
+        is descriptor
+
+
+class ListSink(Sink):
+    def handle(self, events):
+        self.received.extend(type(e) for e in events)
+
+    def __init__(self):
+        self.received = list()
+
+
+def test_buffered_gatt_objects_produce_events():
+    sink = ListSink()
+    sniffer = Sniffer(coalescing_interval=0, sinks=[sink])
+    sniffer.registry.add(make_device())
+    sniffer._register_descriptor(DESCRIPTOR_PATH, {
+        "UUID": CONFIGURATION, "Characteristic": CHARACTERISTIC_PATH,
+        "Value": [1, 0], "Flags": ["read"]
+    })
+    sniffer._register_characteristic(CHARACTERISTIC_PATH, {
+        "UUID": LEVEL, "Service": SERVICE_PATH, "Value": [87], "Flags": ["read"]
+    })
+    sniffer._register_service(SERVICE_PATH, {
+        "UUID": BATTERY, "Device": PATH, "Primary": True
+    })
+    sniffer.__exit__(None, None, None)
+    assert sink.received == [Update, Characteristic, Descriptor]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+pytest.importorskip("gi")
+
+from gi.repository import GLib  # noqa: E402
+
+from btlesniffer.recording import SignalReader, SignalRecorder  # noqa: E402
+from btlesniffer.replay import ReplaySniffer  # noqa: E402
+from btlesniffer.sniffer import Sniffer  # noqa: E402
+from btlesniffer.util import DEVICE_INTERFACE, OBJECT_MANAGER_INTERFACE, \
+    PROPERTIES_INTERFACE  # noqa: E402
+
+from helpers import device_path, device_state  # noqa: E402
+
+ADAPTER_PATH = "/org/bluez/hci0"
+START = 1500000000.0
+
+
+def make_signals(seed, devices=4, count=200):
+    """
+    Return a random stream of signals as they are recorded: the object
+    path, interface, name and parameters of each, with its timestamp.
+    """
+    rng = random.Random(seed)
+    signals = list()
+    for index in range(devices):
+        signals.append((device_path(index), OBJECT_MANAGER_INTERFACE,
+                        "InterfacesAdded", GLib.Variant("(oa{sa{sv}})", (
+                            device_path(index), {DEVICE_INTERFACE: {
+                                "Address": GLib.Variant(
+                                    "s", "00:00:00:00:00:{:02X}".format(index)),
+                                "Paired": GLib.Variant("b", False),
+                                "Connected": GLib.Variant("b", False),
+                                "ServicesResolved": GLib.Variant("b", False),
+                                "RSSI": GLib.Variant("n", -70),
+                            }}
+                        ))))
+    for _ in range(count):
+        index = rng.randrange(devices)
+        changed = {"RSSI": GLib.Variant("n", rng.randint(-90, -40))}
+        if rng.random() < 0.3:
+            changed["ManufacturerData"] = GLib.Variant("a{qv}", {
+                0x004c: GLib.Variant("ay", bytes([0x02, 0x15, rng.randrange(4)]))
+            })
+        if rng.random() < 0.1:
+            changed["Name"] = GLib.Variant("s", "Device {}".format(index))
+        signals.append((device_path(index), PROPERTIES_INTERFACE,
+                        "PropertiesChanged", GLib.Variant(
+                            "(sa{sv}as)", (DEVICE_INTERFACE, changed, []))))
+    signals.append((device_path(0), OBJECT_MANAGER_INTERFACE,
+                    "InterfacesRemoved", GLib.Variant(
+                        "(oas)", (device_path(0), [DEVICE_INTERFACE]))))
+    return [(START + i * 0.01,) + s for i, s in enumerate(signals)]
+
+
+def timeless_state(device):
+    """
+    Return the state of the device without the times it was seen at, which
+    a replay takes from the clock.
+    """
+    state = device_state(device)
+    del state["first_seen"], state["last_seen"]
+    state["rssis"] = state["rssis"][:-1] + ([v for _, v in device.rssis.items()],)
+    for key in ("manufacturer_data", "service_data"):
+        state[key] = {k: {p: r[0] for p, r in records.items()}
+                      for k, records in state[key].items()}
+    return state
+
+
+def registry_state(sniffer):
+    return {d.address: timeless_state(d) for d in sniffer.registry}
+
+
+@pytest.mark.parametrize("ingestion", ["pydbus", "gio"])
+def test_replay_reproduces_the_recorded_signals(tmp_path, ingestion):
+    recording_path = tmp_path / "signals.rec"
+    signals = make_signals(0)
+    recorder = SignalRecorder(recording_path, ADAPTER_PATH)
+    for timestamp, path, _, signal, params in signals:
+        recorder.record(path, signal, params, timestamp)
+    recorder.close()
+
+    reader = SignalReader(recording_path)
+    try:
+        assert reader.adapter_path == ADAPTER_PATH
+        assert [(t, p, i, s, v.unpack()) for t, p, i, s, v in reader] == \
+            [(t, p, i, s, v.unpack()) for t, p, i, s, v in signals]
+    finally:
+        reader.close()
+
+    direct = Sniffer(coalescing_interval=0, sinks=())
+    for _, path, interface, signal, params in signals:
+        direct._dispatch_signal(path, interface, signal, params)
+    direct.__exit__(None, None, None)
+
+    with ReplaySniffer(recording_path=recording_path, speed=0,
+                       ingestion=ingestion, sinks=()) as sniffer:
+        sniffer.run()
+
+    assert sniffer.replayed_signals == len(signals)
+    assert len(sniffer.registry) == 4
+    assert registry_state(sniffer) == registry_state(direct)
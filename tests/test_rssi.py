@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import pytest
+
+from btlesniffer.rssi import RSSIHistory
+
+SAMPLES = [-70, -65, -80, -55, -62, -200, 30]
+
+
+def make_history(capacity=4):
+    history = RSSIHistory(capacity)
+    for i, value in enumerate(SAMPLES):
+        history.append(value, 1500000000.0 + i)
+    return history
+
+
+def test_only_the_newest_samples_are_retained():
+    history = make_history()
+    assert list(history) == [-55, -62, -128, 30]
+    assert [t for t, _ in history.items()] == [1500000003.0 + i for i in range(4)]
+    assert (history.last, history.last_timestamp) == (30, 1500000006.0)
+
+
+def test_statistics_cover_all_samples():
+    history = make_history()
+    clamped = [max(-128, min(127, v)) for v in SAMPLES]
+    assert (history.count, history.pushed) == (7, 7)
+    assert history.total == sum(clamped)
+    assert (history.minimum, history.maximum) == (-128, 30)
+    assert history.mean == pytest.approx(sum(clamped) / 7)
+    ema = float(clamped[0])
+    for value in clamped[1:]:
+        ema += 0.2 * (value - ema)
+    assert history.ema == pytest.approx(ema)
+
+
+def test_batches_match_single_samples():
+    history = RSSIHistory(4)
+    history.append(-40, 1499999999.0)
+    history.extend_samples([1500000000.0 + i for i in range(len(SAMPLES))],
+                           SAMPLES)
+    expected = RSSIHistory(4)
+    expected.append(-40, 1499999999.0)
+    for i, value in enumerate(SAMPLES):
+        expected.append(value, 1500000000.0 + i)
+    assert list(history.items()) == list(expected.items())
+    assert (history.count, history.pushed, history.total, history.minimum,
+            history.maximum) == (expected.count, expected.pushed,
+                                 expected.total, expected.minimum,
+                                 expected.maximum)
+    assert history.ema == pytest.approx(expected.ema)
+
+
+def test_folded_samples_are_only_counted():
+    history = make_history()
+    history.fold(-90)
+    assert list(history) == [-55, -62, -128, 30]
+    assert (history.count, history.pushed, history.minimum) == (8, 7, -128)
+
+
+def test_resize_keeps_the_newest_samples():
+    history = make_history()
+    history.resize(2)
+    assert list(history.items()) == [(1500000005.0, -128), (1500000006.0, 30)]
+    history.append(-50, 1500000007.0)
+    assert list(history) == [30, -50]
+    with pytest.raises(ValueError):
+        history.resize(0)
+
+
+def test_pickle_round_trip():
+    history = make_history()
+    copy = pickle.loads(pickle.dumps(history))
+    assert list(copy.items()) == list(history.items())
+    assert (copy.capacity, copy.count, copy.pushed, copy.ema) == \
+        (history.capacity, history.count, history.pushed, history.ema)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+pytest.importorskip("gi")
+
+from gi.repository import GLib  # noqa: E402
+
+from btlesniffer import signals  # noqa: E402
+from btlesniffer.util import DEVICE_INTERFACE  # noqa: E402
+
+PAYLOAD = bytes([0x02, 0x15, 0x01, 0x00])
+SERVICE_UUID = "0000feaa-0000-1000-8000-00805f9b34fb"
+
+
+def make_properties():
+    return GLib.Variant("a{sv}", make_values())
+
+
+def make_values():
+    return {
+        "Address": GLib.Variant("s", "AA:BB:CC:DD:EE:01"),
+        "Alias": GLib.Variant("s", "AA-BB-CC-DD-EE-01"),
+        "Paired": GLib.Variant("b", False),
+        "Connected": GLib.Variant("b", True),
+        "Name": GLib.Variant("s", "Beacön"),
+        "Class": GLib.Variant("u", 0x1f00),
+        "UUIDs": GLib.Variant("as", [SERVICE_UUID]),
+        "Adapter": GLib.Variant("o", "/org/bluez/hci0"),
+        "RSSI": GLib.Variant("n", -60),
+        "TxPower": GLib.Variant("n", -4),
+        "ManufacturerData": GLib.Variant("a{qv}", {
+            0x004c: GLib.Variant("ay", PAYLOAD)
+        }),
+        "ServiceData": GLib.Variant("a{sv}", {
+            SERVICE_UUID: GLib.Variant("ay", b"")
+        }),
+    }
+
+
+def unpacked(properties):
+    """
+    Return the properties as pydbus unpacks them, restricted to the ones
+    the sniffer records and with the payloads as bytes.
+    """
+    data = {k: v for k, v in properties.unpack().items()
+            if k in signals.DEVICE_PROPERTIES}
+    for key in ("ManufacturerData", "ServiceData"):
+        data[key] = {k: bytes(v) for k, v in data[key].items()}
+    return data
+
+
+def test_properties_are_decoded_like_unpacked_ones():
+    properties = make_properties()
+    data = signals.decode_properties(properties)
+    assert data == unpacked(properties)
+    assert "Alias" not in data and "Adapter" not in data
+    assert data["ManufacturerData"] == {0x004c: PAYLOAD}
+
+
+def test_interfaces_are_decoded_like_unpacked_ones():
+    interfaces = GLib.Variant("a{sa{sv}}", {
+        DEVICE_INTERFACE: make_values(),
+        "org.bluez.GattService1": {"Primary": GLib.Variant("b", True)},
+    })
+    data = signals.decode_interfaces(interfaces, DEVICE_INTERFACE)
+    assert data[DEVICE_INTERFACE] == unpacked(make_properties())
+    assert data["org.bluez.GattService1"] == {"Primary": True}
+
+
+def test_rssi_samples_are_recognised():
+    assert signals.is_rssi_sample(GLib.Variant("a{sv}", {
+        "RSSI": GLib.Variant("n", -60)
+    }))
+    assert not signals.is_rssi_sample(make_properties())
+    assert not signals.is_rssi_sample(GLib.Variant("a{sv}", {
+        "TxPower": GLib.Variant("n", -4)
+    }))
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from btlesniffer.sinks import New, PrintSink, RSSI, Sink, SinkDispatcher
+
+from helpers import make_full_device
+
+
+class ListSink(Sink):
+    def handle(self, events):
+        self.received.extend(events)
+
+    def __init__(self):
+        self.received = list()
+
+
+class QuietPrintSink(PrintSink):
+    def handle(self, events):
+        self.received.extend(events)
+
+    def __init__(self):
+        self.received = list()
+
+
+def test_shedding_spares_sinks_that_do_not_opt_in():
+    kept, shed = ListSink(), QuietPrintSink()
+    dispatcher = SinkDispatcher([kept, shed])
+    assert dispatcher.sheds(New)
+    assert dispatcher.wants(New, shedding=True)
+    assert not dispatcher.wants(RSSI, shedding=True)
+
+    dispatcher.emit(New(make_full_device()), shedding=True)
+    dispatcher.emit(New(make_full_device()))
+    dispatcher.close()
+    assert len(kept.received) == 2
+    assert len(shed.received) == 1
+
+
+def test_shedding_only_sheddable_sinks():
+    dispatcher = SinkDispatcher([QuietPrintSink()])
+    try:
+        assert dispatcher.wants(New)
+        assert not dispatcher.wants(New, shedding=True)
+    finally:
+        dispatcher.close()
+
+
+def test_incomplete_sink_fails_on_construction():
+    class Incomplete(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_device_is_captured_as_far_as_sinks_need_it():
+    kept, printed = ListSink(), QuietPrintSink()
+    dispatcher = SinkDispatcher([kept, printed])
+    dispatcher.emit_device(New, make_full_device())
+    dispatcher.emit_device(New, make_full_device(), shedding=True)
+    dispatcher.close()
+    event, shed_event = kept.received
+    assert event.device.address == make_full_device().address
+    assert event.text == str(make_full_device())
+    assert shed_event.text is None
+    assert printed.received == [event]
+
+    printed = QuietPrintSink()
+    dispatcher = SinkDispatcher([printed])
+    dispatcher.emit_device(New, make_full_device())
+    dispatcher.close()
+    event, = printed.received
+    assert event.record is None
+    assert event.text == str(make_full_device())
+    with pytest.raises(ValueError):
+        event.device
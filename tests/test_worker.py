@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from btlesniffer.sniffer import Sniffer
+
+from helpers import announce, change, device_path, device_state, \
+    feed_signals, random_signals
+
+
+def start_worker(sniffer):
+    """
+    Start the worker thread without the GLib timer that reports the queue.
+    """
+    sniffer._worker = threading.Thread(target=sniffer._run_worker, daemon=True)
+    sniffer._worker.start()
+
+
+def test_devices_are_timestamped_on_arrival():
+    sniffer = Sniffer(worker_queue_size=10, sinks=[])
+    announce(sniffer, 1)
+    arrived = time.time()
+    time.sleep(0.01)
+    change(sniffer, 1, RSSI=-50)
+    start_worker(sniffer)
+    sniffer.__exit__(None, None, None)
+
+    device = sniffer.registry.get_by_path(device_path(1))
+    # The device is timestamped as the signal arrives, rather than as the
+    # worker gets to it, which keeps its RSSI samples in order.
+    assert device.first_seen.timestamp() <= arrived
+    samples = list(device.rssis.items())
+    assert [v for _, v in samples] == [-70, -50]
+    assert samples[0][0] <= arrived < samples[1][0]
+
+
+def test_discovery_is_queued_beyond_the_queue_size():
+    sniffer = Sniffer(worker_queue_size=1, sinks=[])
+    announce(sniffer, 1)
+    announce(sniffer, 2)
+    change(sniffer, 1, RSSI=-50)
+    start_worker(sniffer)
+    sniffer.__exit__(None, None, None)
+
+    # Property changes are dropped once the queue is full, whereas the
+    # discovery of devices neither blocks nor is lost.
+    assert (sniffer.overflow_events, sniffer.dropped_events) == (1, 1)
+    assert sniffer.processed_events == 2
+    for index in (1, 2):
+        device = sniffer.registry.get_by_path(device_path(index))
+        assert list(device.rssis) == [-70]
+
+
+def test_worker_keeps_the_state_of_the_devices():
+    for seed in range(5):
+        signals = random_signals(seed)
+        direct = Sniffer(coalescing_interval=0, rssi_capacity=16, sinks=[])
+        feed_signals(direct, signals)
+        direct.__exit__(None, None, None)
+
+        # The worker applies the property changes it drains in one chunk
+        # as a batch per device, while the signals keep arriving.
+        worker = Sniffer(worker_queue_size=len(signals), worker_batch_size=7,
+                         rssi_capacity=16, sinks=[])
+        start_worker(worker)
+        for handler, args in signals:
+            if handler == "_on_properties_changed":
+                worker._enqueue(getattr(worker, handler), *args)
+            else:
+                worker._enqueue_discovery(getattr(worker, handler), *args)
+        worker.__exit__(None, None, None)
+
+        assert worker.processed_events == len(signals)
+        assert worker.dropped_events == 0
+        assert {d.address: device_state(d) for d in worker.registry} == \
+            {d.address: device_state(d) for d in direct.registry}